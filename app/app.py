@@ -5,13 +5,31 @@
 
 import os
 import json
+import shutil
 import subprocess
 import datetime
+import tempfile
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_wtf import CSRFProtect
 from werkzeug.utils import secure_filename
 import configparser
 import logging
+from backup_config import load_backup_config, load_database_configs, load_settings, save_backup_config, config_bool, write_file_atomic
+from orchestrator import BackupOrchestrator
+from jobs import JobQueue
+from binlog import list_chain_entries
+from chunkstore import ChunkStore, repository_dir
+from catalog import BackupCatalog, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from scheduler_control import request_reload, request_status
+from storage import storage_from_config
+from downloads import (DOWNLOAD_FORMATS, file_response, transcode_response, tar_response, read_blocks,
+                       directory_members, storage_members)
+from backup_codecs import codec_for_file
+from parallel_dump import MANIFEST_FILE
+from restore import restore_backup
+from metrics import render as render_metrics
+from retention import RETENTION_PERIODS, retention_policy, retention_preview, remove_backup
+from health import cached_status, check_all
 
 # Konfiguriere Logging
 logging.basicConfig(
@@ -53,6 +71,7 @@ CONFIG_DIR = '/app/config'
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'backup.conf')
 CONFIG_EXAMPLE = os.path.join(CONFIG_DIR, 'backup.conf.example')
 SCHEDULER_CONFIG = os.path.join(CONFIG_DIR, 'scheduler.json')
+JOBS_FILE = os.path.join(CONFIG_DIR, 'jobs.sqlite')
 
 # Backup-Skript
 BACKUP_SCRIPT = '/app/scripts/backup.sh'
@@ -64,8 +83,8 @@ def ensure_config_files():
     
     # Erstelle backup.conf, falls sie nicht existiert
     if not os.path.exists(CONFIG_FILE) and os.path.exists(CONFIG_EXAMPLE):
-        with open(CONFIG_EXAMPLE, 'r') as src, open(CONFIG_FILE, 'w') as dst:
-            dst.write(src.read())
+        with open(CONFIG_EXAMPLE, 'r') as src:
+            write_file_atomic(CONFIG_FILE, src.read())
         logger.info(f"Konfigurationsdatei {CONFIG_FILE} erstellt.")
     
     # Erstelle scheduler.json, falls sie nicht existiert
@@ -77,109 +96,9 @@ def ensure_config_files():
             "day_of_week": "1",  # Montag
             "day_of_month": "1"
         }
-        with open(SCHEDULER_CONFIG, 'w') as f:
-            json.dump(default_scheduler, f, indent=4)
+        write_file_atomic(SCHEDULER_CONFIG, json.dumps(default_scheduler, indent=4))
         logger.info(f"Scheduler-Konfiguration {SCHEDULER_CONFIG} erstellt.")
 
-# Lade die Backup-Konfiguration
-def load_backup_config():
-    config = {}
-    
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    config[key.strip()] = value.strip().strip('"\'')
-    
-    return config
-
-# Lade Datenbank-Konfigurationen
-def load_database_configs():
-    config = load_backup_config()
-    databases = []
-    db_ids = set()
-    
-    # Finde alle konfigurierten Datenbanken
-    for key in config.keys():
-        if key.startswith('DB_') and '_NAME' in key:
-            db_id = key.split('_')[1]
-            db_ids.add(db_id)
-    
-    # Sortiere die IDs numerisch
-    db_ids = sorted(db_ids, key=int)
-    
-    # Erstelle für jede Datenbank eine Konfiguration
-    for db_id in db_ids:
-        prefix = f'DB_{db_id}_'
-        db_config = {
-            'id': db_id,
-            'name': config.get(f'{prefix}NAME', f'Datenbank {db_id}'),
-            'host': config.get(f'{prefix}HOST', 'localhost'),
-            'port': config.get(f'{prefix}PORT', '3306'),
-            'user': config.get(f'{prefix}USER', 'root'),
-            'password': config.get(f'{prefix}PASSWORD', ''),
-            'database': config.get(f'{prefix}DATABASE', '')
-        }
-        databases.append(db_config)
-    
-    # Wenn keine Datenbanken konfiguriert sind, erstelle eine Standard-Datenbank
-    if not databases:
-        # Für Abwärtskompatibilität: Wenn alte Konfiguration vorhanden ist, verwende diese
-        if 'MYSQL_HOST' in config:
-            databases.append({
-                'id': '1',
-                'name': 'Datenbank 1',
-                'host': config.get('MYSQL_HOST', 'localhost'),
-                'port': config.get('MYSQL_PORT', '3306'),
-                'user': config.get('MYSQL_USER', 'root'),
-                'password': config.get('MYSQL_PASSWORD', ''),
-                'database': config.get('MYSQL_DATABASE', '')
-            })
-        else:
-            # Sonst erstelle eine leere Standard-Datenbank
-            databases.append({
-                'id': '1',
-                'name': 'Datenbank 1',
-                'host': 'localhost',
-                'port': '3306',
-                'user': 'root',
-                'password': '',
-                'database': ''
-            })
-    
-    return databases
-
-# Speichere die Backup-Konfiguration
-def save_backup_config(config, databases):
-    with open(CONFIG_FILE, 'w') as f:
-        f.write("# MySQL-Backup-Konfiguration\n")
-        f.write("# Automatisch generiert durch die Weboberfläche\n\n")
-        
-        f.write("# Allgemeine Backup-Einstellungen\n")
-        f.write(f'BACKUP_DIR="{config.get("BACKUP_DIR", "/app/backups")}"\n')
-        f.write(f'BACKUP_RETENTION="{config.get("BACKUP_RETENTION", "7")}"\n\n')
-        
-        f.write("# SMB-Share-Einstellungen\n")
-        f.write(f'SMB_ENABLED="{config.get("SMB_ENABLED", "false")}"\n')
-        f.write(f'SMB_SHARE="{config.get("SMB_SHARE", "")}"\n')
-        f.write(f'SMB_MOUNT="{config.get("SMB_MOUNT", "/mnt/backup")}"\n')
-        f.write(f'SMB_USER="{config.get("SMB_USER", "")}"\n')
-        f.write(f'SMB_PASSWORD="{config.get("SMB_PASSWORD", "")}"\n')
-        f.write(f'SMB_DOMAIN="{config.get("SMB_DOMAIN", "WORKGROUP")}"\n\n')
-        
-        f.write("# Datenbank-Konfigurationen\n")
-        for db in databases:
-            db_id = db.get('id', '1')
-            f.write(f'# Datenbank {db_id}\n')
-            f.write(f'DB_{db_id}_NAME="{db.get("name", f"Datenbank {db_id}")}"\n')
-            f.write(f'DB_{db_id}_HOST="{db.get("host", "localhost")}"\n')
-            f.write(f'DB_{db_id}_PORT="{db.get("port", "3306")}"\n')
-            f.write(f'DB_{db_id}_USER="{db.get("user", "root")}"\n')
-            f.write(f'DB_{db_id}_PASSWORD="{db.get("password", "")}"\n')
-            f.write(f'DB_{db_id}_DATABASE="{db.get("database", "")}"\n\n')
-
 # Lade die Scheduler-Konfiguration
 def load_scheduler_config():
     if os.path.exists(SCHEDULER_CONFIG):
@@ -195,68 +114,51 @@ def load_scheduler_config():
 
 # Speichere die Scheduler-Konfiguration
 def save_scheduler_config(config):
-    with open(SCHEDULER_CONFIG, 'w') as f:
-        json.dump(config, f, indent=4)
+    # Der Scheduler liest die Datei parallel, daher atomar ersetzen
+    write_file_atomic(SCHEDULER_CONFIG, json.dumps(config, indent=4))
 
-# Führe ein manuelles Backup durch
-def run_backup(db_id=None):
-    try:
-        if db_id:
-            # Backup einer einzelnen Datenbank
-            result = subprocess.run([BACKUP_SCRIPT, db_id], capture_output=True, text=True)
-        else:
-            # Backup mit Standard-Konfiguration (für Abwärtskompatibilität)
-            result = subprocess.run([BACKUP_SCRIPT], capture_output=True, text=True)
-            
-        if result.returncode == 0:
-            logger.info(f"Backup für Datenbank {db_id if db_id else 'Standard'} erfolgreich durchgeführt.")
-            return True, result.stdout
-        else:
-            logger.error(f"Backup für Datenbank {db_id if db_id else 'Standard'} fehlgeschlagen: {result.stderr}")
-            return False, result.stderr
-    except Exception as e:
-        logger.exception(f"Fehler beim Ausführen des Backups für Datenbank {db_id if db_id else 'Standard'}")
-        return False, str(e)
+# Zeitlimit je Schritt des SMB-Tests in Sekunden und für den ganzen Test
+SMB_TEST_TIMEOUT = 20
+SMB_TEST_JOB_TIMEOUT = 60
 
-# Liste alle Backups auf
-def list_backups():
-    backups = []
-    config = load_backup_config()
-    backup_dir = config.get('BACKUP_DIR', '/app/backups')
-    
-    if os.path.exists(backup_dir):
-        for file in os.listdir(backup_dir):
-            if file.startswith('mysql_backup_') and file.endswith('.sql.gz'):
-                file_path = os.path.join(backup_dir, file)
-                file_stat = os.stat(file_path)
-                file_size = file_stat.st_size
-                file_date = datetime.datetime.fromtimestamp(file_stat.st_mtime)
-                
-                # Extrahiere Datenbankname und ID aus Dateinamen
-                # Neues Format: mysql_backup_[DB_ID]_[DB_NAME]_[TIMESTAMP].sql.gz
-                parts = file.split('_')
-                if len(parts) >= 5:  # Neues Format mit DB_ID
-                    db_id = parts[2]
-                    db_name = parts[3]
-                elif len(parts) >= 3:  # Altes Format
-                    db_id = "1"  # Standard-ID für alte Backups
-                    db_name = parts[2]
-                else:
-                    db_id = "1"
-                    db_name = "unbekannt"
-                
-                backups.append({
-                    'filename': file,
-                    'db_id': db_id,
-                    'database': db_name,
-                    'size': file_size,
-                    'date': file_date,
-                    'path': file_path
-                })
-    
-    # Sortiere nach Datum (neueste zuerst)
-    backups.sort(key=lambda x: x['date'], reverse=True)
-    return backups
+# Warteschlange für Hintergrund-Jobs (Backups laufen nicht im Request-Thread)
+# Der Job-Status liegt in der Job-Datenbank, damit ihn jeder Worker-Prozess abfragen kann.
+# Nur Backups und Wiederherstellungen laufen nacheinander; Tests warten nicht auf sie.
+job_queue = JobQueue(workers=1, path=JOBS_FILE, serialized=('backup', 'restore'),
+                     timeouts={'smb_test': SMB_TEST_JOB_TIMEOUT})
+
+# Führe ein Backup als Hintergrund-Job durch
+def backup_job(job, databases):
+    orchestrator = BackupOrchestrator.from_config(load_settings())
+    finished = []
+    job.set_progress(0, len(databases))
+
+    def on_output(db, line):
+        job.log(f"[DB {db['id']}] {line}")
+
+    def on_result(result):
+        finished.append(result)
+        job.set_progress(len(finished))
+
+    run = orchestrator.run_all(databases, on_output=on_output, on_result=on_result)
+    job.log(f"{len(run['results']) - run['failed']} von {len(run['results'])} Backups erfolgreich "
+            f"in {run['duration']:.1f}s.")
+    return run['success'], dict(run, started=run['started'].isoformat())
+
+# Spiele ein Backup als Hintergrund-Job ein (Fortschritt in MB)
+def restore_job(job, filename, db, database, skip_binlog=False):
+    megabyte = 1024 * 1024
+    result = restore_backup(load_backup_config(), filename, db, database, skip_binlog=skip_binlog, log=job.log,
+                            callback=lambda done, total: job.set_progress(done // megabyte, total // megabyte))
+    job.log(f"Wiederherstellung abgeschlossen: {result['bytes'] / megabyte:.1f} MB in {result['duration']:.1f}s "
+            f"({result['throughput'] / megabyte:.1f} MB/s).")
+    return True, result
+
+# Gleiche den Katalog mit Backup-Verzeichnis, Repository und Speicherziel ab (nach manuellen Änderungen)
+def catalog_sync_job(job):
+    added, removed = BackupCatalog().sync(load_backup_config(), log=job.log)
+    job.log(f"Katalog abgeglichen: {len(added)} aufgenommen, {len(removed)} entfernt")
+    return True, {'added': len(added), 'removed': len(removed)}
 
 # Lösche ein Backup
 def delete_backup(filename):
@@ -264,17 +166,50 @@ def delete_backup(filename):
     backup_dir = config.get('BACKUP_DIR', '/app/backups')
     file_path = os.path.join(backup_dir, filename)
     
-    if os.path.exists(file_path) and os.path.isfile(file_path):
+    # Snapshots im Repository: die Chunks entfernt die nächste Bereinigung
+    store = ChunkStore(repository_dir(config))
+    if filename.startswith('mysql_backup_') and store.has_snapshot(filename):
+        try:
+            store.delete_snapshot(filename)
+            BackupCatalog().remove(filename)
+            logger.info(f"Snapshot {filename} aus dem Repository gelöscht.")
+            return True
+        except Exception as e:
+            logger.error(f"Fehler beim Löschen des Snapshots {filename}: {e}")
+            return False
+    
+    if os.path.exists(file_path) and os.path.basename(file_path).startswith('mysql_backup_'):
+        # Ein Glied einer Sicherungskette darf nicht gelöscht werden, solange andere darauf aufbauen
+        dependents = [entry['filename'] for entry in list_chain_entries(backup_dir)
+                      if entry.get('parent') == filename]
+        if dependents:
+            logger.error(f"Backup {filename} wird von {', '.join(dependents)} benötigt und kann nicht gelöscht werden.")
+            return False
         try:
-            os.remove(file_path)
+            # Tabellenweise Backups sind Verzeichnisse; Metadaten und Prüfsummendatei werden mitgelöscht
+            remove_backup(backup_dir, filename)
+            BackupCatalog().remove(filename)
             logger.info(f"Backup {filename} gelöscht.")
             return True
         except Exception as e:
             logger.error(f"Fehler beim Löschen des Backups {filename}: {e}")
             return False
-    else:
-        logger.error(f"Backup {filename} nicht gefunden.")
-        return False
+    
+    # Backups ohne lokale Kopie im Speicherziel löschen
+    catalog = BackupCatalog()
+    backup = catalog.get(filename)
+    if backup and backup['is_remote']:
+        try:
+            storage_from_config(config).delete(filename)
+            catalog.remove(filename)
+            logger.info(f"Backup {filename} aus dem Speicherziel gelöscht.")
+            return True
+        except Exception as e:
+            logger.error(f"Fehler beim Löschen des Backups {filename} im Speicherziel: {e}")
+            return False
+    
+    logger.error(f"Backup {filename} nicht gefunden.")
+    return False
 
 # Routen
 @app.route('/')
@@ -291,12 +226,47 @@ def config():
             config_data = {
                 'BACKUP_DIR': request.form.get('backup_dir', '/app/backups'),
                 'BACKUP_RETENTION': request.form.get('backup_retention', '7'),
+                'RETENTION_HOURLY': request.form.get('retention_hourly', '0'),
+                'RETENTION_DAILY': request.form.get('retention_daily', '0'),
+                'RETENTION_WEEKLY': request.form.get('retention_weekly', '0'),
+                'RETENTION_MONTHLY': request.form.get('retention_monthly', '0'),
+                'BACKUP_PARALLEL_JOBS': request.form.get('backup_parallel_jobs', '4'),
+                'BACKUP_PARALLEL_PER_HOST': request.form.get('backup_parallel_per_host', '2'),
+                'CODEC_THREADS': request.form.get('codec_threads', '0'),
+                'REPOSITORY_DIR': request.form.get('repository_dir', ''),
+                'VERIFY_DAYS': request.form.get('verify_days', '2'),
+                'VERIFY_JOBS': request.form.get('verify_jobs', '2'),
                 'SMB_ENABLED': 'true' if request.form.get('smb_enabled') else 'false',
                 'SMB_SHARE': request.form.get('smb_share', ''),
                 'SMB_MOUNT': request.form.get('smb_mount', '/mnt/backup'),
                 'SMB_USER': request.form.get('smb_user', ''),
                 'SMB_PASSWORD': request.form.get('smb_password', ''),
-                'SMB_DOMAIN': request.form.get('smb_domain', 'WORKGROUP')
+                'SMB_DOMAIN': request.form.get('smb_domain', 'WORKGROUP'),
+                'SMB_COPY_JOBS': request.form.get('smb_copy_jobs', '4'),
+                'STORAGE_BACKEND': request.form.get('storage_backend', 'none'),
+                'STORAGE_KEEP_LOCAL': 'true' if request.form.get('storage_keep_local') else 'false',
+                'STORAGE_UPLOAD_JOBS': request.form.get('storage_upload_jobs', '4'),
+                'STORAGE_PATH': request.form.get('storage_path', ''),
+                'S3_ENDPOINT': request.form.get('s3_endpoint', ''),
+                'S3_REGION': request.form.get('s3_region', ''),
+                'S3_BUCKET': request.form.get('s3_bucket', ''),
+                'S3_PREFIX': request.form.get('s3_prefix', ''),
+                'S3_ACCESS_KEY': request.form.get('s3_access_key', ''),
+                'S3_SECRET_KEY': request.form.get('s3_secret_key', ''),
+                'S3_PART_SIZE': request.form.get('s3_part_size', '64'),
+                'SFTP_HOST': request.form.get('sftp_host', ''),
+                'SFTP_PORT': request.form.get('sftp_port', '22'),
+                'SFTP_USER': request.form.get('sftp_user', ''),
+                'SFTP_PASSWORD': request.form.get('sftp_password', ''),
+                'SFTP_KEY_FILE': request.form.get('sftp_key_file', ''),
+                'SFTP_PATH': request.form.get('sftp_path', ''),
+                'THROTTLE_THREADS_RUNNING': request.form.get('throttle_threads_running', '0'),
+                'THROTTLE_REPLICATION_LAG': request.form.get('throttle_replication_lag', '0'),
+                'THROTTLE_HISTORY_LENGTH': request.form.get('throttle_history_length', '0'),
+                'THROTTLE_INTERVAL': request.form.get('throttle_interval', '5'),
+                'THROTTLE_MAX_PAUSE': request.form.get('throttle_max_pause', '30'),
+                'THROTTLE_WRITE_LIMIT': request.form.get('throttle_write_limit', '0'),
+                'THROTTLE_SMB_LIMIT': request.form.get('throttle_smb_limit', '0')
             }
             
             # Extrahiere die Datenbank-IDs aus dem einzelnen Feld
@@ -332,7 +302,17 @@ def config():
                     'port': request.form.get(f'db_{db_id}_port', '3306'),
                     'user': request.form.get(f'db_{db_id}_user', 'root'),
                     'password': request.form.get(f'db_{db_id}_password', ''),
-                    'database': request.form.get(f'db_{db_id}_database', '')
+                    'database': request.form.get(f'db_{db_id}_database', ''),
+                    'engine': request.form.get(f'db_{db_id}_engine', 'mysqldump'),
+                    'batch_rows': request.form.get(f'db_{db_id}_batch_rows', '1000'),
+                    'threads': request.form.get(f'db_{db_id}_threads', '4'),
+                    'chunk_rows': request.form.get(f'db_{db_id}_chunk_rows', '1000000'),
+                    'change_detection': request.form.get(f'db_{db_id}_change_detection', 'off'),
+                    'codec': request.form.get(f'db_{db_id}_codec', 'gzip'),
+                    'codec_level': request.form.get(f'db_{db_id}_codec_level', ''),
+                    'incremental': 'true' if request.form.get(f'db_{db_id}_incremental') else 'false',
+                    'full_interval': request.form.get(f'db_{db_id}_full_interval', '24'),
+                    'format': request.form.get(f'db_{db_id}_format', 'file')
                 }
                 
                 # Prüfe ob die nötigen Felder vorhanden sind
@@ -378,7 +358,10 @@ def config():
     # Lade aktuelle Konfiguration
     config_data = load_backup_config()
     databases = load_database_configs()
-    return render_template('config.html', config=config_data, databases=databases, version=APP_VERSION)
+    # Status der Verbindungen nur aus dem Zwischenspeicher, ohne Verbindungen aufzubauen
+    health = cached_status(load_settings())
+    return render_template('config.html', config=config_data, databases=databases, health=health,
+                           version=APP_VERSION)
 
 @app.route('/scheduler', methods=['GET', 'POST'])
 def scheduler():
@@ -389,55 +372,171 @@ def scheduler():
             'schedule': request.form.get('schedule', 'daily'),
             'time': request.form.get('time', '00:00'),
             'day_of_week': request.form.get('day_of_week', '1'),
-            'day_of_month': request.form.get('day_of_month', '1')
+            'day_of_month': request.form.get('day_of_month', '1'),
+            'stagger': True if request.form.get('stagger') else False,
+            'stagger_window': request.form.get('stagger_window', '60'),
+            'databases': {}
         }
         
+        # Eigene Zeitpläne einzelner Datenbanken (leere Felder übernehmen den allgemeinen Zeitplan)
+        for db in load_database_configs():
+            prefix = f"db_{db['id']}_"
+            scheduler_data['databases'][db['id']] = {
+                'schedule': request.form.get(f'{prefix}schedule', 'default'),
+                'time': request.form.get(f'{prefix}time', ''),
+                'day_of_week': request.form.get(f'{prefix}day_of_week', ''),
+                'day_of_month': request.form.get(f'{prefix}day_of_month', '')
+            }
+        
         save_scheduler_config(scheduler_data)
-        flash('Scheduler-Konfiguration gespeichert', 'success')
+        
+        # Zeitplan sofort im Scheduler-Prozess übernehmen
+        try:
+            request_reload()
+            flash('Scheduler-Konfiguration gespeichert und übernommen', 'success')
+        except OSError as e:
+            logger.warning(f"Scheduler nicht erreichbar: {e}")
+            flash('Scheduler-Konfiguration gespeichert. Der Scheduler ist nicht erreichbar, '
+                  'die Änderung wird spätestens in einer Minute übernommen.', 'warning')
         return redirect(url_for('scheduler'))
     
     # Lade aktuelle Scheduler-Konfiguration
     scheduler_data = load_scheduler_config()
-    return render_template('scheduler.html', config=scheduler_data, version=APP_VERSION)
+    
+    # Nächste Ausführung je Datenbank vom laufenden Scheduler
+    next_runs = {}
+    try:
+        for job in request_status().get('jobs', []):
+            for db_id in job.get('databases') or []:
+                if job.get('next_run_time'):
+                    next_runs[db_id] = datetime.datetime.fromisoformat(job['next_run_time'])
+    except OSError:
+        pass
+    return render_template('scheduler.html', config=scheduler_data, databases=load_database_configs(),
+                           next_runs=next_runs, version=APP_VERSION)
 
 @app.route('/backups')
 def backups():
-    backup_list = list_backups()
+    # Backups seitenweise aus dem Katalog statt aus dem Backup-Verzeichnis
+    catalog = BackupCatalog()
+    catalog.ensure(load_backup_config())
+    db_filter = request.args.get('db', '')
+    summary = catalog.summary(db_filter or None)
+    pages = max(1, -(-summary['count'] // DEFAULT_PAGE_SIZE))
+    page = min(pages, max(1, request.args.get('page', 1, type=int)))
+    backup_list = catalog.query(db_filter or None, page)
     databases = load_database_configs()
     # Erstelle ein Dictionary für schnellen Zugriff auf Datenbanknamen
     db_names = {db['id']: db['name'] for db in databases}
-    return render_template('backups.html', backups=backup_list, databases=databases, db_names=db_names, version=APP_VERSION)
+    return render_template('backups.html', backups=backup_list, databases=databases, db_names=db_names,
+                           summary=summary, page=page, pages=pages, db_filter=db_filter,
+                           job_id=request.args.get('job', ''), version=APP_VERSION)
+
+# Backups als JSON (seitenweise, optional nach Datenbank gefiltert)
+@app.route('/api/backups')
+def api_backups():
+    catalog = BackupCatalog()
+    catalog.ensure(load_backup_config())
+    db_id = request.args.get('db_id') or None
+    per_page = min(MAX_PAGE_SIZE, max(1, request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)))
+    page = max(1, request.args.get('page', 1, type=int))
+    summary = catalog.summary(db_id)
+    backup_list = catalog.query(db_id, page, per_page)
+    for backup in backup_list:
+        backup['date'] = backup['date'].isoformat()
+    return jsonify({
+        'backups': backup_list,
+        'total': summary['count'],
+        'total_size': summary['size'],
+        'page': page,
+        'per_page': per_page
+    })
 
 @app.route('/run_backup', methods=['POST'])
 def trigger_backup():
     db_id = request.form.get('db_id', 'all')
+    databases = load_database_configs()
     
     if db_id == 'all':
         # Backup aller Datenbanken
-        databases = load_database_configs()
-        all_success = True
-        messages = []
-        
-        for db in databases:
-            success, message = run_backup(db['id'])
-            if not success:
-                all_success = False
-                messages.append(f"Fehler bei Datenbank {db['name']}: {message}")
-        
-        if all_success:
-            flash('Alle Backups erfolgreich durchgeführt', 'success')
-        else:
-            for msg in messages:
-                flash(msg, 'danger')
+        description = 'Backup aller Datenbanken'
     else:
         # Backup einer einzelnen Datenbank
-        success, message = run_backup(db_id)
-        if success:
-            flash('Backup erfolgreich durchgeführt', 'success')
-        else:
-            flash(f'Backup fehlgeschlagen: {message}', 'danger')
+        databases = [db for db in databases if db['id'] == db_id]
+        description = f"Backup der Datenbank {databases[0]['name']}" if databases else ''
     
-    return redirect(url_for('backups'))
+    if not databases:
+        message = f'Datenbank mit ID {db_id} nicht gefunden'
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': message}), 404
+        flash(message, 'danger')
+        return redirect(url_for('backups'))
+    
+    job = job_queue.submit('backup', description, backup_job, databases)
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+    
+    flash(f'{description} gestartet (Job {job.id}).', 'info')
+    return redirect(url_for('backups', job=job.id))
+
+# Profil der Backup-Pipeline eines Laufs (Zeitanteile von Dump, Kompression, Schreiben, Übertragung)
+@app.route('/api/backups/<filename>/profile')
+def api_backup_profile(filename):
+    profile = BackupCatalog().get_profile(filename)
+    if not profile:
+        return jsonify({'success': False, 'message': f'Kein Profil für {filename} vorhanden'}), 404
+    return jsonify(profile)
+
+# Vorschau der Bereinigung (Probelauf): welche Backups bleiben erhalten, welche würden gelöscht
+# Per POST lassen sich noch nicht gespeicherte Aufbewahrungsregeln ausprobieren.
+@app.route('/api/retention/preview', methods=['GET', 'POST'])
+def api_retention_preview():
+    config = load_backup_config()
+    if request.is_json:
+        data = request.get_json()
+        config['BACKUP_RETENTION'] = data.get('days', config.get('BACKUP_RETENTION', '7'))
+        for key, config_key, _, _ in RETENTION_PERIODS:
+            config[config_key] = data.get(key, config.get(config_key, '0'))
+    catalog = BackupCatalog()
+    catalog.ensure(config)
+    preview = retention_preview(catalog, config, retention_policy(config))
+    return jsonify({
+        'policy': preview['policy'],
+        'expired': len(preview['expired']),
+        'expired_size': sum(entry['size'] for entry in preview['expired']),
+        'backups': [{key: backup[key] for key in ('filename', 'db_id', 'database', 'created', 'size', 'kind',
+                                                  'keep', 'reasons')} for backup in preview['backups']]
+    })
+
+# API-Routen für den Status der Hintergrund-Jobs
+@app.route('/api/jobs')
+def api_jobs():
+    kind = request.args.get('kind')
+    limit = request.args.get('limit', 20, type=int)
+    jobs = job_queue.list(kind)[:limit]
+    return jsonify({'jobs': [job.to_dict() for job in jobs], 'pending': job_queue.pending()})
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': f'Job {job_id} nicht gefunden'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/log')
+def api_job_log(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': f'Job {job_id} nicht gefunden'}), 404
+    tail = job.log_tail(request.args.get('offset', 0, type=int))
+    tail['status'] = job.status
+    return jsonify(tail)
+
+# Messwerte der Backups und der Job-Warteschlange im Prometheus-Format
+@app.route('/metrics')
+def metrics():
+    return app.response_class(render_metrics(jobs=job_queue.counts()), mimetype='text/plain; version=0.0.4')
 
 @app.route('/download_backup/<filename>')
 def download_backup(filename):
@@ -445,12 +544,80 @@ def download_backup(filename):
     backup_dir = config.get('BACKUP_DIR', '/app/backups')
     file_path = os.path.join(backup_dir, filename)
     
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        from flask import send_file
-        return send_file(file_path, as_attachment=True)
-    else:
-        flash(f'Backup {filename} nicht gefunden.', 'danger')
+    # Optional in ein anderes Format umwandeln (sql, gzip, zstd, lz4)
+    target = request.args.get('format', '').strip().lower() or None
+    if target and target not in DOWNLOAD_FORMATS:
+        flash(f'Unbekanntes Download-Format: {target}', 'danger')
+        return redirect(url_for('backups'))
+    
+    if os.path.isfile(file_path):
+        source = codec_for_file(filename)
+        if not target or target == source:
+            return file_response(file_path, filename)
+        return transcode_response(read_blocks(open(file_path, 'rb')), filename, source, target)
+    
+    # Tabellenweise Backups als tar-Archiv
+    if filename.startswith('mysql_backup_') and os.path.isfile(os.path.join(file_path, MANIFEST_FILE)):
+        return tar_response(directory_members(file_path, filename), filename)
+    
+    # Snapshots aus dem Repository werden beim Herunterladen aus den Chunks zusammengesetzt
+    store = ChunkStore(repository_dir(config))
+    if filename.startswith('mysql_backup_') and store.has_snapshot(filename):
+        return transcode_response(store.iter_snapshot(filename), filename + '.sql', 'sql', target or 'sql')
+    
+    # Backups ohne lokale Kopie werden aus dem Speicherziel durchgereicht
+    backup = BackupCatalog().get(filename)
+    if backup and backup['is_remote']:
+        storage = storage_from_config(config)
+        try:
+            if not backup['codec']:
+                return tar_response(storage_members(storage, filename), filename)
+            stream = storage.get_stream(filename)
+        except Exception as e:
+            logger.error(f"Fehler beim Lesen von {filename} aus dem Speicherziel: {e}")
+            flash(f'Backup {filename} konnte nicht aus dem Speicherziel gelesen werden.', 'danger')
+            return redirect(url_for('backups'))
+        return transcode_response(read_blocks(stream), filename, backup['codec'], target or backup['codec'])
+    
+    flash(f'Backup {filename} nicht gefunden.', 'danger')
+    return redirect(url_for('backups'))
+
+# Katalog mit den vorhandenen Backups abgleichen (als Hintergrund-Job)
+@app.route('/catalog/sync', methods=['POST'])
+def catalog_sync():
+    job = job_queue.submit('catalog', 'Katalog abgleichen', catalog_sync_job)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+    flash(f'Abgleich des Katalogs gestartet (Job {job.id}).', 'info')
+    return redirect(url_for('backups', job=job.id))
+
+# Backup in eine konfigurierte Verbindung einspielen (als Hintergrund-Job)
+@app.route('/restore_backup/<filename>', methods=['POST'])
+def restore_backup_route(filename):
+    db_id = request.form.get('db_id', '')
+    db = load_settings().database(db_id)
+    database = request.form.get('database', '').strip() or (db.database if db else '')
+    
+    message = None
+    if not db:
+        message = f'Datenbank mit ID {db_id} nicht gefunden'
+    elif not database:
+        message = 'Keine Zieldatenbank angegeben'
+    if message:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': message}), 400
+        flash(message, 'danger')
         return redirect(url_for('backups'))
+    
+    description = f"Wiederherstellung von {filename} in {database} ({db.name})"
+    job = job_queue.submit('restore', description, restore_job, filename, db, database,
+                           skip_binlog=bool(request.form.get('skip_binlog')))
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+    
+    flash(f'{description} gestartet (Job {job.id}).', 'info')
+    return redirect(url_for('backups', job=job.id))
 
 @app.route('/delete_backup/<filename>', methods=['POST'])
 def delete_backup_route(filename):
@@ -517,20 +684,90 @@ def test_db_connection():
             flash(error_message, 'danger')
             return redirect(url_for('config'))
 
+# Zwischengespeicherter Status aller Verbindungen (baut keine Verbindungen auf)
+@app.route('/api/health')
+def api_health():
+    return jsonify(cached_status(load_settings()))
+
+# Alle Datenbanken und Ziele gleichzeitig prüfen (force: auch Ergebnisse, die noch gültig sind)
+@app.route('/api/health/check', methods=['POST'])
+def api_health_check():
+    data = request.get_json(silent=True) or {}
+    return jsonify(check_all(load_settings(), force=bool(data.get('force'))))
+
+# Teste den SMB-Share als Hintergrund-Job: Ping, Einhängen, Testverzeichnis anlegen, Aushängen
+def smb_test_job(job, smb_share, smb_user, smb_password, smb_domain):
+    # Teste in einem eigenen Verzeichnis: der Share bleibt während Backup-Läufen unter
+    # SMB_MOUNT eingehängt und darf hier nicht ausgehängt werden
+    smb_mount = tempfile.mkdtemp(prefix='smb_test_')
+    warnings = []
+    
+    # Prüfe, ob der SMB-Server erreichbar ist
+    parts = smb_share.split('/')
+    server = parts[2] if len(parts) > 2 else ''
+    job.log(f"Prüfe Erreichbarkeit von {server}...")
+    try:
+        ping_result = subprocess.run(['ping', '-c', '1', '-W', '2', server], capture_output=True, text=True,
+                                     timeout=SMB_TEST_TIMEOUT)
+        if ping_result.returncode != 0:
+            warnings.append(f'WARNUNG: SMB-Server {server} scheint nicht erreichbar zu sein. Ping fehlgeschlagen.')
+            job.log(warnings[-1])
+    except Exception as e:
+        logger.error(f"Fehler beim Ping des SMB-Servers: {e}")
+    
+    # Versuche, den SMB-Share zu mounten
+    try:
+        options = f'username={smb_user},domain={smb_domain},vers=3.0'
+        if smb_password:
+            options = f'username={smb_user},password={smb_password},domain={smb_domain},vers=3.0'
+        job.log(f"Hänge {smb_share} ein...")
+        mount_result = subprocess.run(['mount', '-t', 'cifs', smb_share, smb_mount, '-o', options],
+                                      capture_output=True, text=True, timeout=SMB_TEST_TIMEOUT)
+        
+        if mount_result.returncode != 0:
+            warnings.append('Prüfen Sie Benutzername, Passwort, Domain und Share-Pfad.')
+            message = f'Fehler beim Mounten des SMB-Shares: {mount_result.stderr.strip()}'
+            job.log(message)
+            return False, {'message': message, 'warnings': warnings}
+        
+        # Versuche, ein Testverzeichnis zu erstellen
+        test_dir = os.path.join(smb_mount, 'test_connection')
+        os.makedirs(test_dir, exist_ok=True)
+        os.rmdir(test_dir)
+        
+        # Unmounte den Share
+        subprocess.run(['umount', smb_mount], check=True, timeout=SMB_TEST_TIMEOUT)
+        
+        message = f'SMB-Verbindung zu {smb_share} erfolgreich hergestellt.'
+        job.log(message)
+        return True, {'message': message, 'warnings': warnings}
+    except Exception as e:
+        message = f'Fehler bei der SMB-Verbindung: {str(e)}'
+        job.log(message)
+        
+        # Versuche, den Share zu unmounten, falls er gemountet wurde
+        try:
+            subprocess.run(['umount', '-l', smb_mount], capture_output=True, timeout=SMB_TEST_TIMEOUT)
+        except Exception:
+            pass
+        return False, {'message': message, 'warnings': warnings}
+    finally:
+        if not os.path.ismount(smb_mount):
+            shutil.rmtree(smb_mount, ignore_errors=True)
+
+# Der Test läuft in der Job-Warteschlange; die Oberfläche fragt das Ergebnis über /api/jobs/<id> ab
 @app.route('/test_smb_connection', methods=['POST'])
 def test_smb_connection():
     if request.is_json:
         data = request.get_json()
         smb_share = data.get('smb_share', '')
-        smb_mount = data.get('smb_mount', '/mnt/backup')
         smb_user = data.get('smb_user', '')
         smb_password = data.get('smb_password', '')
         smb_domain = data.get('smb_domain', 'WORKGROUP')
     else:
         config = load_backup_config()
-        smb_enabled = config.get('SMB_ENABLED', 'false') == 'true'
+        smb_enabled = config_bool(config, 'SMB_ENABLED')
         smb_share = config.get('SMB_SHARE', '')
-        smb_mount = config.get('SMB_MOUNT', '/mnt/backup')
         smb_user = config.get('SMB_USER', '')
         smb_password = config.get('SMB_PASSWORD', '')
         smb_domain = config.get('SMB_DOMAIN', 'WORKGROUP')
@@ -547,88 +784,14 @@ def test_smb_connection():
             flash(message, 'danger')
             return redirect(url_for('config'))
     
-    # Erstelle Mount-Verzeichnis, falls es nicht existiert
-    os.makedirs(smb_mount, exist_ok=True)
-    
-    # Prüfe, ob der SMB-Server erreichbar ist
-    server = smb_share.split('/')[2]
-    warnings = []
+    job = job_queue.submit('smb_test', f'SMB-Test von {smb_share}', smb_test_job,
+                           smb_share, smb_user, smb_password, smb_domain)
     
-    try:
-        import subprocess
-        ping_result = subprocess.run(['ping', '-c', '1', server], capture_output=True, text=True)
-        if ping_result.returncode != 0:
-            warning_msg = f'WARNUNG: SMB-Server {server} scheint nicht erreichbar zu sein. Ping fehlgeschlagen.'
-            warnings.append(warning_msg)
-            if not request.is_json:
-                flash(warning_msg, 'warning')
-    except Exception as e:
-        logger.error(f"Fehler beim Ping des SMB-Servers: {e}")
+    if request.is_json:
+        return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
     
-    # Versuche, den SMB-Share zu mounten
-    try:
-        mount_cmd = []
-        if smb_password:
-            mount_cmd = ['mount', '-t', 'cifs', smb_share, smb_mount, 
-                        '-o', f'username={smb_user},password={smb_password},domain={smb_domain},vers=3.0']
-        else:
-            mount_cmd = ['mount', '-t', 'cifs', smb_share, smb_mount, 
-                        '-o', f'username={smb_user},domain={smb_domain},vers=3.0']
-        
-        mount_result = subprocess.run(mount_cmd, capture_output=True, text=True)
-        
-        if mount_result.returncode == 0:
-            # Versuche, ein Testverzeichnis zu erstellen
-            test_dir = os.path.join(smb_mount, 'test_connection')
-            os.makedirs(test_dir, exist_ok=True)
-            os.rmdir(test_dir)
-            
-            # Unmounte den Share
-            subprocess.run(['umount', smb_mount], check=True)
-            
-            success_msg = f'SMB-Verbindung zu {smb_share} erfolgreich hergestellt.'
-            
-            if request.is_json:
-                return jsonify({
-                    'success': True, 
-                    'message': success_msg,
-                    'warnings': warnings
-                })
-            else:
-                flash(success_msg, 'success')
-                return redirect(url_for('config'))
-        else:
-            error_msg = mount_result.stderr.strip()
-            warning_msg = 'Prüfen Sie Benutzername, Passwort, Domain und Share-Pfad.'
-            
-            if request.is_json:
-                return jsonify({
-                    'success': False, 
-                    'message': f'Fehler beim Mounten des SMB-Shares: {error_msg}',
-                    'warnings': warnings + [warning_msg]
-                })
-            else:
-                flash(f'Fehler beim Mounten des SMB-Shares: {error_msg}', 'danger')
-                flash(warning_msg, 'warning')
-                return redirect(url_for('config'))
-    except Exception as e:
-        error_msg = f'Fehler bei der SMB-Verbindung: {str(e)}'
-        
-        # Versuche, den Share zu unmounten, falls er gemountet wurde
-        try:
-            subprocess.run(['umount', smb_mount], capture_output=True)
-        except:
-            pass
-        
-        if request.is_json:
-            return jsonify({
-                'success': False, 
-                'message': error_msg,
-                'warnings': warnings
-            })
-        else:
-            flash(error_msg, 'danger')
-            return redirect(url_for('config'))
+    flash(f'SMB-Test von {smb_share} gestartet (Job {job.id}).', 'info')
+    return redirect(url_for('config'))
 
 # API-Route zum Hinzufügen einer neuen Datenbank
 @app.route('/add_database', methods=['POST'])
@@ -708,5 +871,6 @@ ensure_config_files()
 def inject_version():
     return dict(version=APP_VERSION)
 
+# Nur für die Entwicklung; im Container startet gunicorn die App (siehe gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=80, debug=False)
+    app.run(host='0.0.0.0', port=80, debug=False, threaded=True)
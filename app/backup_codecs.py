@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Kompressionsverfahren für Backups
+#
+# Die Kompression läuft als eigener Prozess (pigz, zstd, lz4), damit sie
+# mehrere Kerne nutzen kann und nicht den Dump-Prozess ausbremst. Ist pigz
+# nicht installiert, wird für gzip auf das gzip-Modul von Python zurückgegriffen.
+#
+# Aufruf aus backup.sh:
+#   backup_codecs.py compress-command zstd 3 4   -> Befehl zum Komprimieren
+#   backup_codecs.py extension zstd              -> Dateiendung (.sql.zst)
+
+import os
+import sys
+import gzip
+import shutil
+import subprocess
+
+# Unterstützte Verfahren mit Dateiendung und Kompressionsstufen
+CODECS = {
+    'gzip': {'extension': '.sql.gz', 'default_level': 6, 'min_level': 1, 'max_level': 9},
+    'zstd': {'extension': '.sql.zst', 'default_level': 3, 'min_level': 1, 'max_level': 19},
+    'lz4': {'extension': '.sql.lz4', 'default_level': 1, 'min_level': 1, 'max_level': 12}
+}
+DEFAULT_CODEC = 'gzip'
+
+# Alle Dateiendungen von Backup-Dateien
+BACKUP_EXTENSIONS = tuple(codec['extension'] for codec in CODECS.values())
+
+# Puffergröße der Pipes zum Kompressionsprozess
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+# Verfahren aus der Konfiguration (unbekannte Werte fallen auf gzip zurück)
+def normalize_codec(codec):
+    codec = (codec or DEFAULT_CODEC).strip().lower()
+    return codec if codec in CODECS else DEFAULT_CODEC
+
+# Kompressionsstufe innerhalb der Grenzen des Verfahrens
+def normalize_level(codec, level):
+    settings = CODECS[normalize_codec(codec)]
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        return settings['default_level']
+    return min(settings['max_level'], max(settings['min_level'], level))
+
+# Anzahl der Kompressions-Threads (0 = alle Kerne)
+def normalize_threads(threads):
+    try:
+        threads = int(threads)
+    except (TypeError, ValueError):
+        threads = 0
+    return threads if threads > 0 else (os.cpu_count() or 1)
+
+def extension(codec):
+    return CODECS[normalize_codec(codec)]['extension']
+
+# Verfahren einer Backup-Datei anhand der Endung (None für unbekannte Dateien)
+def codec_for_file(filename):
+    for name, settings in CODECS.items():
+        if filename.endswith(settings['extension']):
+            return name
+    return None
+
+# Dateiname ohne Kompressionsendung
+def strip_extension(filename):
+    codec = codec_for_file(filename)
+    return filename[:-len(CODECS[codec]['extension'])] if codec else filename
+
+# Befehl, der stdin komprimiert nach stdout schreibt
+def compress_command(codec, level=None, threads=None):
+    codec = normalize_codec(codec)
+    level = normalize_level(codec, level)
+    threads = normalize_threads(threads)
+    if codec == 'zstd':
+        return ['zstd', '-q', f'-{level}', f'-T{threads}', '-c']
+    if codec == 'lz4':
+        # lz4 komprimiert nur mit einem Thread, ist dafür aber sehr schnell
+        return ['lz4', '-q', f'-{level}', '-c']
+    if shutil.which('pigz'):
+        return ['pigz', f'-{level}', '-p', str(threads), '-c']
+    return ['gzip', f'-{level}', '-c']
+
+# Befehl, der eine komprimierte Datei nach stdout entpackt
+def decompress_command(codec):
+    codec = normalize_codec(codec)
+    if codec == 'zstd':
+        return ['zstd', '-q', '-d', '-c']
+    if codec == 'lz4':
+        return ['lz4', '-q', '-d', '-c']
+    if shutil.which('pigz'):
+        return ['pigz', '-d', '-c']
+    return ['gzip', '-d', '-c']
+
+# Schreibt über einen Kompressionsprozess in eine Datei
+class CompressedWriter:
+    def __init__(self, path, command):
+        self.path = path
+        self.file = open(path, 'wb')
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self.file,
+                                            bufsize=PIPE_BUFFER_SIZE)
+        except Exception:
+            self.file.close()
+            raise
+
+    def write(self, data):
+        return self.process.stdin.write(data)
+
+    def flush(self):
+        self.process.stdin.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.process.stdin.close()
+            returncode = self.process.wait()
+        finally:
+            self.file.close()
+        if returncode != 0:
+            raise IOError(f"Kompression von {self.path} fehlgeschlagen ({self.process.args[0]}: {returncode})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type:
+            # Bei Fehlern den Prozess beenden, die Datei ist ohnehin unvollständig
+            self.process.kill()
+            self.process.wait()
+            self.file.close()
+            return False
+        self.close()
+        return False
+
+# Liest eine komprimierte Datei über einen Entpack-Prozess
+class DecompressedReader:
+    def __init__(self, path, command):
+        self.path = path
+        self.process = subprocess.Popen(command + [path], stdout=subprocess.PIPE, bufsize=PIPE_BUFFER_SIZE)
+
+    def read(self, size=-1):
+        return self.process.stdout.read(size)
+
+    def __iter__(self):
+        return iter(self.process.stdout)
+
+    def close(self):
+        if self.process.stdout.closed:
+            return
+        self.process.stdout.close()
+        returncode = self.process.wait()
+        if returncode not in (0, -13):
+            raise IOError(f"Entpacken von {self.path} fehlgeschlagen ({self.process.args[0]}: {returncode})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type:
+            self.process.kill()
+            self.process.wait()
+            self.process.stdout.close()
+            return False
+        self.close()
+        return False
+
+# Öffne eine Datei zum komprimierten Schreiben (threads=0 nutzt alle Kerne)
+def open_output(path, codec=None, level=None, threads=1):
+    codec = normalize_codec(codec)
+    command = compress_command(codec, level, threads)
+    if codec == 'gzip' and command[0] == 'gzip':
+        # Ohne pigz ist das gzip-Modul schneller als ein zusätzlicher Prozess
+        return gzip.open(path, 'wb', compresslevel=normalize_level(codec, level))
+    return CompressedWriter(path, command)
+
+# Öffne eine Backup-Datei zum Lesen (Verfahren anhand der Endung)
+def open_input(path, codec=None):
+    codec = normalize_codec(codec or codec_for_file(path))
+    command = decompress_command(codec)
+    if codec == 'gzip' and command[0] == 'gzip':
+        return gzip.open(path, 'rb')
+    return DecompressedReader(path, command)
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == 'compress-command':
+        args = sys.argv[2:] + [None, None]
+        print(' '.join(compress_command(args[0], args[1], args[2])))
+        return 0
+    if len(sys.argv) >= 3 and sys.argv[1] == 'decompress-command':
+        print(' '.join(decompress_command(sys.argv[2])))
+        return 0
+    if len(sys.argv) >= 3 and sys.argv[1] == 'extension':
+        print(extension(sys.argv[2]))
+        return 0
+    print("Aufruf: backup_codecs.py compress-command|decompress-command|extension CODEC [STUFE] [THREADS]",
+          file=sys.stderr)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Gemeinsames Laden und Speichern der backup.conf für Weboberfläche und Scheduler
+#
+# Die geparste Konfiguration wird pro Prozess zwischengespeichert und erst neu
+# gelesen, wenn sich Änderungszeit, Größe oder Inode der Datei ändern. Gespeichert
+# wird in eine temporäre Datei, die anschließend atomar umbenannt wird - Leser
+# sehen so immer entweder die alte oder die neue Datei, nie eine halb geschriebene.
+#
+# load_settings() liefert dieselbe Konfiguration typisiert (BackupSettings mit
+# DatabaseSettings je Datenbank): Zahlen und Wahrheitswerte werden einmal pro
+# Dateistand geparst statt bei jedem Aufrufer. load_backup_config() und
+# load_database_configs() liefern weiterhin die Textwerte für Formulare und
+# das Speichern.
+
+import os
+import errno
+import logging
+import tempfile
+import threading
+import dataclasses
+
+logger = logging.getLogger(__name__)
+
+# Konfigurationsdateien (BACKUP_CONFIG_DIR: abweichendes Verzeichnis, z.B. für Benchmarks)
+CONFIG_DIR = os.environ.get('BACKUP_CONFIG_DIR', '/app/config')
+CONFIG_FILE = os.path.join(CONFIG_DIR, 'backup.conf')
+
+# Zwischenspeicher der geparsten Konfiguration (Schlüssel: Dateistand)
+_cache = {'key': None, 'config': {}, 'databases': [], 'settings': None}
+_cache_lock = threading.Lock()
+
+# Stand der Datei (None, wenn sie nicht existiert)
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _parse_config(path):
+    config = {}
+
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    config[key.strip()] = value.strip().strip('"\'')
+
+    return config
+
+# Aktuelle Konfiguration aus dem Zwischenspeicher, bei Änderungen neu gelesen
+def _cached_config():
+    key = _file_key(CONFIG_FILE)
+    with _cache_lock:
+        if key is not None and key == _cache['key']:
+            return _cache
+        config = _parse_config(CONFIG_FILE)
+        # Wurde die Datei während des Lesens ersetzt, beim nächsten Aufruf erneut lesen
+        if key == _file_key(CONFIG_FILE):
+            _cache['key'] = key
+        else:
+            _cache['key'] = None
+        _cache['config'] = config
+        _cache['databases'] = _database_configs(config)
+        _cache['settings'] = BackupSettings.from_config(config, _cache['databases'])
+        return _cache
+
+# Verwerfe den Zwischenspeicher (z.B. nach dem Speichern)
+def invalidate_config_cache():
+    with _cache_lock:
+        _cache['key'] = None
+
+# Lade die Backup-Konfiguration
+def load_backup_config():
+    return dict(_cached_config()['config'])
+
+# Typisierte Konfiguration aus dem Zwischenspeicher (unveränderlich, ohne Kopie)
+def load_settings():
+    return _cached_config()['settings']
+
+# Lese einen Ganzzahlwert aus der Konfiguration (mit Untergrenze)
+def config_int(config, key, default, minimum=1):
+    if config.get(key) in (None, ''):
+        return default
+    try:
+        value = int(config[key])
+    except (TypeError, ValueError):
+        logger.warning(f"Ungültiger Wert für {key}: {config.get(key)}. Verwende {default}.")
+        return default
+    return value if minimum is None else max(minimum, value)
+
+# Lese einen Wahrheitswert aus der Konfiguration ("true"/"false")
+def config_bool(config, key, default=False):
+    value = config.get(key)
+    if value is None or value == '':
+        return default
+    return str(value).strip().lower() in ('true', '1', 'yes', 'on')
+
+# Lese einen Dezimalwert aus der Konfiguration (z.B. Bandbreiten in MB/s)
+def config_float(config, key, default, minimum=0):
+    if config.get(key) in (None, ''):
+        return default
+    try:
+        value = float(config[key])
+    except (TypeError, ValueError):
+        logger.warning(f"Ungültiger Wert für {key}: {config.get(key)}. Verwende {default}.")
+        return default
+    return value if minimum is None else max(minimum, value)
+
+# Einstellungen einer Datenbank mit geparsten Zahlen und Wahrheitswerten
+@dataclasses.dataclass(frozen=True)
+class DatabaseSettings:
+    id: str
+    name: str = ''
+    host: str = 'localhost'
+    port: int = 3306
+    user: str = 'root'
+    password: str = dataclasses.field(default='', repr=False)
+    database: str = ''
+    engine: str = 'mysqldump'
+    batch_rows: int = 1000
+    threads: int = 4
+    chunk_rows: int = 1000000
+    change_detection: str = 'off'
+    codec: str = 'gzip'
+    codec_level: int = None
+    incremental: bool = False
+    full_interval: float = 24.0
+    format: str = 'file'
+
+    # Aus den Textwerten von load_database_configs()
+    @classmethod
+    def from_dict(cls, db):
+        db_id = str(db.get('id', '1'))
+        return cls(
+            id=db_id,
+            name=db.get('name') or f'Datenbank {db_id}',
+            host=db.get('host') or 'localhost',
+            port=config_int(db, 'port', 3306),
+            user=db.get('user') or 'root',
+            password=db.get('password') or '',
+            database=db.get('database') or '',
+            engine=db.get('engine') or 'mysqldump',
+            batch_rows=config_int(db, 'batch_rows', 1000),
+            threads=config_int(db, 'threads', 4),
+            chunk_rows=config_int(db, 'chunk_rows', 1000000, minimum=0),
+            change_detection=db.get('change_detection') or 'off',
+            codec=db.get('codec') or 'gzip',
+            codec_level=config_int(db, 'codec_level', None, minimum=None),
+            incremental=config_bool(db, 'incremental'),
+            full_interval=config_float(db, 'full_interval', 24.0),
+            format=db.get('format') or 'file'
+        )
+
+    # Kopie mit geänderten Werten (z.B. Parameter der Kommandozeile)
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+# Allgemeine Einstellungen der backup.conf mit geparsten Zahlen und Wahrheitswerten
+# values: alle Textwerte (z.B. für die Zugangsdaten der Speicherziele)
+@dataclasses.dataclass(frozen=True)
+class BackupSettings:
+    backup_dir: str = '/app/backups'
+    repository_dir: str = ''
+    retention_days: int = 7
+    parallel_jobs: int = 4
+    parallel_per_host: int = 2
+    codec_threads: int = 0
+    verify_days: int = 2
+    verify_jobs: int = 2
+    smb_enabled: bool = False
+    smb_share: str = ''
+    smb_copy_jobs: int = 4
+    storage_backend: str = 'none'
+    storage_keep_local: bool = True
+    storage_upload_jobs: int = 4
+    throttle_threads_running: int = 0
+    throttle_replication_lag: int = 0
+    throttle_history_length: int = 0
+    throttle_interval: int = 5
+    throttle_max_pause: int = 30
+    throttle_write_limit: float = 0.0
+    throttle_smb_limit: float = 0.0
+    databases: tuple = ()
+    values: dict = dataclasses.field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_config(cls, config, databases=None):
+        if databases is None:
+            databases = _database_configs(config)
+        return cls(
+            backup_dir=config.get('BACKUP_DIR') or '/app/backups',
+            repository_dir=config.get('REPOSITORY_DIR', ''),
+            retention_days=config_int(config, 'BACKUP_RETENTION', 7, minimum=0),
+            parallel_jobs=config_int(config, 'BACKUP_PARALLEL_JOBS', 4),
+            parallel_per_host=config_int(config, 'BACKUP_PARALLEL_PER_HOST', 2),
+            codec_threads=config_int(config, 'CODEC_THREADS', 0, minimum=0),
+            verify_days=config_int(config, 'VERIFY_DAYS', 2, minimum=0),
+            verify_jobs=config_int(config, 'VERIFY_JOBS', 2),
+            smb_enabled=config_bool(config, 'SMB_ENABLED'),
+            smb_share=config.get('SMB_SHARE', ''),
+            smb_copy_jobs=config_int(config, 'SMB_COPY_JOBS', 4),
+            storage_backend=config.get('STORAGE_BACKEND') or 'none',
+            storage_keep_local=config_bool(config, 'STORAGE_KEEP_LOCAL', True),
+            storage_upload_jobs=config_int(config, 'STORAGE_UPLOAD_JOBS', 4),
+            throttle_threads_running=config_int(config, 'THROTTLE_THREADS_RUNNING', 0, minimum=0),
+            throttle_replication_lag=config_int(config, 'THROTTLE_REPLICATION_LAG', 0, minimum=0),
+            throttle_history_length=config_int(config, 'THROTTLE_HISTORY_LENGTH', 0, minimum=0),
+            throttle_interval=config_int(config, 'THROTTLE_INTERVAL', 5),
+            throttle_max_pause=config_int(config, 'THROTTLE_MAX_PAUSE', 30, minimum=0),
+            throttle_write_limit=config_float(config, 'THROTTLE_WRITE_LIMIT', 0.0),
+            throttle_smb_limit=config_float(config, 'THROTTLE_SMB_LIMIT', 0.0),
+            databases=tuple(DatabaseSettings.from_dict(db) for db in databases),
+            values=dict(config)
+        )
+
+    # Einstellungen einer Datenbank (None, wenn die ID nicht konfiguriert ist)
+    def database(self, db_id):
+        return next((db for db in self.databases if db.id == str(db_id)), None)
+
+# Prüfe, ob die Konfiguration Einträge im Format DB_[ID]_NAME enthält
+def has_database_entries(config):
+    return any(key.startswith('DB_') and key.endswith('_NAME') for key in config.keys())
+
+# Lade Datenbank-Konfigurationen
+def load_database_configs():
+    return [dict(db) for db in _cached_config()['databases']]
+
+# Datenbank-Konfigurationen aus der geparsten backup.conf
+def _database_configs(config):
+    databases = []
+    db_ids = set()
+
+    # Finde alle konfigurierten Datenbanken
+    for key in config.keys():
+        if key.startswith('DB_') and '_NAME' in key:
+            db_id = key.split('_')[1]
+            db_ids.add(db_id)
+
+    # Sortiere die IDs numerisch
+    db_ids = sorted(db_ids, key=int)
+
+    # Erstelle für jede Datenbank eine Konfiguration
+    for db_id in db_ids:
+        prefix = f'DB_{db_id}_'
+        db_config = {
+            'id': db_id,
+            'name': config.get(f'{prefix}NAME', f'Datenbank {db_id}'),
+            'host': config.get(f'{prefix}HOST', 'localhost'),
+            'port': config.get(f'{prefix}PORT', '3306'),
+            'user': config.get(f'{prefix}USER', 'root'),
+            'password': config.get(f'{prefix}PASSWORD', ''),
+            'database': config.get(f'{prefix}DATABASE', ''),
+            'engine': config.get(f'{prefix}ENGINE', 'mysqldump'),
+            'batch_rows': config.get(f'{prefix}BATCH_ROWS', '1000'),
+            'threads': config.get(f'{prefix}THREADS', '4'),
+            'chunk_rows': config.get(f'{prefix}CHUNK_ROWS', '1000000'),
+            'change_detection': config.get(f'{prefix}CHANGE_DETECTION', 'off'),
+            'codec': config.get(f'{prefix}CODEC', 'gzip'),
+            'codec_level': config.get(f'{prefix}CODEC_LEVEL', ''),
+            'incremental': config.get(f'{prefix}INCREMENTAL', 'false'),
+            'full_interval': config.get(f'{prefix}FULL_INTERVAL', '24'),
+            'format': config.get(f'{prefix}FORMAT', 'file')
+        }
+        databases.append(db_config)
+
+    # Wenn keine Datenbanken konfiguriert sind, erstelle eine Standard-Datenbank
+    if not databases:
+        # Für Abwärtskompatibilität: Wenn alte Konfiguration vorhanden ist, verwende diese
+        if 'MYSQL_HOST' in config:
+            databases.append({
+                'id': '1',
+                'name': 'Datenbank 1',
+                'host': config.get('MYSQL_HOST', 'localhost'),
+                'port': config.get('MYSQL_PORT', '3306'),
+                'user': config.get('MYSQL_USER', 'root'),
+                'password': config.get('MYSQL_PASSWORD', ''),
+                'database': config.get('MYSQL_DATABASE', '')
+            })
+        else:
+            # Sonst erstelle eine leere Standard-Datenbank
+            databases.append({
+                'id': '1',
+                'name': 'Datenbank 1',
+                'host': 'localhost',
+                'port': '3306',
+                'user': 'root',
+                'password': '',
+                'database': ''
+            })
+
+    return databases
+
+# Schreibe eine Datei atomar (temporäre Datei im selben Verzeichnis, dann umbenennen)
+def write_file_atomic(path, content, mode=None):
+    directory = os.path.dirname(path) or '.'
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # Ist die Datei selbst als Volume eingebunden, kann sie nicht ersetzt werden
+            if e.errno not in (errno.EBUSY, errno.EXDEV):
+                raise
+            logger.warning(f"{path} kann nicht atomar ersetzt werden ({e.strerror}), schreibe direkt.")
+            with open(path, 'w') as f:
+                f.write(content)
+            os.remove(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# Speichere die Backup-Konfiguration
+def save_backup_config(config, databases):
+    lines = [
+        "# MySQL-Backup-Konfiguration",
+        "# Automatisch generiert durch die Weboberfläche",
+        "",
+        "# Allgemeine Backup-Einstellungen",
+        f'BACKUP_DIR="{config.get("BACKUP_DIR", "/app/backups")}"',
+        f'BACKUP_RETENTION="{config.get("BACKUP_RETENTION", "7")}"',
+        f'RETENTION_HOURLY="{config.get("RETENTION_HOURLY", "0")}"',
+        f'RETENTION_DAILY="{config.get("RETENTION_DAILY", "0")}"',
+        f'RETENTION_WEEKLY="{config.get("RETENTION_WEEKLY", "0")}"',
+        f'RETENTION_MONTHLY="{config.get("RETENTION_MONTHLY", "0")}"',
+        f'BACKUP_PARALLEL_JOBS="{config.get("BACKUP_PARALLEL_JOBS", "4")}"',
+        f'BACKUP_PARALLEL_PER_HOST="{config.get("BACKUP_PARALLEL_PER_HOST", "2")}"',
+        f'CODEC_THREADS="{config.get("CODEC_THREADS", "0")}"',
+        f'REPOSITORY_DIR="{config.get("REPOSITORY_DIR", "")}"',
+        f'VERIFY_DAYS="{config.get("VERIFY_DAYS", "2")}"',
+        f'VERIFY_JOBS="{config.get("VERIFY_JOBS", "2")}"',
+        "",
+        "# SMB-Share-Einstellungen",
+        f'SMB_ENABLED="{config.get("SMB_ENABLED", "false")}"',
+        f'SMB_SHARE="{config.get("SMB_SHARE", "")}"',
+        f'SMB_MOUNT="{config.get("SMB_MOUNT", "/mnt/backup")}"',
+        f'SMB_USER="{config.get("SMB_USER", "")}"',
+        f'SMB_PASSWORD="{config.get("SMB_PASSWORD", "")}"',
+        f'SMB_DOMAIN="{config.get("SMB_DOMAIN", "WORKGROUP")}"',
+        f'SMB_COPY_JOBS="{config.get("SMB_COPY_JOBS", "4")}"',
+        "",
+        "# Zusätzliches Speicherziel (none, local, s3 oder sftp)",
+        f'STORAGE_BACKEND="{config.get("STORAGE_BACKEND", "none")}"',
+        f'STORAGE_KEEP_LOCAL="{config.get("STORAGE_KEEP_LOCAL", "true")}"',
+        f'STORAGE_UPLOAD_JOBS="{config.get("STORAGE_UPLOAD_JOBS", "4")}"',
+        f'STORAGE_PATH="{config.get("STORAGE_PATH", "")}"',
+        f'S3_ENDPOINT="{config.get("S3_ENDPOINT", "")}"',
+        f'S3_REGION="{config.get("S3_REGION", "")}"',
+        f'S3_BUCKET="{config.get("S3_BUCKET", "")}"',
+        f'S3_PREFIX="{config.get("S3_PREFIX", "")}"',
+        f'S3_ACCESS_KEY="{config.get("S3_ACCESS_KEY", "")}"',
+        f'S3_SECRET_KEY="{config.get("S3_SECRET_KEY", "")}"',
+        f'S3_PART_SIZE="{config.get("S3_PART_SIZE", "64")}"',
+        f'SFTP_HOST="{config.get("SFTP_HOST", "")}"',
+        f'SFTP_PORT="{config.get("SFTP_PORT", "22")}"',
+        f'SFTP_USER="{config.get("SFTP_USER", "")}"',
+        f'SFTP_PASSWORD="{config.get("SFTP_PASSWORD", "")}"',
+        f'SFTP_KEY_FILE="{config.get("SFTP_KEY_FILE", "")}"',
+        f'SFTP_PATH="{config.get("SFTP_PATH", "")}"',
+        "",
+        "# Drosselung (Schwellen der Serverlast, 0 = nicht prüfen; Bandbreiten in MB/s, 0 = unbegrenzt)",
+        f'THROTTLE_THREADS_RUNNING="{config.get("THROTTLE_THREADS_RUNNING", "0")}"',
+        f'THROTTLE_REPLICATION_LAG="{config.get("THROTTLE_REPLICATION_LAG", "0")}"',
+        f'THROTTLE_HISTORY_LENGTH="{config.get("THROTTLE_HISTORY_LENGTH", "0")}"',
+        f'THROTTLE_INTERVAL="{config.get("THROTTLE_INTERVAL", "5")}"',
+        f'THROTTLE_MAX_PAUSE="{config.get("THROTTLE_MAX_PAUSE", "30")}"',
+        f'THROTTLE_WRITE_LIMIT="{config.get("THROTTLE_WRITE_LIMIT", "0")}"',
+        f'THROTTLE_SMB_LIMIT="{config.get("THROTTLE_SMB_LIMIT", "0")}"',
+        "",
+        "# Datenbank-Konfigurationen"
+    ]
+    for db in databases:
+        db_id = db.get('id', '1')
+        lines += [
+            f'# Datenbank {db_id}',
+            f'DB_{db_id}_NAME="{db.get("name", f"Datenbank {db_id}")}"',
+            f'DB_{db_id}_HOST="{db.get("host", "localhost")}"',
+            f'DB_{db_id}_PORT="{db.get("port", "3306")}"',
+            f'DB_{db_id}_USER="{db.get("user", "root")}"',
+            f'DB_{db_id}_PASSWORD="{db.get("password", "")}"',
+            f'DB_{db_id}_DATABASE="{db.get("database", "")}"',
+            f'DB_{db_id}_ENGINE="{db.get("engine", "mysqldump")}"',
+            f'DB_{db_id}_BATCH_ROWS="{db.get("batch_rows", "1000")}"',
+            f'DB_{db_id}_THREADS="{db.get("threads", "4")}"',
+            f'DB_{db_id}_CHUNK_ROWS="{db.get("chunk_rows", "1000000")}"',
+            f'DB_{db_id}_CHANGE_DETECTION="{db.get("change_detection", "off")}"',
+            f'DB_{db_id}_CODEC="{db.get("codec", "gzip")}"',
+            f'DB_{db_id}_CODEC_LEVEL="{db.get("codec_level", "")}"',
+            f'DB_{db_id}_INCREMENTAL="{db.get("incremental", "false")}"',
+            f'DB_{db_id}_FULL_INTERVAL="{db.get("full_interval", "24")}"',
+            f'DB_{db_id}_FORMAT="{db.get("format", "file")}"',
+            ""
+        ]
+    write_file_atomic(CONFIG_FILE, '\n'.join(lines) + '\n')
+    invalidate_config_cache()
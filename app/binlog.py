@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Inkrementelle Backups über das Binärlog
+#
+# Eine Sicherungskette beginnt mit einem vollständigen Backup, dessen
+# Binlog-Position beim Snapshot festgehalten wird. Folgende Läufe sichern nur
+# die Binlog-Ereignisse seit dem letzten Checkpoint (mysqlbinlog
+# --read-from-remote-server) als SQL in eine komprimierte Datei. Jede Sicherung
+# einer Kette erhält eine Begleitdatei <backup>.meta.json:
+#
+#   {"type": "full" | "incremental", "chain": <Basis-Backup>, "parent": <Vorgänger>,
+#    "start": {"file", "position"}, "end": {"file", "position", "gtid_executed"}, ...}
+#
+# Aufruf aus backup.sh:
+#   binlog.py mode <db_id>                  -> "full" oder "incremental"
+#   binlog.py base <db_id> <backup>         -> Binlog-Position eines vollen Backups festhalten
+#   binlog.py incremental <db_id> <datei>   -> Binlog-Ereignisse seit dem letzten Checkpoint sichern
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import datetime
+import subprocess
+from dumper import connect, load_database, log_stderr
+from backup_config import load_settings
+from backup_codecs import open_output, open_input, codec_for_file, normalize_threads
+from parallel_dump import load_manifest
+
+# Version des Metadaten-Formats
+META_FORMAT = 1
+META_SUFFIX = '.meta.json'
+
+# Binlog-Position im Kopf eines mysqldump mit --master-data=2 (bzw. --source-data=2)
+DUMP_COORDINATES = re.compile(
+    r"(?:MASTER|SOURCE)_LOG_FILE='([^']+)',\s*(?:MASTER|SOURCE)_LOG_POS=(\d+)")
+
+# So viel vom Dump-Anfang wird nach der Binlog-Position durchsucht
+DUMP_HEAD_BYTES = 1024 * 1024
+
+# Blockgröße beim Kopieren der mysqlbinlog-Ausgabe
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def meta_path(backup_path):
+    return backup_path + META_SUFFIX
+
+# Lese die Metadaten eines Backups (None, wenn es zu keiner Kette gehört)
+def load_meta(backup_path):
+    path = meta_path(backup_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Schreibe die Metadaten eines Backups atomar
+def write_meta(backup_path, meta):
+    path = meta_path(backup_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+# Alle Sicherungen mit Metadaten in einem Backup-Verzeichnis, die ältesten zuerst
+def list_chain_entries(backup_dir, db_id=None):
+    entries = []
+    if not os.path.isdir(backup_dir):
+        return entries
+    for name in os.listdir(backup_dir):
+        if not name.startswith('mysql_backup_') or not name.endswith(META_SUFFIX):
+            continue
+        filename = name[:-len(META_SUFFIX)]
+        # Metadaten ohne zugehöriges Backup gehören zu keiner gültigen Kette
+        if not os.path.exists(os.path.join(backup_dir, filename)):
+            continue
+        meta = load_meta(os.path.join(backup_dir, filename))
+        if not meta or (db_id is not None and str(meta.get('db_id')) != str(db_id)):
+            continue
+        meta['filename'] = filename
+        entries.append(meta)
+    entries.sort(key=lambda entry: entry.get('created', ''))
+    return entries
+
+# Letzte Sicherung einer Datenbank, an die ein inkrementelles Backup anschließen kann
+def latest_checkpoint(backup_dir, db_id):
+    entries = [entry for entry in list_chain_entries(backup_dir, db_id) if entry.get('end')]
+    return entries[-1] if entries else None
+
+# Aktuelle Binlog-Position des Servers
+def server_status(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW MASTER STATUS")
+        row = cursor.fetchone()
+    if not row:
+        raise RuntimeError("Das Binärlog ist auf dem Server nicht aktiviert (log_bin)")
+    status = {'file': row[0], 'position': int(row[1])}
+    if len(row) > 4 and row[4]:
+        status['gtid_executed'] = row[4].replace('\n', '')
+    return status
+
+# Auf dem Server vorhandene Binlog-Dateien in Reihenfolge
+def binary_logs(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW BINARY LOGS")
+        return [row[0] for row in cursor.fetchall()]
+
+# Binlog-Position aus dem Kopf eines mysqldump lesen
+def read_dump_coordinates(path):
+    with open_input(path) as f:
+        head = f.read(DUMP_HEAD_BYTES)
+    match = DUMP_COORDINATES.search(head.decode('utf-8', errors='replace'))
+    if not match:
+        return None
+    return {'file': match.group(1), 'position': int(match.group(2))}
+
+# Binlog-Position eines vollständigen Backups (Datei oder Verzeichnis mit Manifest)
+def backup_coordinates(path):
+    if os.path.isdir(path):
+        snapshot = load_manifest(path).get('snapshot', {})
+        if not snapshot.get('binlog_file'):
+            return None
+        coordinates = {'file': snapshot['binlog_file'], 'position': snapshot['binlog_position']}
+        if snapshot.get('gtid_executed'):
+            coordinates['gtid_executed'] = snapshot['gtid_executed']
+        return coordinates
+    return read_dump_coordinates(path)
+
+# Alter der Basissicherung einer Kette in Stunden
+def chain_age_hours(backup_dir, checkpoint):
+    base = load_meta(os.path.join(backup_dir, checkpoint['chain']))
+    if not base:
+        return None
+    created = datetime.datetime.fromisoformat(base['created'])
+    return (datetime.datetime.now() - created).total_seconds() / 3600
+
+# Entscheide, ob der nächste Lauf ein volles oder ein inkrementelles Backup ist
+def decide_mode(db, backup_dir):
+    if not db.incremental:
+        return 'full', "Inkrementelle Backups sind nicht aktiviert"
+    checkpoint = latest_checkpoint(backup_dir, db.id)
+    if not checkpoint:
+        return 'full', "Keine Basissicherung mit Binlog-Position vorhanden"
+
+    full_interval = db.full_interval
+    age = chain_age_hours(backup_dir, checkpoint)
+    if age is None:
+        return 'full', f"Basissicherung {checkpoint['chain']} nicht mehr vorhanden"
+    if age >= full_interval:
+        return 'full', f"Basissicherung ist {age:.1f} Stunden alt (Intervall: {full_interval:g} Stunden)"
+
+    connection = connect(db)
+    try:
+        logs = binary_logs(connection)
+    finally:
+        connection.close()
+    if checkpoint['end']['file'] not in logs:
+        # Ohne lückenloses Binärlog ist die Kette nicht fortsetzbar
+        return 'full', f"Binlog {checkpoint['end']['file']} ist auf dem Server nicht mehr vorhanden"
+    return 'incremental', f"Anschluss an {checkpoint['filename']}"
+
+# Halte die Binlog-Position eines vollständigen Backups als Beginn einer Kette fest
+def record_base(db, backup_path):
+    coordinates = backup_coordinates(backup_path)
+    if not coordinates:
+        return None
+    filename = os.path.basename(backup_path)
+    meta = {
+        'format': META_FORMAT,
+        'type': 'full',
+        'db_id': db.id,
+        'database': db.database,
+        'created': datetime.datetime.now().isoformat(),
+        'chain': filename,
+        'parent': None,
+        'end': coordinates
+    }
+    write_meta(backup_path, meta)
+    return meta
+
+# Befehl für mysqlbinlog (bei MariaDB heißt das Programm mariadb-binlog)
+def binlog_command():
+    for command in ('mysqlbinlog', 'mariadb-binlog'):
+        if shutil.which(command):
+            return command
+    raise RuntimeError("mysqlbinlog ist nicht installiert")
+
+# Sichere die Binlog-Ereignisse seit dem letzten Checkpoint in eine komprimierte Datei
+def capture_incremental(db, backup_dir, output_path, threads=None, log=None):
+    checkpoint = latest_checkpoint(backup_dir, db.id)
+    if not checkpoint:
+        raise RuntimeError("Keine Basissicherung mit Binlog-Position vorhanden")
+    start = checkpoint['end']
+
+    connection = connect(db)
+    try:
+        end = server_status(connection)
+        logs = binary_logs(connection)
+    finally:
+        connection.close()
+    if start['file'] not in logs:
+        raise RuntimeError(f"Binlog {start['file']} ist auf dem Server nicht mehr vorhanden")
+
+    # Alle Binlog-Dateien vom Checkpoint bis zur aktuellen Position; --start-position gilt
+    # für die erste, --stop-position für die letzte Datei
+    files = logs[logs.index(start['file']):logs.index(end['file']) + 1]
+    command = [binlog_command(), '--read-from-remote-server',
+               '--host', db.host, '--port', str(db.port),
+               '--user', db.user, '--database', db.database,
+               f"--start-position={start['position']}", f"--stop-position={end['position']}"] + files
+    if log:
+        log(f"Sichere Binlog {start['file']}:{start['position']} bis {end['file']}:{end['position']} "
+            f"({len(files)} Datei(en))")
+
+    # Das Passwort nicht auf der Kommandozeile übergeben
+    env = dict(os.environ, MYSQL_PWD=db.password)
+    codec = codec_for_file(output_path)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+    try:
+        with open_output(output_path, codec, db.codec_level, normalize_threads(threads)) as out:
+            while True:
+                data = process.stdout.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                out.write(data)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"mysqlbinlog fehlgeschlagen (Exit-Code {returncode})")
+
+    meta = {
+        'format': META_FORMAT,
+        'type': 'incremental',
+        'db_id': db.id,
+        'database': db.database,
+        'created': datetime.datetime.now().isoformat(),
+        'chain': checkpoint['chain'],
+        'parent': checkpoint['filename'],
+        'start': start,
+        'end': end
+    }
+    write_meta(output_path, meta)
+    return meta
+
+def main():
+    parser = argparse.ArgumentParser(description='Inkrementelle Backups über das Binärlog')
+    parser.add_argument('action', choices=['mode', 'base', 'incremental'])
+    parser.add_argument('db_id', help='ID der Datenbank aus der backup.conf')
+    parser.add_argument('path', nargs='?', help='Backup-Datei oder -Verzeichnis')
+    args = parser.parse_args()
+
+    db = load_database(args.db_id)
+    if not db or not db.database:
+        log_stderr(f"FEHLER: Datenbank mit ID {args.db_id} nicht gefunden!")
+        return 1
+    settings = load_settings()
+    backup_dir = settings.backup_dir
+
+    if args.action == 'mode':
+        try:
+            mode, reason = decide_mode(db, backup_dir)
+        except Exception as e:
+            mode, reason = 'full', f"Binlog-Status nicht abrufbar ({e})"
+        log_stderr(f"Backup-Modus für {db.database}: {mode} - {reason}")
+        print(mode)
+        return 0
+
+    if not args.path:
+        parser.error('Pfad des Backups fehlt')
+
+    if args.action == 'base':
+        try:
+            meta = record_base(db, args.path)
+        except Exception as e:
+            log_stderr(f"FEHLER: Binlog-Position von {args.path} nicht lesbar: {e}")
+            return 1
+        if not meta:
+            log_stderr(f"WARNUNG: {os.path.basename(args.path)} enthält keine Binlog-Position, "
+                       f"es kann nicht als Basis für inkrementelle Backups dienen.")
+            return 1
+        log_stderr(f"Basissicherung {meta['chain']} bei {meta['end']['file']}:{meta['end']['position']}")
+        return 0
+
+    try:
+        meta = capture_incremental(db, backup_dir, args.path, settings.codec_threads, log=log_stderr)
+    except Exception as e:
+        log_stderr(f"FEHLER: Inkrementelles Backup von {db.database} fehlgeschlagen: {e}")
+        return 1
+    log_stderr(f"Inkrementelles Backup von {db.database} bis {meta['end']['file']}:{meta['end']['position']} "
+               f"(Kette {meta['chain']})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
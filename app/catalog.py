@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Katalog aller Backups
+#
+# Jedes erfolgreiche Backup wird von backup.sh mit Datenbank, Zeitpunkt, Größe,
+# Kompression, Prüfsumme und Dauer in eine SQLite-Datenbank eingetragen. Die
+# Weboberfläche liest die Backup-Liste seitenweise aus dem Katalog, statt bei
+# jedem Seitenaufruf das Backup-Verzeichnis (ggf. auf einem Netzlaufwerk)
+# aufzulisten und jede Datei einzeln abzufragen.
+#
+# Der Katalog liegt im Konfigurationsverzeichnis, weil SQLite auf CIFS-Freigaben
+# keine zuverlässigen Sperren hat. Fehlt er, wird er einmalig aus den vorhandenen
+# Backups aufgebaut; danach halten record und die Bereinigung ihn aktuell. Nach
+# manuellen Änderungen gleicht "catalog.py sync" (bzw. "Katalog abgleichen" in der
+# Weboberfläche) ihn mit Backup-Verzeichnis, Repository und Speicherziel ab.
+#
+# Aufruf aus backup.sh:
+#   catalog.py record <dateiname> --db-id 1 --database shop --engine mysqldump --duration 42 [--stats compressed.json]
+#   catalog.py sync
+#   catalog.py list [--db-id 1] [--json]
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import contextlib
+from backup_config import CONFIG_DIR, load_backup_config
+from backup_codecs import BACKUP_EXTENSIONS, codec_for_file
+from binlog import META_SUFFIX, load_meta
+from parallel_dump import MANIFEST_FILE
+from chunkstore import ChunkStore, repository_dir
+from storage import storage_from_config
+from profiler import load_probe
+
+CATALOG_FILE = os.path.join(CONFIG_DIR, 'catalog.sqlite')
+
+# Einträge pro Seite in der Weboberfläche
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Dateinamen: mysql_backup_[DB_ID]_[DATENBANK]_[JJJJMMTT]_[HHMMSS][.binlog].sql.gz
+# Der Datenbankname darf Unterstriche enthalten, daher wird vom Zeitstempel aus zerlegt
+FILENAME_PATTERN = re.compile(r'^mysql_backup_(?:(\d+)_)?(.+)_(\d{8}_\d{6})(?:\.binlog)?(?:\.sql\.\w+)?$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    filename TEXT PRIMARY KEY,
+    db_id TEXT NOT NULL,
+    database TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    backup_type TEXT NOT NULL DEFAULT 'full',
+    chain TEXT,
+    parent TEXT,
+    engine TEXT,
+    codec TEXT,
+    created TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    stored_bytes INTEGER,
+    checksum TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS backups_created ON backups (created);
+CREATE INDEX IF NOT EXISTS backups_db_created ON backups (db_id, created);
+CREATE INDEX IF NOT EXISTS backups_chain ON backups (chain);
+CREATE TABLE IF NOT EXISTS profiles (
+    filename TEXT PRIMARY KEY,
+    profile TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS integrity (
+    filename TEXT PRIMARY KEY,
+    sha256 TEXT,
+    raw_bytes INTEGER,
+    rows INTEGER,
+    status TEXT,
+    checked TEXT,
+    message TEXT
+);
+"""
+
+COLUMNS = ('filename', 'db_id', 'database', 'kind', 'backup_type', 'chain', 'parent', 'engine', 'codec',
+           'created', 'size', 'stored_bytes', 'checksum', 'duration')
+
+# Datenbank-ID und -Name aus dem Dateinamen (alte Backups ohne ID gehören zu DB 1)
+def parse_filename(filename):
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return '1', 'unbekannt'
+    return match.group(1) or '1', match.group(2)
+
+# SHA-256 einer Datei
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def timestamp(mtime):
+    return datetime.datetime.fromtimestamp(mtime).isoformat(timespec='seconds')
+
+# Katalogeintrag für eine Backup-Datei oder ein Verzeichnis-Backup (None, wenn es keines ist)
+def describe_backup(backup_dir, filename, checksum=False):
+    if not filename.startswith('mysql_backup_') or filename.endswith(META_SUFFIX):
+        return None
+    path = os.path.join(backup_dir, filename)
+    if os.path.isdir(path):
+        # Tabellenweise Backups sind erst mit Manifest vollständig
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        kind = 'directory'
+        size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        created = timestamp(os.stat(manifest_path).st_mtime)
+        codec = None
+        with contextlib.suppress(OSError, ValueError):
+            with open(manifest_path) as f:
+                codec = json.load(f).get('codec')
+        checksum_path = manifest_path
+    elif filename.endswith(BACKUP_EXTENSIONS) and os.path.isfile(path):
+        kind = 'file'
+        stat = os.stat(path)
+        size = stat.st_size
+        created = timestamp(stat.st_mtime)
+        codec = codec_for_file(filename)
+        checksum_path = path
+    else:
+        return None
+    db_id, database = parse_filename(filename)
+    meta = load_meta(path) or {}
+    return {
+        'filename': filename,
+        'db_id': str(meta.get('db_id') or db_id),
+        'database': meta.get('database') or database,
+        'kind': kind,
+        'backup_type': meta.get('type', 'full'),
+        'chain': meta.get('chain'),
+        'parent': meta.get('parent'),
+        'engine': None,
+        'codec': codec,
+        'created': created,
+        'size': size,
+        'stored_bytes': None,
+        'checksum': file_checksum(checksum_path) if checksum else None,
+        'duration': None
+    }
+
+# Katalogeintrag für einen Snapshot im Repository
+def describe_snapshot(snapshot):
+    db_id, database = parse_filename(snapshot['name'])
+    return {
+        'filename': snapshot['name'],
+        'db_id': str(snapshot.get('db_id') or db_id),
+        'database': snapshot.get('database') or database,
+        'kind': 'repository',
+        'backup_type': 'full',
+        'chain': None,
+        'parent': None,
+        'engine': None,
+        'codec': None,
+        'created': snapshot['created'][:19],
+        'size': snapshot.get('size', 0),
+        'stored_bytes': snapshot.get('stored_bytes', 0),
+        'checksum': snapshot.get('sha256'),
+        'duration': None
+    }
+
+# Katalogeintrag für ein Backup, das nur im Speicherziel liegt (STORAGE_KEEP_LOCAL="false")
+def describe_remote(storage, backup):
+    filename = backup['filename']
+    db_id, database = parse_filename(filename)
+    meta = (storage.load_meta(filename) if backup.get('has_meta') else None) or {}
+    return {
+        'filename': filename,
+        'db_id': str(meta.get('db_id') or db_id),
+        'database': meta.get('database') or database,
+        'kind': 'remote',
+        'backup_type': meta.get('type', 'full'),
+        'chain': meta.get('chain'),
+        'parent': meta.get('parent'),
+        'engine': None,
+        'codec': None if backup['is_directory'] else codec_for_file(filename),
+        'created': timestamp(backup['mtime']),
+        'size': backup['size'],
+        'stored_bytes': None,
+        'checksum': None,
+        'duration': None
+    }
+
+# Alle Backups im Backup-Verzeichnis, im Repository und im Speicherziel (für Aufbau und Abgleich des Katalogs)
+def scan_backups(config):
+    entries = []
+    backup_dir = config.get('BACKUP_DIR', '/app/backups')
+    if os.path.isdir(backup_dir):
+        for filename in os.listdir(backup_dir):
+            entry = describe_backup(backup_dir, filename)
+            if entry:
+                entries.append(entry)
+    store = ChunkStore(repository_dir(config))
+    entries.extend(describe_snapshot(snapshot) for snapshot in store.list_snapshots())
+    storage = storage_from_config(config)
+    if storage is not None:
+        local = {entry['filename'] for entry in entries}
+        entries.extend(describe_remote(storage, backup) for backup in storage.list()
+                       if backup['filename'] not in local)
+    return entries
+
+# Zeile des Katalogs für Weboberfläche und API
+def row_to_backup(row):
+    backup = dict(row)
+    backup['date'] = datetime.datetime.fromisoformat(backup['created'])
+    backup['is_directory'] = backup['kind'] == 'directory'
+    backup['is_repository'] = backup['kind'] == 'repository'
+    backup['is_remote'] = backup['kind'] == 'remote'
+    backup['has_profile'] = bool(backup.get('has_profile'))
+    backup.setdefault('integrity_status', None)
+    backup.setdefault('integrity_message', None)
+    return backup
+
+class BackupCatalog:
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @contextlib.contextmanager
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    # Trage ein Backup ein (ein vorhandener Eintrag gleichen Namens wird ersetzt)
+    def record(self, entry):
+        values = [entry.get(column) for column in COLUMNS]
+        with self.connect() as connection:
+            connection.execute(f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNS)}) "
+                               f"VALUES ({', '.join('?' for _ in COLUMNS)})", values)
+
+    def remove(self, filename):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM profiles WHERE filename = ?", (filename,))
+            connection.execute("DELETE FROM integrity WHERE filename = ?", (filename,))
+            return connection.execute("DELETE FROM backups WHERE filename = ?", (filename,)).rowcount
+
+    def get(self, filename):
+        with self.connect() as connection:
+            row = connection.execute("SELECT * FROM backups WHERE filename = ?", (filename,)).fetchone()
+        return row_to_backup(row) if row else None
+
+    # Backups seitenweise, neueste zuerst
+    def query(self, db_id=None, page=1, per_page=DEFAULT_PAGE_SIZE):
+        per_page = min(MAX_PAGE_SIZE, max(1, per_page))
+        page = max(1, page)
+        where, params = ('WHERE db_id = ?', [db_id]) if db_id else ('', [])
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT backups.*, profiles.filename IS NOT NULL AS has_profile, "
+                                      f"integrity.status AS integrity_status, "
+                                      f"integrity.message AS integrity_message "
+                                      f"FROM backups LEFT JOIN profiles USING (filename) "
+                                      f"LEFT JOIN integrity USING (filename) {where} "
+                                      f"ORDER BY created DESC, filename DESC LIMIT ? OFFSET ?",
+                                      params + [per_page, (page - 1) * per_page]).fetchall()
+        return [row_to_backup(row) for row in rows]
+
+    # Alle Backups (für die Bereinigung, siehe retention.py)
+    def entries(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT * FROM backups ORDER BY created").fetchall()
+        return [row_to_backup(row) for row in rows]
+
+    def remove_many(self, filenames):
+        with self.connect() as connection:
+            connection.executemany("DELETE FROM profiles WHERE filename = ?", [(name,) for name in filenames])
+            connection.executemany("DELETE FROM integrity WHERE filename = ?", [(name,) for name in filenames])
+            connection.executemany("DELETE FROM backups WHERE filename = ?", [(name,) for name in filenames])
+
+    # Profil der Backup-Pipeline eines Laufs (siehe profiler.py)
+    def record_profile(self, filename, profile):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO profiles (filename, profile) VALUES (?, ?)",
+                               (filename, json.dumps(profile)))
+
+    def get_profile(self, filename):
+        with self.connect() as connection:
+            row = connection.execute("SELECT profile FROM profiles WHERE filename = ?", (filename,)).fetchone()
+        return json.loads(row['profile']) if row else None
+
+    # Prüfsumme, entpackte Größe und Zeilen eines Backups (siehe integrity.py); ein Prüfergebnis bleibt erhalten
+    def record_integrity(self, filename, sha256, raw_bytes=None, rows=None):
+        with self.connect() as connection:
+            connection.execute("INSERT INTO integrity (filename, sha256, raw_bytes, rows) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (filename) DO UPDATE SET sha256 = excluded.sha256, "
+                               "raw_bytes = excluded.raw_bytes, rows = excluded.rows",
+                               (filename, sha256, raw_bytes, rows))
+
+    def get_integrity(self, filename):
+        with self.connect() as connection:
+            row = connection.execute("SELECT * FROM integrity WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    # Ergebnis einer Integritätsprüfung festhalten
+    def record_verification(self, filename, ok, message=None):
+        checked = datetime.datetime.now().isoformat(timespec='seconds')
+        with self.connect() as connection:
+            connection.execute("INSERT INTO integrity (filename, status, checked, message) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (filename) DO UPDATE SET status = excluded.status, "
+                               "checked = excluded.checked, message = excluded.message",
+                               (filename, 'ok' if ok else 'corrupt', checked, message))
+
+    # Lokale Backups der letzten Tage, die noch nicht geprüft wurden (recheck: auch bereits geprüfte)
+    def verification_candidates(self, days, recheck=False):
+        since = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat(timespec='seconds')
+        unchecked = '' if recheck else 'AND integrity.status IS NULL'
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT backups.* FROM backups LEFT JOIN integrity USING (filename) "
+                                      f"WHERE kind IN ('file', 'directory') AND created >= ? {unchecked} "
+                                      f"ORDER BY created DESC", (since,)).fetchall()
+        return [row_to_backup(row) for row in rows]
+
+    # Anzahl, Gesamtgröße sowie neuestes und ältestes Backup
+    def summary(self, db_id=None):
+        where, params = ('WHERE db_id = ?', [db_id]) if db_id else ('', [])
+        with self.connect() as connection:
+            row = connection.execute(f"SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS size, "
+                                     f"MAX(created) AS newest, MIN(created) AS oldest FROM backups {where}",
+                                     params).fetchone()
+        summary = dict(row)
+        for key in ('newest', 'oldest'):
+            if summary[key]:
+                summary[key] = datetime.datetime.fromisoformat(summary[key])
+        return summary
+
+    # Längste Dauer der letzten Backups je Datenbank in Sekunden (für die Staffelung der Startzeiten)
+    def recent_durations(self, samples=5):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT db_id, MAX(duration) AS duration FROM ("
+                                      "SELECT db_id, duration, ROW_NUMBER() OVER "
+                                      "(PARTITION BY db_id ORDER BY created DESC) AS position "
+                                      "FROM backups WHERE duration IS NOT NULL) "
+                                      "WHERE position <= ? GROUP BY db_id", (samples,)).fetchall()
+        return {row['db_id']: row['duration'] for row in rows}
+
+    # Gleiche den Katalog mit den vorhandenen Backups ab
+    def sync(self, config, log=None):
+        entries = {entry['filename']: entry for entry in scan_backups(config)}
+        with self.connect() as connection:
+            known = {row['filename'] for row in connection.execute("SELECT filename FROM backups")}
+            removed = known - set(entries)
+            added = set(entries) - known
+            connection.executemany("DELETE FROM backups WHERE filename = ?", [(name,) for name in removed])
+            connection.executemany("DELETE FROM profiles WHERE filename = ?", [(name,) for name in removed])
+            connection.executemany("DELETE FROM integrity WHERE filename = ?", [(name,) for name in removed])
+            connection.executemany(f"INSERT INTO backups ({', '.join(COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                                   [[entries[name].get(column) for column in COLUMNS] for name in added])
+        if log:
+            for name in sorted(removed):
+                log(f"Aus dem Katalog entfernt: {name}")
+            for name in sorted(added):
+                log(f"In den Katalog aufgenommen: {name}")
+        return added, removed
+
+    # Baue den Katalog beim ersten Zugriff aus den vorhandenen Backups auf
+    def ensure(self, config):
+        if not self.exists():
+            self.sync(config)
+
+# Katalog eines fertigen Backups eintragen (Datei, Verzeichnis, Snapshot oder nur im Speicherziel)
+# checksum: bereits während des Backups berechnete Prüfsumme, dann wird die Datei nicht erneut gelesen
+def record_backup(catalog, config, filename, db_id=None, database=None, engine=None, duration=None,
+                  checksum=None):
+    backup_dir = config.get('BACKUP_DIR', '/app/backups')
+    entry = describe_backup(backup_dir, filename, checksum=not checksum)
+    store = ChunkStore(repository_dir(config))
+    if entry is None and store.has_snapshot(filename):
+        entry = describe_snapshot(store.load_snapshot(filename))
+    if entry is None:
+        # Ohne lokale Kopie direkt in das Speicherziel geschrieben
+        storage = storage_from_config(config)
+        info = storage.stat(filename) if storage is not None else None
+        if info is None:
+            raise FileNotFoundError(f"Backup {filename} nicht gefunden")
+        entry = describe_remote(storage, dict(info, filename=filename, is_directory=False, has_meta=False))
+    if db_id:
+        entry['db_id'] = str(db_id)
+    if database:
+        entry['database'] = database
+    if checksum and entry['kind'] in ('file', 'remote'):
+        entry['checksum'] = checksum
+    entry['engine'] = engine
+    entry['duration'] = duration
+    catalog.record(entry)
+    return entry
+
+def main():
+    parser = argparse.ArgumentParser(description='Katalog aller Backups')
+    parser.add_argument('--catalog', default=CATALOG_FILE, help='Pfad der Katalog-Datenbank')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='Fertiges Backup eintragen')
+    record_parser.add_argument('filename')
+    record_parser.add_argument('--db-id')
+    record_parser.add_argument('--database')
+    record_parser.add_argument('--engine')
+    record_parser.add_argument('--duration', type=float)
+    record_parser.add_argument('--stats', help='Messpunkt nach der Kompression mit der Prüfsumme (profiler.py)')
+
+    remove_parser = commands.add_parser('remove', help='Backup austragen')
+    remove_parser.add_argument('filename')
+
+    commands.add_parser('sync', help='Katalog mit dem Backup-Verzeichnis abgleichen')
+
+    list_parser = commands.add_parser('list', help='Backups auflisten')
+    list_parser.add_argument('--db-id')
+    list_parser.add_argument('--limit', type=int, default=DEFAULT_PAGE_SIZE)
+    list_parser.add_argument('--json', action='store_true', help='Ausgabe als JSON')
+
+    args = parser.parse_args()
+    catalog = BackupCatalog(args.catalog)
+    config = load_backup_config()
+
+    try:
+        if args.command == 'record':
+            checksum = (load_probe(args.stats) or {}).get('sha256')
+            entry = record_backup(catalog, config, args.filename, args.db_id, args.database,
+                                  args.engine, args.duration, checksum)
+            print(f"Backup {entry['filename']} in den Katalog eingetragen.")
+        elif args.command == 'remove':
+            catalog.remove(args.filename)
+        elif args.command == 'sync':
+            added, removed = catalog.sync(config, log=print)
+            print(f"Katalog abgeglichen: {len(added)} aufgenommen, {len(removed)} entfernt")
+        elif args.command == 'list':
+            backups = catalog.query(args.db_id, per_page=args.limit)
+            if args.json:
+                print(json.dumps(backups, default=str, indent=2))
+            else:
+                for backup in backups:
+                    print(f"{backup['created']}  {backup['size'] / 1024 / 1024:10.1f} MB  "
+                          f"{backup['db_id']:>3}  {backup['filename']}")
+    except Exception as e:
+        print(f"FEHLER: {args.command} fehlgeschlagen: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Backup-Repository mit inhaltsbasierten Chunks
+#
+# Der unkomprimierte Dump-Strom wird an inhaltsabhängigen Stellen in Chunks
+# zerlegt. Jeder Chunk wird unter seinem SHA-256 genau einmal gespeichert
+# (komprimiert), ein Snapshot-Manifest beschreibt ein Backup als Liste von
+# Chunks. Aufeinanderfolgende Backups derselben Datenbank teilen sich alle
+# unveränderten Chunks, Speicherbedarf und SMB-Übertragung wachsen daher mit
+# der Änderung und nicht mit der Größe der Datenbank.
+#
+# Aufbau des Repositorys:
+#   chunks/ab/abcdef...     Chunk (zlib-komprimiert), Name = SHA-256 des Inhalts
+#   snapshots/<name>.json   Manifest eines Backups
+#   lock                    Sperrdatei (Speichern gemeinsam, Bereinigung exklusiv)
+#
+# Aufruf:
+#   mysqldump ... | chunkstore.py store <name> --db-id 1 --database shop
+#   chunkstore.py restore <name> > dump.sql
+#   chunkstore.py list | check [--verify] | gc [--dry-run] | prune --days 7
+#   chunkstore.py sync <name> --to /mnt/backup/mysql_backups/repository
+
+import os
+import re
+import sys
+import json
+import zlib
+import fcntl
+import hashlib
+import argparse
+import datetime
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Version des Snapshot-Formats
+SNAPSHOT_FORMAT = 1
+
+# Chunk-Grenzen: frühestens nach MIN_CHUNK_SIZE, spätestens nach MAX_CHUNK_SIZE Bytes
+MIN_CHUNK_SIZE = 512 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Eine Grenze liegt dort, wo die Prüfsumme der vorangehenden Bytes in den
+# unteren BOUNDARY_BITS Bits null ist (im Mittel jede 4096. Kandidatenstelle)
+BOUNDARY_BITS = 12
+BOUNDARY_WINDOW = 48
+
+# Kandidaten für Grenzen sind Zeilenenden und Zeilengrenzen in INSERT-Anweisungen;
+# so verschiebt eine eingefügte Zeile nur die Chunks in ihrer Nähe
+BOUNDARY_CANDIDATES = re.compile(rb'\n|\),\(')
+
+# Blockgröße beim Lesen des Eingabestroms
+READ_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Kompressionsstufe der Chunks (höhere Stufen kosten ein Vielfaches an CPU-Zeit)
+CHUNK_COMPRESSION_LEVEL = 3
+
+# Anzahl der Threads zum Komprimieren und Schreiben (zlib gibt den GIL frei)
+STORE_WORKERS = 4
+
+# Suche die nächste Chunk-Grenze in data
+def find_boundary(data, final, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE, bits=BOUNDARY_BITS):
+    mask = (1 << bits) - 1
+    limit = min(len(data), max_size)
+    for match in BOUNDARY_CANDIDATES.finditer(data, min_size, limit):
+        end = match.end()
+        if zlib.crc32(data[end - BOUNDARY_WINDOW:end]) & mask == 0:
+            return end
+    if len(data) >= max_size:
+        return max_size
+    return len(data) if final else None
+
+# Zerlege einen Datenstrom in inhaltsbasierte Chunks
+def split_stream(stream, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE, bits=BOUNDARY_BITS):
+    buffer = b''
+    final = False
+    while not final:
+        block = stream.read(READ_BLOCK_SIZE)
+        final = not block
+        buffer += block
+        while buffer:
+            boundary = find_boundary(buffer, final, min_size, max_size, bits)
+            if boundary is None:
+                break
+            yield buffer[:boundary]
+            buffer = buffer[boundary:]
+
+class ChunkStore:
+    def __init__(self, path):
+        self.path = path
+        self.chunk_dir = os.path.join(path, 'chunks')
+        self.snapshot_dir = os.path.join(path, 'snapshots')
+
+    def init(self):
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    # Sperre des Repositorys: Speichern gemeinsam, Bereinigung exklusiv
+    @contextlib.contextmanager
+    def lock(self, exclusive=False):
+        self.init()
+        with open(os.path.join(self.path, 'lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def has_chunk(self, digest):
+        return os.path.exists(self.chunk_path(digest))
+
+    # Speichere einen Chunk, falls er noch nicht vorhanden ist; liefert die neu belegten Bytes
+    def put_chunk(self, digest, data):
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        compressed = zlib.compress(data, CHUNK_COMPRESSION_LEVEL)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Eindeutige temporäre Datei, da mehrere Backups denselben Chunk gleichzeitig schreiben können
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return len(compressed)
+
+    # Lese einen Chunk und prüfe seinen Inhalt
+    def get_chunk(self, digest):
+        with open(self.chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise IOError(f"Chunk {digest} ist beschädigt")
+        return data
+
+    def snapshot_path(self, name):
+        return os.path.join(self.snapshot_dir, name + '.json')
+
+    def has_snapshot(self, name):
+        return os.path.exists(self.snapshot_path(name))
+
+    def load_snapshot(self, name):
+        with open(self.snapshot_path(name), 'r') as f:
+            return json.load(f)
+
+    # Schreibe ein Snapshot-Manifest atomar (erst danach gilt das Backup als vorhanden)
+    def write_snapshot(self, snapshot):
+        path = self.snapshot_path(snapshot['name'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+
+    def delete_snapshot(self, name):
+        os.remove(self.snapshot_path(name))
+
+    # Alle Snapshots, die ältesten zuerst
+    def list_snapshots(self):
+        snapshots = []
+        if not os.path.isdir(self.snapshot_dir):
+            return snapshots
+        for name in os.listdir(self.snapshot_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                snapshots.append(self.load_snapshot(name[:-len('.json')]))
+            except (OSError, ValueError):
+                continue
+        snapshots.sort(key=lambda snapshot: snapshot.get('created', ''))
+        return snapshots
+
+    # Speichere einen Datenstrom als neuen Snapshot
+    def store(self, name, stream, db_id=None, database=None, log=None):
+        started = datetime.datetime.now()
+        chunks = []
+        stream_hash = hashlib.sha256()
+        size = 0
+        stored_bytes = 0
+
+        with self.lock(), ThreadPoolExecutor(max_workers=STORE_WORKERS) as executor:
+            pending = []
+            for data in split_stream(stream):
+                digest = hashlib.sha256(data).hexdigest()
+                stream_hash.update(data)
+                size += len(data)
+                chunks.append([digest, len(data)])
+                pending.append(executor.submit(self.put_chunk, digest, data))
+                # Nicht mehr Chunks im Speicher halten, als gerade geschrieben werden können
+                if len(pending) >= STORE_WORKERS * 2:
+                    stored_bytes += pending.pop(0).result()
+            for future in pending:
+                stored_bytes += future.result()
+
+            snapshot = {
+                'format': SNAPSHOT_FORMAT,
+                'name': name,
+                'db_id': db_id,
+                'database': database,
+                'created': started.isoformat(),
+                'size': size,
+                'stored_bytes': stored_bytes,
+                'sha256': stream_hash.hexdigest(),
+                'chunks': chunks
+            }
+            self.write_snapshot(snapshot)
+
+        if log:
+            unique = len(set(digest for digest, _ in chunks))
+            log(f"Snapshot {name}: {size / 1024 / 1024:.1f} MB in {len(chunks)} Chunks ({unique} verschieden), "
+                f"neu gespeichert: {stored_bytes / 1024 / 1024:.1f} MB")
+        return snapshot
+
+    # Schreibe den Inhalt eines Snapshots in einen Ausgabestrom
+    def restore(self, name, out):
+        snapshot = self.load_snapshot(name)
+        stream_hash = hashlib.sha256()
+        for digest, _ in snapshot['chunks']:
+            data = self.get_chunk(digest)
+            stream_hash.update(data)
+            out.write(data)
+        if stream_hash.hexdigest() != snapshot['sha256']:
+            raise IOError(f"Prüfsumme von Snapshot {name} stimmt nicht")
+
+    # Lese den Inhalt eines Snapshots blockweise (z.B. für Downloads)
+    def iter_snapshot(self, name):
+        for digest, _ in self.load_snapshot(name)['chunks']:
+            yield self.get_chunk(digest)
+
+    # Alle auf der Platte vorhandenen Chunks
+    def iter_chunk_files(self):
+        if not os.path.isdir(self.chunk_dir):
+            return
+        for prefix in os.listdir(self.chunk_dir):
+            directory = os.path.join(self.chunk_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                yield name, os.path.join(directory, name)
+
+    # Prüfe, ob alle Snapshots vollständig sind (mit verify zusätzlich den Inhalt der Chunks)
+    def check(self, verify=False, log=None):
+        errors = []
+        verified = set()
+        snapshots = self.list_snapshots()
+        for snapshot in snapshots:
+            for digest, size in snapshot['chunks']:
+                if digest in verified:
+                    continue
+                if not self.has_chunk(digest):
+                    errors.append(f"{snapshot['name']}: Chunk {digest} fehlt")
+                    continue
+                if verify:
+                    try:
+                        if len(self.get_chunk(digest)) != size:
+                            errors.append(f"{snapshot['name']}: Chunk {digest} hat die falsche Größe")
+                            continue
+                    except Exception as e:
+                        errors.append(f"{snapshot['name']}: {e}")
+                        continue
+                verified.add(digest)
+        if log:
+            log(f"{len(snapshots)} Snapshots und {len(verified)} Chunks geprüft, {len(errors)} Fehler")
+        return errors
+
+    # Lösche Chunks, die von keinem Snapshot mehr verwendet werden
+    def gc(self, dry_run=False, log=None):
+        removed = 0
+        freed = 0
+        with self.lock(exclusive=True):
+            referenced = set()
+            for snapshot in self.list_snapshots():
+                referenced.update(digest for digest, _ in snapshot['chunks'])
+            for name, path in list(self.iter_chunk_files()):
+                # Übrig gebliebene temporäre Dateien abgebrochener Backups
+                if name.endswith('.tmp') or name not in referenced:
+                    freed += os.path.getsize(path)
+                    removed += 1
+                    if not dry_run:
+                        os.remove(path)
+        if log:
+            action = 'Würden gelöscht' if dry_run else 'Gelöscht'
+            log(f"{action}: {removed} nicht mehr verwendete Chunks ({freed / 1024 / 1024:.1f} MB)")
+        return removed, freed
+
+    # Lösche Snapshots, die älter als die Aufbewahrungsdauer sind
+    def prune(self, days, dry_run=False, log=None):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+        pruned = []
+        for snapshot in self.list_snapshots():
+            if datetime.datetime.fromisoformat(snapshot['created']) < cutoff:
+                pruned.append(snapshot['name'])
+                if log:
+                    log(f"{'Würde löschen' if dry_run else 'Lösche'}: Snapshot {snapshot['name']}")
+                if not dry_run:
+                    self.delete_snapshot(snapshot['name'])
+        return pruned
+
+    # Kopiere einen Snapshot in ein anderes Repository (nur fehlende Chunks)
+    def sync(self, name, target, log=None):
+        snapshot = self.load_snapshot(name)
+        copied = 0
+        copied_bytes = 0
+        with target.lock():
+            for digest, _ in snapshot['chunks']:
+                target_path = target.chunk_path(digest)
+                if os.path.exists(target_path):
+                    continue
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                with open(self.chunk_path(digest), 'rb') as f:
+                    data = f.read()
+                with open(target_path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(target_path + '.tmp', target_path)
+                copied += 1
+                copied_bytes += len(data)
+            # Das Manifest zuletzt, damit es nie auf fehlende Chunks verweist
+            target.write_snapshot(snapshot)
+        if log:
+            log(f"Snapshot {name} übertragen: {copied} neue Chunks ({copied_bytes / 1024 / 1024:.1f} MB)")
+        return copied, copied_bytes
+
+# Pfad des Repositorys (Standard: Unterverzeichnis repository im Backup-Verzeichnis)
+def repository_dir(config):
+    return config.get('REPOSITORY_DIR') or os.path.join(config.get('BACKUP_DIR', '/app/backups'), 'repository')
+
+def default_repository():
+    from backup_config import load_backup_config
+    return repository_dir(load_backup_config())
+
+def log_stderr(message):
+    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Backup-Repository mit inhaltsbasierten Chunks')
+    parser.add_argument('--repository', help='Pfad des Repositorys (Standard: REPOSITORY_DIR bzw. BACKUP_DIR/repository)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    store_parser = commands.add_parser('store', help='Dump von stdin als Snapshot speichern')
+    store_parser.add_argument('name')
+    store_parser.add_argument('--db-id')
+    store_parser.add_argument('--database')
+
+    restore_parser = commands.add_parser('restore', help='Snapshot nach stdout schreiben')
+    restore_parser.add_argument('name')
+
+    commands.add_parser('list', help='Snapshots auflisten')
+
+    delete_parser = commands.add_parser('delete', help='Snapshot löschen (z.B. nach einem abgebrochenen Backup)')
+    delete_parser.add_argument('name')
+
+    check_parser = commands.add_parser('check', help='Repository prüfen')
+    check_parser.add_argument('--verify', action='store_true', help='Inhalt aller Chunks prüfen')
+
+    gc_parser = commands.add_parser('gc', help='Nicht mehr verwendete Chunks löschen')
+    gc_parser.add_argument('--dry-run', action='store_true')
+
+    prune_parser = commands.add_parser('prune', help='Alte Snapshots löschen')
+    prune_parser.add_argument('--days', type=int, required=True)
+    prune_parser.add_argument('--dry-run', action='store_true')
+
+    sync_parser = commands.add_parser('sync', help='Snapshot in ein anderes Repository übertragen')
+    sync_parser.add_argument('name')
+    sync_parser.add_argument('--to', required=True, help='Ziel-Repository')
+
+    args = parser.parse_args()
+    store = ChunkStore(args.repository or default_repository())
+
+    try:
+        if args.command == 'store':
+            stdin = os.fdopen(sys.stdin.fileno(), 'rb', closefd=False)
+            store.store(args.name, stdin, args.db_id, args.database, log=log_stderr)
+        elif args.command == 'restore':
+            stdout = os.fdopen(sys.stdout.fileno(), 'wb', closefd=False)
+            store.restore(args.name, stdout)
+            stdout.flush()
+        elif args.command == 'list':
+            for snapshot in store.list_snapshots():
+                print(f"{snapshot['created'][:19]}  {snapshot['size'] / 1024 / 1024:10.1f} MB  "
+                      f"{snapshot['stored_bytes'] / 1024 / 1024:10.1f} MB neu  {snapshot['name']}")
+        elif args.command == 'delete':
+            if os.path.exists(store.snapshot_path(args.name)):
+                store.delete_snapshot(args.name)
+                print(f"Snapshot {args.name} gelöscht")
+        elif args.command == 'check':
+            errors = store.check(args.verify, log=print)
+            for error in errors:
+                print(f"FEHLER: {error}")
+            return 1 if errors else 0
+        elif args.command == 'gc':
+            store.gc(args.dry_run, log=print)
+        elif args.command == 'prune':
+            if args.days > 0:
+                pruned = store.prune(args.days, args.dry_run, log=print)
+                print(f"{'Zu löschende' if args.dry_run else 'Gelöschte'} Snapshots: {len(pruned)}")
+        elif args.command == 'sync':
+            store.sync(args.name, ChunkStore(args.to), log=print)
+    except Exception as e:
+        log_stderr(f"FEHLER: {args.command} fehlgeschlagen: {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Downloads von Backups
+#
+# Backup-Dateien werden mit Range-Unterstützung ausgeliefert, abgebrochene
+# Downloads lassen sich also fortsetzen. Steht ein nginx vor der Weboberfläche,
+# übernimmt er mit DOWNLOAD_ACCEL_REDIRECT die Auslieferung selbst (sendfile,
+# Range), die Weboberfläche prüft nur noch den Namen.
+#
+# Auf Wunsch wird ein Backup beim Herunterladen in ein anderes Format umgewandelt
+# (?format=sql|gzip|zstd|lz4); Verzeichnis-Backups werden als tar-Archiv
+# ausgeliefert. Beides läuft als Stream, ohne temporäre Dateien.
+
+import os
+import tarfile
+import threading
+import subprocess
+import contextlib
+from urllib.parse import quote
+from flask import Response, send_file, stream_with_context
+from backup_codecs import CODECS, compress_command, decompress_command, extension, strip_extension
+from storage import COPY_BLOCK_SIZE
+from parallel_dump import MANIFEST_FILE
+
+# Zielformate beim Umwandeln ("sql" = unkomprimiert)
+DOWNLOAD_FORMATS = ('sql',) + tuple(CODECS)
+
+# interne nginx-Location, unter der das Backup-Verzeichnis freigegeben ist (z.B. /protected-backups/)
+ACCEL_REDIRECT_PREFIX = os.environ.get('DOWNLOAD_ACCEL_REDIRECT', '')
+
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+def attachment(filename):
+    return {'Content-Disposition': f"attachment; filename={filename}; filename*=UTF-8''{quote(filename)}"}
+
+# Dateiname nach dem Umwandeln in ein anderes Format
+def download_name(filename, target):
+    if not target:
+        return filename
+    return strip_extension(filename) + ('.sql' if target == 'sql' else extension(target))
+
+def read_blocks(stream):
+    with contextlib.closing(stream):
+        yield from iter(lambda: stream.read(COPY_BLOCK_SIZE), b'')
+
+# Liefere eine Backup-Datei unverändert aus (mit Range, ETag und Last-Modified)
+def file_response(path, filename):
+    if ACCEL_REDIRECT_PREFIX:
+        response = Response(headers=attachment(filename), mimetype='application/octet-stream')
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(filename)
+        return response
+    response = send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=filename, conditional=True, max_age=0)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+# Wandle einen Datenstrom von einem Verfahren in ein anderes um (None bzw. "sql" = unkomprimiert)
+# Entpacken und Komprimieren laufen als eigene Prozesse, ein Thread füttert die Pipeline.
+def transcode(blocks, source, target):
+    source = None if source == 'sql' else source
+    target = None if target == 'sql' else target
+    if source == target:
+        yield from blocks
+        return
+
+    commands = []
+    if source:
+        commands.append(decompress_command(source))
+    if target:
+        commands.append(compress_command(target))
+    processes = []
+    for command in commands:
+        stdin = processes[-1].stdout if processes else subprocess.PIPE
+        processes.append(subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, bufsize=COPY_BLOCK_SIZE))
+        if len(processes) > 1:
+            # Nur der nachfolgende Prozess soll die Pipe lesen
+            processes[-2].stdout.close()
+
+    errors = []
+    def feed():
+        try:
+            for block in blocks:
+                processes[0].stdin.write(block)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            with contextlib.suppress(OSError):
+                processes[0].stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    finished = False
+    try:
+        output = processes[-1].stdout
+        yield from iter(lambda: output.read(COPY_BLOCK_SIZE), b'')
+        finished = True
+    finally:
+        if not finished:
+            # Download abgebrochen: Pipeline beenden
+            for process in processes:
+                process.kill()
+        feeder.join()
+        processes[-1].stdout.close()
+        returncodes = [process.wait() for process in processes]
+    if errors:
+        raise errors[0]
+    for command, returncode in zip(commands, returncodes):
+        if returncode != 0:
+            raise IOError(f"Umwandeln fehlgeschlagen ({command[0]}: {returncode})")
+
+def transcode_response(blocks, filename, source, target):
+    return Response(stream_with_context(transcode(blocks, source, target)),
+                    mimetype='application/octet-stream',
+                    headers=dict(attachment(download_name(filename, target)), **{'Accept-Ranges': 'none'}))
+
+# Kopfblock eines tar-Eintrags (PAX-Format, damit lange Tabellennamen erhalten bleiben)
+def tar_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+def tar_padding(size):
+    return b'\0' * (-size % TAR_BLOCK_SIZE)
+
+# members: Liste von (Name im Archiv, Größe, Änderungszeit, Funktion zum Öffnen)
+# Die Größe steht vorher fest, damit der Download eine Content-Length hat.
+def tar_size(members):
+    return sum(len(tar_header(name, size, mtime)) + size + len(tar_padding(size))
+               for name, size, mtime, _ in members) + 2 * TAR_BLOCK_SIZE
+
+def tar_stream(members):
+    for name, size, mtime, open_member in members:
+        yield tar_header(name, size, mtime)
+        remaining = size
+        for block in read_blocks(open_member()):
+            block = block[:remaining]
+            remaining -= len(block)
+            yield block
+            if not remaining:
+                break
+        if remaining:
+            # Die Länge ist bereits angekündigt, eine kürzere Datei kann nicht mehr aufgefüllt werden
+            raise IOError(f"{name} wurde während des Downloads verändert")
+        yield tar_padding(size)
+    yield b'\0' * (2 * TAR_BLOCK_SIZE)
+
+# Dateien eines lokalen Verzeichnis-Backups, Manifest zuerst
+def directory_members(path, name):
+    members = []
+    for entry in sorted(os.scandir(path), key=lambda entry: (entry.name != MANIFEST_FILE, entry.name)):
+        if entry.is_file():
+            stat = entry.stat()
+            members.append((f'{name}/{entry.name}', stat.st_size, stat.st_mtime,
+                            lambda path=entry.path: open(path, 'rb')))
+    return members
+
+# Dateien eines Verzeichnis-Backups im Speicherziel
+def storage_members(storage, name):
+    objects = storage.objects()
+    keys = sorted((key for key in objects if key.startswith(name + '/')),
+                  key=lambda key: (not key.endswith('/' + MANIFEST_FILE), key))
+    return [(key, objects[key][0], objects[key][1], lambda key=key: storage.get_stream(key)) for key in keys]
+
+def tar_response(members, name):
+    headers = dict(attachment(name + '.tar'), **{'Content-Length': str(tar_size(members)), 'Accept-Ranges': 'none'})
+    return Response(stream_with_context(tar_stream(members)), mimetype='application/x-tar', headers=headers)
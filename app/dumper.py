@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Python-Dump-Engine als Alternative zu mysqldump
+#
+# Liest die Tabellen über serverseitige Cursor (SSCursor) zeilenweise aus,
+# fasst die Zeilen zu mehrzeiligen INSERT-Anweisungen zusammen und schreibt
+# sie direkt in einen Ausgabestrom (z.B. stdout in eine gzip-Pipe).
+# Der Speicherbedarf hängt nur von der Batch-Größe ab, nicht von der Tabellengröße.
+
+import io
+import sys
+import zlib
+import time
+import socket
+import argparse
+import datetime
+import pymysql
+import pymysql.cursors
+from backup_codecs import codec_for_file, open_output
+
+# Standardwerte für die Batch-Größe
+DEFAULT_BATCH_ROWS = 1000
+DEFAULT_MAX_STATEMENT_BYTES = 1024 * 1024
+
+# Puffergröße für den Ausgabestrom
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Baue eine Verbindung zu einer Datenbank aus der backup.conf auf (DatabaseSettings)
+def connect(db, **kwargs):
+    return pymysql.connect(
+        host=db.host,
+        port=db.port,
+        user=db.user,
+        password=db.password,
+        database=db.database or None,
+        charset='utf8mb4',
+        connect_timeout=10,
+        **kwargs
+    )
+
+# Setze Isolation und starte eine konsistente Lesetransaktion (wie --single-transaction)
+def start_snapshot(connection):
+    with connection.cursor() as cursor:
+        # TIMESTAMP-Werte in UTC auslesen, passend zum TIME_ZONE im Dump-Kopf
+        cursor.execute("SET SESSION time_zone = '+00:00'")
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+# Setze einen Bezeichner in Backticks
+def quote_identifier(name):
+    return '`' + name.replace('`', '``') + '`'
+
+# Liste der Tabellen und Views der aktuellen Datenbank
+def list_tables(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW FULL TABLES")
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+# Schreibe den Kopf des Dumps
+def write_header(out, database):
+    out.write((
+        f"-- MySQL-Backup Python-Dump-Engine\n"
+        f"-- Host: {socket.gethostname()}    Database: {database}\n"
+        f"-- ------------------------------------------------------\n\n"
+        "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n"
+        "/*!40101 SET NAMES utf8mb4 */;\n"
+        "/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;\n"
+        "/*!40103 SET TIME_ZONE='+00:00' */;\n"
+        "/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n"
+        "/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n"
+        "/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n\n"
+    ).encode('utf-8'))
+
+# Schreibe das Ende des Dumps (wird auch zur Prüfung auf Vollständigkeit verwendet)
+def write_footer(out):
+    out.write((
+        "/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;\n"
+        "/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n"
+        "/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;\n"
+        "/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n"
+        "/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n\n"
+        f"-- Dump completed on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    ).encode('utf-8'))
+
+# Schreibe die CREATE-Anweisung einer Tabelle
+def dump_table_schema(connection, table, out):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SHOW CREATE TABLE {quote_identifier(table)}")
+        create_statement = cursor.fetchone()[1]
+    out.write((
+        f"--\n-- Tabellenstruktur für {quote_identifier(table)}\n--\n\n"
+        f"DROP TABLE IF EXISTS {quote_identifier(table)};\n"
+        f"{create_statement};\n\n"
+    ).encode('utf-8'))
+
+# Schreibe die CREATE-Anweisung einer View
+def dump_view_schema(connection, view, out):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SHOW CREATE VIEW {quote_identifier(view)}")
+        create_statement = cursor.fetchone()[1]
+    out.write((
+        f"--\n-- View {quote_identifier(view)}\n--\n\n"
+        f"DROP VIEW IF EXISTS {quote_identifier(view)};\n"
+        f"{create_statement};\n\n"
+    ).encode('utf-8'))
+
+# Schreibe die Trigger einer Tabelle
+def dump_triggers(connection, table, out):
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW TRIGGERS WHERE `Table` = %s", (table,))
+        triggers = [row[0] for row in cursor.fetchall()]
+        for trigger in triggers:
+            cursor.execute(f"SHOW CREATE TRIGGER {quote_identifier(trigger)}")
+            create_statement = cursor.fetchone()[2]
+            out.write((
+                f"DROP TRIGGER IF EXISTS {quote_identifier(trigger)};\n"
+                f"DELIMITER ;;\n{create_statement} ;;\nDELIMITER ;\n\n"
+            ).encode('utf-8'))
+
+# Streame die Zeilen einer Tabelle als mehrzeilige INSERT-Anweisungen
+# where schränkt die Zeilen optional ein (z.B. für Teilbereiche einer Tabelle)
+# Binäre Werte (BLOB, VARBINARY, BIT) als Hex-Literal: pymysql gibt sie sonst als Text mit
+# Surrogaten zurück, der sich nicht als UTF-8 schreiben lässt, und das Literal übersteht
+# jeden Zeichensatz der Verbindung beim Wiederherstellen unverändert.
+def value_escaper(connection):
+    escape = connection.escape
+
+    def escape_value(value):
+        if isinstance(value, (bytes, bytearray)):
+            return '0x' + value.hex() if value else "''"
+        return escape(value)
+    return escape_value
+
+# Mit stable_breaks endet eine Anweisung nach Zeilen, deren Prüfsumme durch batch_rows
+# teilbar ist, statt nach jeweils batch_rows Zeilen. Eine eingefügte oder gelöschte
+# Zeile verschiebt dann nicht alle folgenden Anweisungen, was die Deduplizierung
+# im Backup-Repository erst ermöglicht.
+def dump_table_data(connection, table, out, batch_rows=DEFAULT_BATCH_ROWS,
+                    max_statement_bytes=DEFAULT_MAX_STATEMENT_BYTES, where=None, params=None,
+                    stable_breaks=False):
+    escape = value_escaper(connection)
+    prefix = f"INSERT INTO {quote_identifier(table)} VALUES "
+    rows_total = 0
+    bytes_total = 0
+
+    query = f"SELECT * FROM {quote_identifier(table)}"
+    if where:
+        query += f" WHERE {where}"
+
+    cursor = connection.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(query, params)
+        statement = []
+        statement_bytes = 0
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            for row in rows:
+                value = '(' + ','.join(map(escape, row)) + ')'
+                statement.append(value)
+                statement_bytes += len(value)
+                # Große Zeilen beenden die Anweisung vorzeitig (max_allowed_packet)
+                if statement_bytes >= max_statement_bytes or (
+                        stable_breaks and zlib.crc32(value.encode('utf-8')) % batch_rows == 0):
+                    data = (prefix + ',\n'.join(statement) + ';\n').encode('utf-8')
+                    out.write(data)
+                    bytes_total += len(data)
+                    statement = []
+                    statement_bytes = 0
+            if not stable_breaks and len(statement) >= batch_rows:
+                data = (prefix + ',\n'.join(statement) + ';\n').encode('utf-8')
+                out.write(data)
+                bytes_total += len(data)
+                statement = []
+                statement_bytes = 0
+            rows_total += len(rows)
+        if statement:
+            data = (prefix + ',\n'.join(statement) + ';\n').encode('utf-8')
+            out.write(data)
+            bytes_total += len(data)
+    finally:
+        cursor.close()
+
+    return rows_total, bytes_total
+
+# Sichere eine komplette Datenbank in einen binären Ausgabestrom
+def dump_database(connection, database, out, batch_rows=DEFAULT_BATCH_ROWS,
+                  max_statement_bytes=DEFAULT_MAX_STATEMENT_BYTES, stable_breaks=False, log=None):
+    started = time.monotonic()
+    stats = {'tables': 0, 'rows': 0, 'bytes': 0}
+
+    start_snapshot(connection)
+    write_header(out, database)
+
+    tables = list_tables(connection)
+    for table, table_type in tables:
+        if table_type == 'VIEW':
+            continue
+        dump_table_schema(connection, table, out)
+        out.write(f"LOCK TABLES {quote_identifier(table)} WRITE;\n".encode('utf-8'))
+        out.write(f"/*!40000 ALTER TABLE {quote_identifier(table)} DISABLE KEYS */;\n".encode('utf-8'))
+        rows, data_bytes = dump_table_data(connection, table, out, batch_rows, max_statement_bytes,
+                                           stable_breaks=stable_breaks)
+        out.write(f"/*!40000 ALTER TABLE {quote_identifier(table)} ENABLE KEYS */;\n".encode('utf-8'))
+        out.write(b"UNLOCK TABLES;\n\n")
+        dump_triggers(connection, table, out)
+        stats['tables'] += 1
+        stats['rows'] += rows
+        stats['bytes'] += data_bytes
+        if log:
+            log(f"Tabelle {table}: {rows} Zeilen")
+
+    # Views nach den Tabellen, da sie auf diese verweisen
+    for table, table_type in tables:
+        if table_type == 'VIEW':
+            dump_view_schema(connection, table, out)
+
+    write_footer(out)
+    connection.commit()
+
+    stats['duration'] = time.monotonic() - started
+    return stats
+
+# Lese die Verbindungsdaten einer Datenbank aus der backup.conf
+def load_database(db_id):
+    from backup_config import load_settings
+    return load_settings().database(db_id)
+
+# Ausgabe auf stderr, damit stdout für den Dump frei bleibt
+def log_stderr(message):
+    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Python-Dump-Engine für MySQL-Backups')
+    parser.add_argument('db_id', nargs='?', help='ID der Datenbank aus der backup.conf')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--database')
+    parser.add_argument('--batch-rows', type=int, help='Zeilen pro INSERT-Anweisung')
+    parser.add_argument('--stable-inserts', action='store_true',
+                        help='INSERT-Anweisungen inhaltsabhängig beenden (für das Backup-Repository)')
+    parser.add_argument('--output', help='Zieldatei (Standard: stdout, komprimiert bei .sql.gz/.sql.zst/.sql.lz4)')
+    args = parser.parse_args()
+
+    from backup_config import DatabaseSettings
+    db = DatabaseSettings(id='')
+    if args.db_id:
+        db = load_database(args.db_id)
+        if not db:
+            log_stderr(f"FEHLER: Datenbank mit ID {args.db_id} nicht gefunden!")
+            return 1
+    # Parameter auf der Kommandozeile überschreiben die Konfiguration
+    db = db.replace(**{key: getattr(args, key) for key in ('host', 'port', 'user', 'password', 'database')
+                       if getattr(args, key) is not None})
+    if not db.database:
+        log_stderr("FEHLER: Keine Datenbank angegeben!")
+        return 1
+
+    batch_rows = args.batch_rows or db.batch_rows
+
+    if args.output and codec_for_file(args.output):
+        # Direkt komprimieren, das Verfahren ergibt sich aus der Endung (.sql.gz, .sql.zst, .sql.lz4)
+        out = open_output(args.output, codec_for_file(args.output), db.codec_level, threads=0)
+    elif args.output:
+        out = open(args.output, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+    else:
+        out = io.BufferedWriter(io.FileIO(sys.stdout.fileno(), 'wb', closefd=False), OUTPUT_BUFFER_SIZE)
+
+    try:
+        connection = connect(db)
+        try:
+            stats = dump_database(connection, db.database, out, batch_rows=batch_rows,
+                                  stable_breaks=args.stable_inserts)
+        finally:
+            connection.close()
+        out.flush()
+    except Exception as e:
+        log_stderr(f"FEHLER: Python-Dump von {db.database} fehlgeschlagen: {e}")
+        return 1
+    finally:
+        if args.output:
+            out.close()
+
+    log_stderr(f"Python-Dump von {db.database}: {stats['tables']} Tabellen, {stats['rows']} Zeilen "
+               f"in {stats['duration']:.1f}s ({stats['rows'] / max(stats['duration'], 0.001):.0f} Zeilen/s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# gunicorn-Konfiguration der Weboberfläche
+#
+# Mehrere Worker-Prozesse mit je mehreren Threads (gthread), damit ein langsamer
+# Request (SMB-Test, großer Download) die übrigen nicht blockiert. Einstellbar über
+# Umgebungsvariablen:
+#   WEB_WORKERS           Worker-Prozesse (Standard: 2)
+#   WEB_THREADS           Threads pro Worker (Standard: 8)
+#   WEB_TIMEOUT           Sekunden, nach denen ein hängender Worker neu gestartet wird (Standard: 120)
+#   WEB_GRACEFUL_TIMEOUT  Sekunden, die ein Worker beim Neuladen auf laufende Requests und Jobs wartet (Standard: 60)
+#   WEB_LISTEN_PORT       Port im Container (Standard: 80)
+#
+# Neu laden ohne Unterbrechung: supervisorctl signal HUP webapp
+
+import os
+import sys
+
+def env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+bind = f"0.0.0.0:{os.environ.get('WEB_LISTEN_PORT', '80')}"
+workers = env_int('WEB_WORKERS', 2)
+threads = env_int('WEB_THREADS', 8)
+worker_class = 'gthread'
+timeout = env_int('WEB_TIMEOUT', 120)
+graceful_timeout = env_int('WEB_GRACEFUL_TIMEOUT', 60)
+keepalive = 5
+
+# Große Downloads ohne Umweg über Python ausliefern
+sendfile = True
+
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
+# Beim Neuladen oder Beenden auf laufende Hintergrund-Jobs des Workers warten
+def worker_exit(server, worker):
+    job_queue = getattr(sys.modules.get('app'), 'job_queue', None)
+    if job_queue:
+        job_queue.shutdown(max(1, graceful_timeout - 5))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Verbindungsprüfung aller Datenbanken und Ziele
+#
+# "Alle prüfen" auf der Konfigurationsseite prüft alle Datenbanken, den SMB-Share
+# und das Speicherziel gleichzeitig mit einem Zeitlimit je Ziel. Die Ergebnisse
+# liegen in config/health.json, damit alle Worker der Weboberfläche sie sehen. Die
+# Konfigurationsseite zeigt sie als Status-Badges aus diesem Zwischenspeicher, ohne
+# bei jedem Aufruf Verbindungen aufzubauen; nur Ergebnisse, die älter als
+# HEALTH_CACHE_TTL Sekunden sind oder deren Einstellungen sich geändert haben,
+# werden beim Aufruf der Seite im Hintergrund erneuert.
+#
+# Der SMB-Share wird nur auf Erreichbarkeit (Port 445) geprüft; Anmeldung und
+# Schreibrechte prüft weiterhin "SMB-Verbindung testen".
+#
+# Aufruf:
+#   health.py [--force] [--json]
+
+import os
+import sys
+import json
+import time
+import fcntl
+import socket
+import hashlib
+import argparse
+import datetime
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from backup_config import CONFIG_DIR, load_settings, write_file_atomic
+
+HEALTH_FILE = os.path.join(CONFIG_DIR, 'health.json')
+
+# Gültigkeit der zwischengespeicherten Ergebnisse in Sekunden
+HEALTH_CACHE_TTL = 300
+
+# Zeitlimit je Ziel in Sekunden
+CHECK_TIMEOUTS = {'database': 5, 'smb': 5, 'storage': 10}
+
+# Gleichzeitige Prüfungen
+CHECK_JOBS = 16
+
+SMB_PORT = 445
+
+# Kurzer Fingerabdruck der Einstellungen eines Ziels (geänderte Einstellungen machen das Ergebnis ungültig)
+def fingerprint(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+def check_database(db, timeout):
+    import pymysql
+    connection = pymysql.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                 database=db.database or None, connect_timeout=timeout,
+                                 read_timeout=timeout, write_timeout=timeout)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT VERSION()")
+            version = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    return f"Verbunden mit {db.host}:{db.port} (MySQL {version})"
+
+def check_smb(share, timeout):
+    parts = share.split('/')
+    if len(parts) < 4 or not parts[2]:
+        raise ValueError(f"Ungültiger SMB-Share: {share}")
+    with socket.create_connection((parts[2], SMB_PORT), timeout=timeout):
+        pass
+    return f"Server {parts[2]} erreichbar (Port {SMB_PORT})"
+
+def check_storage(config):
+    from storage import storage_from_config
+    storage = storage_from_config(config)
+    try:
+        storage.check()
+    finally:
+        storage.close()
+    return f"{storage.describe()} erreichbar"
+
+# Zu prüfende Ziele der Konfiguration (BackupSettings): ID, Bezeichnung, Art, Fingerabdruck und Prüffunktion
+def health_targets(settings):
+    targets = []
+    for db in settings.databases:
+        connection = [db.host, db.port, db.user, db.password, db.database]
+        targets.append({'id': f"db:{db.id}", 'label': db.name or db.database, 'kind': 'database',
+                        'fingerprint': fingerprint(connection),
+                        'check': lambda db=db: check_database(db, CHECK_TIMEOUTS['database'])})
+    if settings.smb_enabled and settings.smb_share:
+        share = settings.smb_share
+        targets.append({'id': 'smb', 'label': 'SMB-Share', 'kind': 'smb', 'fingerprint': fingerprint(share),
+                        'check': lambda: check_smb(share, CHECK_TIMEOUTS['smb'])})
+    if settings.storage_backend != 'none':
+        # Das Speicherziel wird aus den Textwerten gebaut (wie beim Test ungespeicherter Formulare)
+        config = settings.values
+        values = {key: value for key, value in config.items() if key.startswith(('STORAGE_', 'S3_', 'SFTP_'))}
+        targets.append({'id': 'storage', 'label': 'Speicherziel', 'kind': 'storage',
+                        'fingerprint': fingerprint(values), 'check': lambda: check_storage(config)})
+    return targets
+
+def run_check(target):
+    started = time.monotonic()
+    try:
+        ok, message = True, target['check']()
+    except Exception as e:
+        ok, message = False, str(e) or e.__class__.__name__
+    return ok, message, round(time.monotonic() - started, 3)
+
+# Prüfe die Ziele gleichzeitig; hängende Prüfungen werden nach ihrem Zeitlimit als Fehler gemeldet
+def run_checks(targets, jobs=CHECK_JOBS):
+    if not targets:
+        return {}
+    workers = min(jobs, len(targets))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {target['id']: executor.submit(run_check, target) for target in targets}
+    # Stehen mehr Ziele an als Worker, laufen sie in mehreren Runden
+    rounds = -(-len(targets) // workers)
+    wait(futures.values(), timeout=max(CHECK_TIMEOUTS.values()) * rounds + 1)
+    executor.shutdown(wait=False, cancel_futures=True)
+    now = time.time()
+    results = {}
+    for target in targets:
+        future = futures[target['id']]
+        if future.done() and not future.cancelled():
+            ok, message, duration = future.result()
+        else:
+            ok, message, duration = False, f"Zeitüberschreitung nach {CHECK_TIMEOUTS[target['kind']]} s", None
+        results[target['id']] = {'ok': ok, 'message': message, 'duration': duration, 'checked': now,
+                                 'fingerprint': target['fingerprint']}
+    return results
+
+@contextlib.contextmanager
+def locked(path):
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def load_results(path=HEALTH_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_results(results, path=HEALTH_FILE):
+    with locked(path):
+        stored = load_results(path)
+        stored.update(results)
+        write_file_atomic(path, json.dumps(stored, indent=2))
+
+# Zwischengespeicherte Ergebnisse der aktuellen Ziele (ohne Verbindungen aufzubauen)
+# Ergebnisse mit geänderten Einstellungen fehlen, ältere als ttl sind als veraltet markiert.
+def cached_status(settings, ttl=HEALTH_CACHE_TTL, path=HEALTH_FILE):
+    stored = load_results(path)
+    now = time.time()
+    status = {}
+    for target in health_targets(settings):
+        result = stored.get(target['id'])
+        if not result or result.get('fingerprint') != target['fingerprint']:
+            status[target['id']] = {'label': target['label'], 'ok': None, 'stale': True}
+            continue
+        status[target['id']] = dict(
+            result, label=target['label'], stale=now - result['checked'] > ttl,
+            checked_at=datetime.datetime.fromtimestamp(result['checked']).strftime('%d.%m.%Y %H:%M:%S'))
+    return status
+
+# Prüfe alle Ziele mit veraltetem oder fehlendem Ergebnis (force: alle) und liefere den neuen Stand
+def check_all(settings, force=False, ttl=HEALTH_CACHE_TTL, path=HEALTH_FILE):
+    status = cached_status(settings, ttl, path)
+    targets = [target for target in health_targets(settings) if force or status[target['id']]['stale']]
+    results = run_checks(targets)
+    if results:
+        save_results(results, path)
+    return cached_status(settings, ttl, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Verbindungsprüfung aller Datenbanken und Ziele')
+    parser.add_argument('--force', action='store_true', help='Auch Ziele mit aktuellem Ergebnis prüfen')
+    parser.add_argument('--json', action='store_true', help='Ausgabe als JSON')
+    args = parser.parse_args()
+
+    status = check_all(load_settings(), args.force)
+    if args.json:
+        print(json.dumps(status, indent=2))
+    else:
+        for target, result in status.items():
+            state = 'OK' if result['ok'] else 'FEHLER'
+            print(f"{state:<7} {target:<10} {result['label']}: {result.get('message', '')}")
+    return 0 if all(result['ok'] for result in status.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Prüfsummen und Integritätsprüfung von Backups
+#
+# Der Messpunkt hinter der Kompression berechnet die SHA-256-Prüfsumme während
+# des Backups (profiler.py probe --sha256), die Datei wird dafür nicht erneut
+# gelesen. Die Prüfsumme liegt im Format von sha256sum neben dem Backup
+# (<backup>.sha256, auch auf SMB-Share und Speicherziel) und steht zusammen mit
+# Bytes und Zeilen des Dumps im Backup-Katalog.
+#
+# Der Scheduler prüft stündlich mit niedriger Priorität die Backups der letzten
+# VERIFY_DAYS Tage, die noch nicht geprüft wurden: Probeweise entpacken, Prüfsumme,
+# Bytes und Zeilen vergleichen und bei vollen Backups das Ende des Dumps suchen
+# ("-- Dump completed"). Beschädigte Backups werden auf der Backup-Seite markiert.
+#
+# Aufruf:
+#   integrity.py record <backup> --stats raw.json --compressed-stats compressed.json
+#   integrity.py verify [--days 2] [--jobs 2] [--all]
+#   integrity.py check <backup>
+
+import io
+import os
+import sys
+import hashlib
+import argparse
+import threading
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from backup_config import load_backup_config, load_settings, write_file_atomic
+from backup_codecs import codec_for_file, decompress_command
+from profiler import ROW_MARKERS, load_probe
+
+CHECKSUM_SUFFIX = '.sha256'
+
+# Blockgröße beim Prüfen
+VERIFY_BLOCK_SIZE = 1024 * 1024
+
+# So viele Bytes am Ende des entpackten Dumps werden nach dem Abschluss durchsucht
+TRAILER_BYTES = 4096
+
+# Abschluss eines vollständigen Dumps (mysqldump und dumper.py)
+DUMP_TRAILER = b'-- Dump completed'
+
+# Priorität der Prüfung (nice), damit laufende Backups Vorrang haben
+VERIFY_NICE = 19
+
+def checksum_path(path):
+    return path + CHECKSUM_SUFFIX
+
+# Prüfsummendatei im Format von sha256sum (prüfbar mit "sha256sum -c")
+def write_checksum_file(path, digest):
+    write_file_atomic(checksum_path(path), f"{digest}  {os.path.basename(path)}\n")
+
+def read_checksum_file(path):
+    try:
+        with open(checksum_path(path)) as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+# Entpacke einen Datenstrom in einem eigenen Prozess und liefere die entpackten Blöcke
+# Ein Thread füttert den Prozess und berechnet dabei die Prüfsumme der gelesenen Daten.
+def decompressed_blocks(source, codec, digest):
+    def nice():
+        os.nice(VERIFY_NICE)
+
+    if not codec:
+        for block in iter(lambda: source.read(VERIFY_BLOCK_SIZE), b''):
+            digest.update(block)
+            yield block
+        return
+
+    process = subprocess.Popen(decompress_command(codec), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, preexec_fn=nice)
+    errors = []
+
+    def feed():
+        try:
+            for block in iter(lambda: source.read(VERIFY_BLOCK_SIZE), b''):
+                digest.update(block)
+                process.stdin.write(block)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            with contextlib.suppress(OSError):
+                process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        yield from iter(lambda: process.stdout.read(VERIFY_BLOCK_SIZE), b'')
+    finally:
+        feeder.join()
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors='replace').strip()
+        process.stderr.close()
+        returncode = process.wait()
+    if errors:
+        raise errors[0]
+    if returncode != 0:
+        raise IOError(f"Entpacken fehlgeschlagen: {stderr or f'Exit-Code {returncode}'}")
+
+# Prüfe eine Backup-Datei; expected: im Katalog gespeicherte Prüfsumme, Bytes und Zeilen
+# Liefert (True, Meldung) oder (False, Fehlermeldung).
+def verify_file(path, expected=None, trailer=DUMP_TRAILER):
+    expected = expected or {}
+    digest = hashlib.sha256()
+    raw_bytes = 0
+    rows = 0
+    tail = b''
+    try:
+        with open(path, 'rb') as source:
+            for block in decompressed_blocks(source, codec_for_file(path), digest):
+                raw_bytes += len(block)
+                window = tail + block
+                rows += sum(window.count(marker) - tail.count(marker) for marker in ROW_MARKERS)
+                tail = window[-TRAILER_BYTES:]
+    except (OSError, IOError) as e:
+        return False, str(e)
+
+    if expected.get('sha256') and digest.hexdigest() != expected['sha256']:
+        return False, "Prüfsumme stimmt nicht überein"
+    if expected.get('raw_bytes') is not None and raw_bytes != expected['raw_bytes']:
+        return False, f"Entpackte Größe {raw_bytes} statt {expected['raw_bytes']} Bytes"
+    if expected.get('rows') is not None and rows != expected['rows']:
+        return False, f"{rows} statt {expected['rows']} Zeilen"
+    if trailer and trailer not in tail:
+        return False, "Dump ist unvollständig (Abschlusszeile fehlt)"
+    return True, f"{raw_bytes / 1024 / 1024:.1f} MB entpackt, {rows} Zeilen"
+
+# Prüfe ein Verzeichnis-Backup: Manifest vorhanden, jede Datei lässt sich entpacken
+def verify_directory(path):
+    from parallel_dump import MANIFEST_FILE
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return False, "Manifest fehlt"
+    files = sorted(entry.path for entry in os.scandir(path) if entry.is_file() and codec_for_file(entry.name))
+    for file_path in files:
+        ok, message = verify_file(file_path, trailer=None)
+        if not ok:
+            return False, f"{os.path.basename(file_path)}: {message}"
+    return True, f"{len(files)} Dateien entpackt"
+
+# Prüfe ein Backup aus dem Katalog (nur lokale Backup-Dateien und Verzeichnis-Backups)
+def verify_backup(backup_dir, backup, expected=None):
+    path = os.path.join(backup_dir, backup['filename'])
+    if backup['kind'] == 'directory':
+        return verify_directory(path)
+    expected = dict(expected or {})
+    expected['sha256'] = expected.get('sha256') or backup.get('checksum') or read_checksum_file(path)
+    # Die mysqlbinlog-Ausgabe inkrementeller Backups hat keine feste Abschlusszeile
+    trailer = None if backup.get('backup_type') == 'incremental' else DUMP_TRAILER
+    return verify_file(path, expected, trailer)
+
+# Prüfe die noch ungeprüften Backups der letzten Tage parallel und trage das Ergebnis in den Katalog ein
+# settings: BackupSettings (Standard für days und jobs: VERIFY_DAYS und VERIFY_JOBS)
+def verify_recent(catalog, settings, days=None, jobs=None, recheck=False, log=None):
+    days = days if days is not None else settings.verify_days
+    jobs = jobs or settings.verify_jobs
+    if days <= 0:
+        return []
+    backup_dir = settings.backup_dir
+    backups = catalog.verification_candidates(days, recheck)
+
+    def verify(backup):
+        try:
+            ok, message = verify_backup(backup_dir, backup, catalog.get_integrity(backup['filename']))
+        except Exception as e:
+            ok, message = False, str(e)
+        catalog.record_verification(backup['filename'], ok, message)
+        if log:
+            log(f"{'OK' if ok else 'BESCHÄDIGT'}: {backup['filename']} ({message})")
+        return backup['filename'], ok, message
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(verify, backups))
+
+# Prüfsumme, Bytes und Zeilen eines fertigen Backups aus den Messpunkten der Pipeline festhalten
+def record_integrity(catalog, config, filename, raw=None, compressed=None):
+    from storage import storage_from_config, storage_only
+    digest = (compressed or {}).get('sha256')
+    if digest:
+        path = os.path.join(config.get('BACKUP_DIR', '/app/backups'), filename)
+        if os.path.isfile(path):
+            write_checksum_file(path, digest)
+        elif storage_only(config):
+            line = f"{digest}  {filename}\n".encode()
+            storage_from_config(config).put_stream(filename + CHECKSUM_SUFFIX, io.BytesIO(line))
+    catalog.record_integrity(filename, digest, (raw or {}).get('bytes'), (raw or {}).get('rows'))
+    return digest
+
+def main():
+    parser = argparse.ArgumentParser(description='Prüfsummen und Integritätsprüfung von Backups')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='Prüfsumme und Zähler eines fertigen Backups speichern')
+    record_parser.add_argument('filename')
+    record_parser.add_argument('--stats', help='Messpunkt nach dem Dump (Bytes, Zeilen)')
+    record_parser.add_argument('--compressed-stats', help='Messpunkt nach der Kompression (Prüfsumme)')
+    verify_parser = commands.add_parser('verify', help='Backups der letzten Tage prüfen')
+    verify_parser.add_argument('--days', type=int, help='Backups der letzten Tage (Standard: VERIFY_DAYS)')
+    verify_parser.add_argument('--jobs', type=int, help='Gleichzeitige Prüfungen (Standard: VERIFY_JOBS)')
+    verify_parser.add_argument('--all', action='store_true', help='Auch bereits geprüfte Backups erneut prüfen')
+    check_parser = commands.add_parser('check', help='Ein Backup sofort prüfen')
+    check_parser.add_argument('filename')
+    args = parser.parse_args()
+
+    from catalog import BackupCatalog
+    catalog = BackupCatalog()
+    config = load_backup_config()
+    try:
+        if args.command == 'record':
+            digest = record_integrity(catalog, config, args.filename, load_probe(args.stats),
+                                      load_probe(args.compressed_stats))
+            if digest:
+                print(f"SHA-256 von {args.filename}: {digest}")
+            return 0
+        os.nice(VERIFY_NICE)
+        if args.command == 'check':
+            backup = catalog.get(args.filename)
+            if not backup or backup['kind'] not in ('file', 'directory'):
+                print(f"FEHLER: {args.filename} ist keine lokale Backup-Datei", file=sys.stderr)
+                return 1
+            ok, message = verify_backup(config.get('BACKUP_DIR', '/app/backups'), backup,
+                                        catalog.get_integrity(args.filename))
+            catalog.record_verification(args.filename, ok, message)
+            print(f"{'OK' if ok else 'BESCHÄDIGT'}: {args.filename} ({message})")
+            return 0 if ok else 2
+        results = verify_recent(catalog, load_settings(), args.days, args.jobs, args.all, log=print)
+        corrupt = sum(1 for _, ok, _ in results if not ok)
+        print(f"{len(results)} Backups geprüft, {corrupt} beschädigt")
+        return 2 if corrupt else 0
+    except Exception as e:
+        print(f"FEHLER: {args.command} fehlgeschlagen: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
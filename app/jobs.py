@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Warteschlange für Hintergrund-Jobs (z.B. manuelle Backups)
+#
+# Jobs laufen in Threads des Prozesses, der sie angenommen hat. Mit einer
+# Job-Datenbank (path) werden Status, Fortschritt und Log zusätzlich in SQLite
+# gespeichert: Damit sehen alle Worker-Prozesse der Weboberfläche dieselben
+# Jobs, und eine Sperrdatei sorgt dafür, dass Jobs prozessübergreifend
+# nacheinander laufen. Jobs eines beendeten Prozesses gelten als abgebrochen.
+#
+# Mit serialized laufen nur die genannten Arten (z.B. Backup und Wiederherstellung)
+# nacheinander unter der Sperre. Alle anderen Jobs (z.B. Verbindungstests) laufen
+# daneben in eigenen Threads und warten nicht auf ein stundenlanges Backup; für sie
+# kann je Art ein hartes Zeitlimit gesetzt werden (timeouts).
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import queue
+import sqlite3
+import logging
+import threading
+import datetime
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# Anzahl abgeschlossener Jobs, die für die Statusabfrage vorgehalten werden
+MAX_FINISHED_JOBS = 50
+
+# Maximale Anzahl Logzeilen pro Job
+MAX_LOG_LINES = 5000
+
+# Fortschritt höchstens so oft (Sekunden) in die Job-Datenbank schreiben
+PROGRESS_SAVE_INTERVAL = 1
+
+# Threads für Jobs, die nicht nacheinander laufen müssen
+SIDE_WORKERS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created TEXT NOT NULL,
+    started TEXT,
+    finished TEXT,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    pid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+CREATE TABLE IF NOT EXISTS job_log (
+    job_id TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (job_id, line_no)
+);
+"""
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+# Job-Datenbank, die sich die Worker-Prozesse der Weboberfläche teilen
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    # Sperre, unter der Jobs prozessübergreifend nacheinander laufen
+    @contextlib.contextmanager
+    def run_lock(self):
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self, job):
+        data = job.to_dict()
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, description, status, created, started, finished, "
+                "progress_done, progress_total, result, error, pid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (data['id'], data['kind'], data['description'], data['status'], data['created'], data['started'],
+                 data['finished'], data['progress']['done'], data['progress']['total'],
+                 json.dumps(data['result'], default=str) if data['result'] is not None else None,
+                 data['error'], job.pid))
+
+    def save_progress(self, job_id, done, total):
+        with self.connect() as connection:
+            connection.execute("UPDATE jobs SET progress_done = ?, progress_total = ? WHERE id = ?",
+                               (done, total, job_id))
+
+    def append_log(self, job_id, line_no, line):
+        with self.connect() as connection:
+            connection.execute("INSERT INTO job_log (job_id, line_no, line) VALUES (?, ?, ?)",
+                               (job_id, line_no, line))
+            if line_no >= MAX_LOG_LINES and line_no % 100 == 0:
+                connection.execute("DELETE FROM job_log WHERE job_id = ? AND line_no <= ?",
+                                   (job_id, line_no - MAX_LOG_LINES))
+
+    def log_tail(self, job_id, offset=0):
+        with self.connect() as connection:
+            first, end = connection.execute("SELECT MIN(line_no), MAX(line_no) + 1 FROM job_log WHERE job_id = ?",
+                                            (job_id,)).fetchone()
+            start = max(offset, first or 0)
+            lines = [row['line'] for row in connection.execute(
+                "SELECT line FROM job_log WHERE job_id = ? AND line_no >= ? ORDER BY line_no", (job_id, start))]
+        return {'offset': start, 'next_offset': end or 0, 'lines': lines}
+
+    def load(self, job_id):
+        with self.connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row, self) if row else None
+
+    # Jobs, neueste zuerst
+    def list(self, kind=None, limit=MAX_FINISHED_JOBS):
+        where, params = ('WHERE kind = ?', [kind]) if kind else ('', [])
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT * FROM jobs {where} ORDER BY created DESC LIMIT ?",
+                                      params + [limit]).fetchall()
+        return [Job.from_row(row, self) for row in rows]
+
+    def pending(self):
+        return sum(self.counts().values())
+
+    # Anzahl wartender und laufender Jobs je Status
+    def counts(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) AS count FROM jobs "
+                                      "WHERE status IN ('queued', 'running') GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+    # Markiere offene Jobs beendeter Prozesse als abgebrochen
+    def fail_orphaned(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT id, pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            orphaned = [row['id'] for row in rows if not process_alive(row['pid'])]
+            for job_id in orphaned:
+                connection.execute("UPDATE jobs SET status = 'failed', finished = ?, "
+                                   "error = 'Abgebrochen: Prozess der Weboberfläche wurde beendet' WHERE id = ?",
+                                   (datetime.datetime.now().isoformat(), job_id))
+        return orphaned
+
+    # Entferne die ältesten abgeschlossenen Jobs samt Log
+    def prune(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT id FROM jobs WHERE status IN ('success', 'failed') "
+                                      "ORDER BY created DESC LIMIT -1 OFFSET ?", (MAX_FINISHED_JOBS,)).fetchall()
+            for row in rows:
+                connection.execute("DELETE FROM job_log WHERE job_id = ?", (row['id'],))
+                connection.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Job:
+    def __init__(self, kind, description, func, args=(), kwargs=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.description = description
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.status = 'queued'
+        self.created = datetime.datetime.now()
+        self.started = None
+        self.finished = None
+        self.progress_done = 0
+        self.progress_total = 0
+        self.result = None
+        self.error = None
+        # Logzeilen mit fortlaufendem Offset, ältere Zeilen werden verworfen
+        self.log_lines = []
+        self.log_offset = 0
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.store = None
+        self.progress_saved = 0
+
+    # Stand eines Jobs aus der Job-Datenbank (auch aus anderen Prozessen)
+    @classmethod
+    def from_row(cls, row, store):
+        job = cls(row['kind'], row['description'], None)
+        job.id = row['id']
+        job.status = row['status']
+        job.created = parse_time(row['created'])
+        job.started = parse_time(row['started'])
+        job.finished = parse_time(row['finished'])
+        job.progress_done = row['progress_done']
+        job.progress_total = row['progress_total']
+        job.result = json.loads(row['result']) if row['result'] else None
+        job.error = row['error']
+        job.pid = row['pid']
+        job.store = store
+        return job
+
+    # Hänge eine Zeile an das Job-Log an
+    def log(self, line):
+        line = line.rstrip('\n')
+        with self.lock:
+            self.log_lines.append(line)
+            line_no = self.log_offset + len(self.log_lines) - 1
+            overflow = len(self.log_lines) - MAX_LOG_LINES
+            if overflow > 0:
+                del self.log_lines[:overflow]
+                self.log_offset += overflow
+            if self.store:
+                self.store.append_log(self.id, line_no, line)
+
+    # Setze den Fortschritt (erledigte / gesamte Schritte)
+    def set_progress(self, done, total=None):
+        with self.lock:
+            self.progress_done = done
+            if total is not None:
+                self.progress_total = total
+            if self.store and time.monotonic() - self.progress_saved >= PROGRESS_SAVE_INTERVAL:
+                self.progress_saved = time.monotonic()
+                self.store.save_progress(self.id, self.progress_done, self.progress_total)
+
+    # Gib die Logzeilen ab einem Offset zurück
+    def log_tail(self, offset=0):
+        if self.store:
+            return self.store.log_tail(self.id, offset)
+        with self.lock:
+            start = max(offset, self.log_offset)
+            lines = self.log_lines[start - self.log_offset:]
+            return {
+                'offset': start,
+                'next_offset': self.log_offset + len(self.log_lines),
+                'lines': lines
+            }
+
+    @property
+    def done(self):
+        return self.status in ('success', 'failed')
+
+    # JSON-Darstellung für die Status-API
+    def to_dict(self):
+        with self.lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'description': self.description,
+                'status': self.status,
+                'created': self.created.isoformat(),
+                'started': self.started.isoformat() if self.started else None,
+                'finished': self.finished.isoformat() if self.finished else None,
+                'progress': {
+                    'done': self.progress_done,
+                    'total': self.progress_total
+                },
+                'result': self.result,
+                'error': self.error
+            }
+
+class JobQueue:
+    # workers bestimmt, wie viele Jobs gleichzeitig ausgeführt werden
+    # path: Job-Datenbank, wenn mehrere Prozesse die Jobs sehen sollen
+    # serialized: Arten, die nacheinander unter der Sperre laufen (None = alle)
+    # timeouts: Zeitlimit in Sekunden je Art für die übrigen Jobs
+    def __init__(self, workers=1, path=None, serialized=None, timeouts=None, side_workers=SIDE_WORKERS):
+        self.queue = queue.Queue()
+        self.side_queue = queue.Queue()
+        self.jobs = {}
+        self.order = []
+        self.lock = threading.Lock()
+        self.threads = []
+        self.side_threads = []
+        self.workers = workers
+        self.side_workers = side_workers
+        self.serialized = set(serialized) if serialized is not None else None
+        self.timeouts = dict(timeouts or {})
+        self.store = JobStore(path) if path else None
+        if self.store:
+            for job_id in self.store.fail_orphaned():
+                logger.warning(f"Job {job_id} wurde durch das Beenden der Weboberfläche abgebrochen.")
+
+    # Starte die Worker-Threads beim ersten Job
+    def _ensure_workers(self):
+        if self.threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if self.serialized is None:
+            return
+        for index in range(self.side_workers):
+            thread = threading.Thread(target=self._side_worker, name=f'job-side-{index}', daemon=True)
+            thread.start()
+            self.side_threads.append(thread)
+
+    # Läuft ein Job dieser Art nacheinander mit den anderen unter der Sperre?
+    def is_serialized(self, kind):
+        return self.serialized is None or kind in self.serialized
+
+    # Reiche einen Job ein und gib ihn sofort zurück
+    # Die Funktion erhält den Job als erstes Argument für Log und Fortschritt
+    def submit(self, kind, description, func, *args, **kwargs):
+        job = Job(kind, description, func, args, kwargs)
+        job.store = self.store
+        with self.lock:
+            self._ensure_workers()
+            self.jobs[job.id] = job
+            self.order.append(job.id)
+            self._prune()
+        self._save(job)
+        (self.queue if self.is_serialized(kind) else self.side_queue).put(job)
+        logger.info(f"Job {job.id} ({description}) eingereiht.")
+        return job
+
+    def _save(self, job):
+        if not self.store:
+            return
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            logger.error(f"Fehler beim Speichern von Job {job.id}: {e}")
+
+    # Entferne die ältesten abgeschlossenen Jobs
+    def _prune(self):
+        finished = [job_id for job_id in self.order if self.jobs[job_id].done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self.order.remove(job_id)
+            del self.jobs[job_id]
+        if self.store:
+            self.store.prune()
+
+    def get(self, job_id):
+        if self.store:
+            return self.store.load(job_id)
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    # Liste der Jobs, neueste zuerst
+    def list(self, kind=None):
+        if self.store:
+            return self.store.list(kind)
+        with self.lock:
+            jobs = [self.jobs[job_id] for job_id in reversed(self.order)]
+        if kind:
+            jobs = [job for job in jobs if job.kind == kind]
+        return jobs
+
+    # Anzahl wartender und laufender Jobs
+    def pending(self):
+        return sum(self.counts().values())
+
+    def counts(self):
+        if self.store:
+            return self.store.counts()
+        counts = {}
+        with self.lock:
+            for job in self.jobs.values():
+                if not job.done:
+                    counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    # Warte beim Beenden des Prozesses auf laufende Jobs; was danach noch offen ist, gilt als abgebrochen
+    def shutdown(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            jobs = [self.jobs[job_id] for job_id in self.order]
+        for job in jobs:
+            while not job.done and time.monotonic() < deadline:
+                time.sleep(0.5)
+            if not job.done:
+                with job.lock:
+                    job.status = 'failed'
+                    job.error = 'Abgebrochen: Prozess der Weboberfläche wurde beendet'
+                    job.finished = datetime.datetime.now()
+                self._save(job)
+                logger.warning(f"Job {job.id} ({job.description}) beim Beenden abgebrochen.")
+
+    def _run(self, job):
+        with job.lock:
+            if job.done:
+                return
+            job.status = 'running'
+            job.started = datetime.datetime.now()
+        self._save(job)
+        logger.info(f"Job {job.id} ({job.description}) gestartet.")
+        try:
+            success, result = job.func(job, *job.args, **job.kwargs)
+            with job.lock:
+                # Nach einer Zeitüberschreitung bleibt der Job fehlgeschlagen
+                if not job.done:
+                    job.result = result
+                    job.status = 'success' if success else 'failed'
+        except Exception as e:
+            logger.exception(f"Fehler im Job {job.id} ({job.description})")
+            with job.lock:
+                if not job.done:
+                    job.error = str(e)
+                    job.status = 'failed'
+        finally:
+            with job.lock:
+                job.finished = job.finished or datetime.datetime.now()
+            self._save(job)
+        logger.info(f"Job {job.id} ({job.description}) beendet: {job.status}.")
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if self.store:
+                    with self.store.run_lock():
+                        self._run(job)
+                else:
+                    self._run(job)
+            finally:
+                self.queue.task_done()
+
+    # Jobs neben der Warteschlange (ohne Sperre, mit Zeitlimit je Art)
+    def _side_worker(self):
+        while True:
+            job = self.side_queue.get()
+            try:
+                timeout = self.timeouts.get(job.kind)
+                if not timeout:
+                    self._run(job)
+                    continue
+                # Ein hängender Job (z.B. ein nicht antwortender Mount) blockiert nur seinen eigenen Thread
+                thread = threading.Thread(target=self._run, args=(job,), name=f'job-{job.id}', daemon=True)
+                thread.start()
+                thread.join(timeout)
+                if thread.is_alive():
+                    self._expire(job, timeout)
+            finally:
+                self.side_queue.task_done()
+
+    def _expire(self, job, timeout):
+        with job.lock:
+            if job.done:
+                return
+            job.status = 'failed'
+            job.error = f'Zeitüberschreitung nach {timeout} s'
+            job.finished = datetime.datetime.now()
+        self._save(job)
+        logger.warning(f"Job {job.id} ({job.description}) nach {timeout} s abgebrochen.")
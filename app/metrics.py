@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Messwerte der Backups für Prometheus (/metrics)
+#
+# backup.sh meldet jeden Lauf mit Dauer, Größe vor und nach der Kompression,
+# Zeilenzahl und Übertragungsdauer. Die Werte werden als Histogramme je Datenbank
+# in /app/config/metrics.sqlite aufsummiert, damit jeder Prozess der
+# Weboberfläche dieselben Zähler ausliefert und sie über Neustarts erhalten bleiben.
+#
+# Bytes und Zeilen stammen von den Messpunkten des Profilers (profiler.py), die
+# mit dem Lauf gemeldet werden; record speichert zugleich das Profil im Katalog.
+#
+# Aufruf aus backup.sh:
+#   metrics.py start --db-id 1 --database shop                   -> Backup läuft
+#   metrics.py record --db-id 1 --database shop --status success --duration 42 \
+#       --backup <datei> --stats raw.json --compressed-stats compressed.json --upload-duration 7
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import contextlib
+from backup_config import CONFIG_DIR
+from jobs import process_alive
+from profiler import load_probe, build_profile
+
+METRICS_FILE = os.path.join(CONFIG_DIR, 'metrics.sqlite')
+
+PREFIX = 'mysql_backup'
+
+MEGABYTE = 1024 * 1024
+SECONDS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400)
+BYTES_BUCKETS = tuple(MEGABYTE * size for size in (1, 10, 100, 1024, 10 * 1024, 100 * 1024, 1024 * 1024))
+
+# Histogramme: Name -> (Beschreibung, Obergrenzen der Buckets)
+HISTOGRAMS = {
+    'duration_seconds': ('Dauer des Dumps in Sekunden', SECONDS_BUCKETS),
+    'raw_bytes': ('Größe des Dumps vor der Kompression in Bytes', BYTES_BUCKETS),
+    'compressed_bytes': ('Größe des Backups nach der Kompression in Bytes', BYTES_BUCKETS),
+    'compression_ratio': ('Verhältnis unkomprimierte zu komprimierter Größe', (1, 2, 3, 4, 5, 7.5, 10, 15, 20, 30)),
+    'rows_per_second': ('Gesicherte Zeilen pro Sekunde', (1000, 5000, 10000, 50000, 100000, 500000, 1000000)),
+    'upload_duration_seconds': ('Dauer der Übertragung auf SMB-Share und Speicherziel in Sekunden', SECONDS_BUCKETS)
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS histogram_buckets (
+    name TEXT NOT NULL,
+    db_id TEXT NOT NULL,
+    le REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, db_id, le)
+);
+CREATE TABLE IF NOT EXISTS histograms (
+    name TEXT NOT NULL,
+    db_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    PRIMARY KEY (name, db_id)
+);
+CREATE TABLE IF NOT EXISTS databases (
+    db_id TEXT PRIMARY KEY,
+    database TEXT NOT NULL,
+    last_success REAL,
+    last_failure REAL,
+    successes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS running (
+    db_id TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started REAL NOT NULL,
+    PRIMARY KEY (db_id, pid)
+);
+"""
+
+class MetricsStore:
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+
+    @contextlib.contextmanager
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def observe(self, connection, name, db_id, value):
+        bounds = HISTOGRAMS[name][1]
+        le = next((bound for bound in bounds if value <= bound), float('inf'))
+        connection.execute("INSERT INTO histogram_buckets (name, db_id, le, count) VALUES (?, ?, ?, 1) "
+                           "ON CONFLICT (name, db_id, le) DO UPDATE SET count = count + 1", (name, db_id, le))
+        connection.execute("INSERT INTO histograms (name, db_id, count, sum) VALUES (?, ?, 1, ?) "
+                           "ON CONFLICT (name, db_id) DO UPDATE SET count = count + 1, sum = sum + excluded.sum",
+                           (name, db_id, value))
+
+    # Backup einer Datenbank hat begonnen (pid: Prozess von backup.sh)
+    def start(self, db_id, database, pid):
+        with self.connect() as connection:
+            self.touch(connection, db_id, database)
+            for row in connection.execute("SELECT db_id, pid FROM running").fetchall():
+                if not process_alive(row['pid']):
+                    connection.execute("DELETE FROM running WHERE db_id = ? AND pid = ?", (row['db_id'], row['pid']))
+            connection.execute("INSERT OR REPLACE INTO running (db_id, pid, started) VALUES (?, ?, ?)",
+                               (db_id, pid, time.time()))
+
+    def touch(self, connection, db_id, database):
+        connection.execute("INSERT INTO databases (db_id, database) VALUES (?, ?) "
+                           "ON CONFLICT (db_id) DO UPDATE SET database = excluded.database", (db_id, database))
+
+    # Abgeschlossener Lauf; fehlende Werte (None) werden nicht gezählt
+    def record(self, db_id, database, success, duration=None, raw_bytes=None, compressed_bytes=None, rows=None,
+               upload_duration=None, pid=None):
+        with self.connect() as connection:
+            self.touch(connection, db_id, database)
+            if pid:
+                connection.execute("DELETE FROM running WHERE db_id = ? AND pid = ?", (db_id, pid))
+            last, count = ('last_success', 'successes') if success else ('last_failure', 'failures')
+            connection.execute(f"UPDATE databases SET {last} = ?, {count} = {count} + 1 WHERE db_id = ?",
+                               (time.time(), db_id))
+            if not success:
+                return
+            values = {
+                'duration_seconds': duration,
+                'raw_bytes': raw_bytes,
+                'compressed_bytes': compressed_bytes,
+                'compression_ratio': raw_bytes / compressed_bytes if raw_bytes and compressed_bytes else None,
+                'rows_per_second': rows / max(duration, 1) if rows is not None and duration is not None else None,
+                'upload_duration_seconds': upload_duration
+            }
+            for name, value in values.items():
+                if value is not None:
+                    self.observe(connection, name, db_id, value)
+
+    def snapshot(self):
+        with self.connect() as connection:
+            databases = {row['db_id']: dict(row) for row in connection.execute("SELECT * FROM databases")}
+            histograms = {(row['name'], row['db_id']): dict(row, buckets={})
+                          for row in connection.execute("SELECT * FROM histograms")}
+            for row in connection.execute("SELECT * FROM histogram_buckets"):
+                histograms[(row['name'], row['db_id'])]['buckets'][row['le']] = row['count']
+            running = [dict(row) for row in connection.execute("SELECT * FROM running")]
+        # Abgestürzte Backup-Läufe nicht mehr als laufend zählen
+        running = [entry for entry in running if process_alive(entry['pid'])]
+        return databases, histograms, running
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def labels(**values):
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in values.items()) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+# Prometheus-Textformat; jobs: Anzahl der Jobs der Weboberfläche je Status
+def render(store=None, jobs=None):
+    databases, histograms, running = (store or MetricsStore()).snapshot()
+    lines = []
+
+    def header(name, kind, description):
+        lines.append(f'# HELP {PREFIX}_{name} {description}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+    for name, (description, bounds) in HISTOGRAMS.items():
+        header(name, 'histogram', description)
+        for (histogram, db_id), data in sorted(histograms.items()):
+            if histogram != name:
+                continue
+            database = databases.get(db_id, {}).get('database', '')
+            cumulative = 0
+            for bound in bounds + (float('inf'),):
+                cumulative += data['buckets'].get(bound, 0)
+                lines.append(f'{PREFIX}_{name}_bucket'
+                             f'{labels(db_id=db_id, database=database, le=format_value(bound))} {cumulative}')
+            lines.append(f'{PREFIX}_{name}_sum{labels(db_id=db_id, database=database)} {format_value(data["sum"])}')
+            lines.append(f'{PREFIX}_{name}_count{labels(db_id=db_id, database=database)} {data["count"]}')
+
+    header('last_success_timestamp_seconds', 'gauge', 'Zeitpunkt des letzten erfolgreichen Backups')
+    for db_id, data in sorted(databases.items()):
+        if data['last_success']:
+            lines.append(f'{PREFIX}_last_success_timestamp_seconds'
+                         f'{labels(db_id=db_id, database=data["database"])} {int(data["last_success"])}')
+    header('last_failure_timestamp_seconds', 'gauge', 'Zeitpunkt des letzten fehlgeschlagenen Backups')
+    for db_id, data in sorted(databases.items()):
+        if data['last_failure']:
+            lines.append(f'{PREFIX}_last_failure_timestamp_seconds'
+                         f'{labels(db_id=db_id, database=data["database"])} {int(data["last_failure"])}')
+    header('runs_total', 'counter', 'Backup-Läufe nach Ergebnis')
+    for db_id, data in sorted(databases.items()):
+        for status, count in (('success', data['successes']), ('failure', data['failures'])):
+            lines.append(f'{PREFIX}_runs_total{labels(db_id=db_id, database=data["database"], status=status)} {count}')
+
+    header('running', 'gauge', 'Gerade laufende Backups je Datenbank')
+    for db_id, data in sorted(databases.items()):
+        count = sum(1 for entry in running if entry['db_id'] == db_id)
+        lines.append(f'{PREFIX}_running{labels(db_id=db_id, database=data["database"])} {count}')
+    header('running_total', 'gauge', 'Gerade laufende Backups insgesamt')
+    lines.append(f'{PREFIX}_running_total {len(running)}')
+
+    if jobs is not None:
+        header('jobs', 'gauge', 'Hintergrund-Jobs der Weboberfläche nach Status')
+        for status in ('queued', 'running'):
+            lines.append(f'{PREFIX}_jobs{labels(status=status)} {jobs.get(status, 0)}')
+    return '\n'.join(lines) + '\n'
+
+# Bytes und Zeilen aus dem Messpunkt bzw. dem Manifest einer tabellenweisen Sicherung
+def load_stats(stats_path=None, backup_path=None):
+    for path in (stats_path, os.path.join(backup_path, 'manifest.json') if backup_path else None):
+        data = load_probe(path) if path and os.path.isfile(path) else None
+        if data and 'bytes' in data:
+            return data.get('bytes'), data.get('rows')
+    return None, None
+
+def main():
+    parser = argparse.ArgumentParser(description='Messwerte der Backups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    start_parser = subparsers.add_parser('start', help='Laufendes Backup melden')
+    record_parser = subparsers.add_parser('record', help='Abgeschlossenes Backup melden')
+    for subparser in (start_parser, record_parser):
+        subparser.add_argument('--db-id', required=True)
+        subparser.add_argument('--database', required=True)
+        subparser.add_argument('--pid', type=int, default=os.getppid(), help='Prozess des Backup-Laufs')
+    record_parser.add_argument('--status', choices=('success', 'failed'), required=True)
+    record_parser.add_argument('--duration', type=float)
+    record_parser.add_argument('--backup', help='Name des Backups (Größe aus dem Katalog)')
+    record_parser.add_argument('--stats', help='Messpunkt nach dem Dump (profiler.py probe)')
+    record_parser.add_argument('--compressed-stats', help='Messpunkt nach der Kompression')
+    record_parser.add_argument('--sink', help='Bezeichnung der Schreib-Stufe im Profil')
+    record_parser.add_argument('--upload-duration', type=float)
+    subparsers.add_parser('show', help='Messwerte im Prometheus-Format ausgeben')
+    args = parser.parse_args()
+
+    store = MetricsStore()
+    if args.command == 'start':
+        store.start(args.db_id, args.database, args.pid)
+        return 0
+    if args.command == 'show':
+        print(render(store), end='')
+        return 0
+
+    compressed_bytes = None
+    backup_path = None
+    if args.backup:
+        from catalog import BackupCatalog
+        from backup_config import load_backup_config
+        entry = BackupCatalog().get(args.backup)
+        compressed_bytes = entry['size'] if entry else None
+        backup_path = os.path.join(load_backup_config().get('BACKUP_DIR', '/app/backups'), args.backup)
+    raw_bytes, rows = load_stats(args.stats, backup_path)
+    store.record(args.db_id, args.database, args.status == 'success', args.duration, raw_bytes, compressed_bytes,
+                 rows, args.upload_duration, args.pid)
+    if args.backup and args.status == 'success':
+        raw = load_probe(args.stats)
+        profile = build_profile(args.duration, raw, load_probe(args.compressed_stats), args.upload_duration,
+                                compressed_bytes, args.sink, None if raw else raw_bytes)
+        BackupCatalog().record_profile(args.backup, profile)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Parallele Ausführung der Backups mehrerer Datenbanken
+
+import os
+import time
+import logging
+import threading
+import subprocess
+import datetime
+
+logger = logging.getLogger(__name__)
+
+# Backup-Skript
+BACKUP_SCRIPT = '/app/scripts/backup.sh'
+
+# Standardwerte für die Parallelität
+DEFAULT_PARALLEL_JOBS = 4
+DEFAULT_PARALLEL_PER_HOST = 2
+
+# Angenommene Dauer eines Backups ohne bisherige Messwerte (Sekunden)
+DEFAULT_BACKUP_DURATION = 300
+
+# Startversatz je Datenbank, damit Backups auf demselben Server nacheinander statt
+# gleichzeitig beginnen. Die Datenbanken werden in der übergebenen Reihenfolge auf
+# max_per_host Bahnen pro Server verteilt (jeweils auf die am frühesten freie Bahn);
+# passt die Folge nicht in das Zeitfenster, wird sie gestaucht.
+# durations: bisherige Dauer je Datenbank-ID in Sekunden
+def stagger_offsets(databases, durations, max_per_host, window):
+    lanes = {}
+    offsets = {}
+    for db in databases:
+        host = BackupOrchestrator.host_key(db)
+        host_lanes = lanes.setdefault(host, [0.0] * max(1, max_per_host))
+        lane = host_lanes.index(min(host_lanes))
+        offsets[db['id']] = host_lanes[lane]
+        host_lanes[lane] += durations.get(db['id']) or DEFAULT_BACKUP_DURATION
+    for host in lanes:
+        members = [db['id'] for db in databases if BackupOrchestrator.host_key(db) == host]
+        latest = max(offsets[db_id] for db_id in members)
+        if latest > window > 0:
+            for db_id in members:
+                offsets[db_id] = offsets[db_id] * window / latest
+    return offsets
+
+class BackupOrchestrator:
+    # max_jobs begrenzt die gleichzeitigen Backups insgesamt,
+    # max_per_host die gleichzeitigen Backups pro MySQL-Server
+    def __init__(self, max_jobs=DEFAULT_PARALLEL_JOBS, max_per_host=DEFAULT_PARALLEL_PER_HOST,
+                 backup_script=BACKUP_SCRIPT):
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_per_host = max(1, int(max_per_host))
+        self.backup_script = backup_script
+
+    # Erstelle einen Orchestrator mit den Werten aus der backup.conf (BackupSettings)
+    @classmethod
+    def from_config(cls, settings):
+        return cls(max_jobs=settings.parallel_jobs, max_per_host=settings.parallel_per_host)
+
+    # Schlüssel, unter dem Backups auf demselben Server gezählt werden
+    @staticmethod
+    def host_key(db):
+        return f"{db.get('host', 'localhost')}:{db.get('port', '3306')}"
+
+    # Führe das Backup einer einzelnen Datenbank aus
+    # on_output wird für jede Ausgabezeile des Backup-Skripts aufgerufen
+    def run_single(self, db, on_output=None):
+        started = time.monotonic()
+        # Die Bereinigung alter Backups erfolgt einmal nach allen Backups
+        env = dict(os.environ, BACKUP_SKIP_CLEANUP='true')
+
+        try:
+            process = subprocess.Popen([self.backup_script, db['id']], stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, text=True, env=env)
+            lines = []
+            for line in process.stdout:
+                lines.append(line)
+                if on_output:
+                    on_output(db, line)
+            process.wait()
+            success = process.returncode == 0
+            # Bei Fehlern sind die letzten Zeilen am aussagekräftigsten
+            message = ''.join(lines[-1:] if success else lines[-10:])
+        except Exception as e:
+            logger.exception(f"Fehler beim Ausführen des Backups für Datenbank {db['id']}")
+            success = False
+            message = str(e)
+
+        return {
+            'id': db['id'],
+            'name': db.get('name', f"Datenbank {db['id']}"),
+            'database': db.get('database', ''),
+            'host': self.host_key(db),
+            'success': success,
+            'duration': time.monotonic() - started,
+            'message': message.strip()
+        }
+
+    # Lösche alte Backups nach Abschluss aller Backups
+    def run_cleanup(self):
+        try:
+            result = subprocess.run([self.backup_script, '--cleanup'], capture_output=True, text=True)
+            if result.returncode != 0:
+                logger.error(f"Bereinigung alter Backups fehlgeschlagen: {result.stderr}")
+        except Exception:
+            logger.exception("Fehler bei der Bereinigung alter Backups")
+
+    # Führe die Backups aller übergebenen Datenbanken parallel aus
+    # on_result wird nach jedem abgeschlossenen Backup mit dessen Ergebnis aufgerufen
+    # start_offsets verzögert den Start einzelner Datenbanken (Sekunden ab Beginn, siehe stagger_offsets)
+    def run_all(self, databases, cleanup=True, on_output=None, on_result=None, start_offsets=None):
+        started_at = datetime.datetime.now()
+        started = time.monotonic()
+
+        pending = list(databases)
+        results = {}
+        running_per_host = {}
+        condition = threading.Condition()
+        start_at = {db['id']: started + (start_offsets or {}).get(db['id'], 0) for db in databases}
+
+        # Wähle die nächste fällige Datenbank, deren Server noch freie Plätze hat
+        def next_database():
+            now = time.monotonic()
+            for index, db in enumerate(pending):
+                if start_at[db['id']] <= now and running_per_host.get(self.host_key(db), 0) < self.max_per_host:
+                    return pending.pop(index)
+            return None
+
+        # Wartezeit bis zum nächsten verzögerten Start (None = auf ein beendetes Backup warten)
+        def next_wait():
+            waiting = [start_at[db['id']] for db in pending if start_at[db['id']] > time.monotonic()]
+            return max(0.0, min(waiting) - time.monotonic()) if waiting else None
+
+        def worker():
+            while True:
+                with condition:
+                    db = next_database()
+                    while db is None and pending:
+                        condition.wait(next_wait())
+                        db = next_database()
+                    if db is None:
+                        return
+                    host = self.host_key(db)
+                    running_per_host[host] = running_per_host.get(host, 0) + 1
+
+                logger.info(f"Starte Backup für Datenbank {db['id']} ({db.get('name', '')}) auf {host}...")
+                result = self.run_single(db, on_output)
+                if result['success']:
+                    logger.info(f"Backup für Datenbank {db['id']} erfolgreich ({result['duration']:.1f}s).")
+                else:
+                    logger.error(f"Backup für Datenbank {db['id']} fehlgeschlagen: {result['message']}")
+
+                with condition:
+                    results[db['id']] = result
+                    running_per_host[host] -= 1
+                    condition.notify_all()
+                if on_result:
+                    on_result(result)
+
+        workers = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(min(self.max_jobs, len(pending)))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        if cleanup:
+            self.run_cleanup()
+
+        # Ergebnisse in der Reihenfolge der Konfiguration
+        ordered = [results[db['id']] for db in databases if db['id'] in results]
+        duration = time.monotonic() - started
+        failed = [r for r in ordered if not r['success']]
+        logger.info(f"{len(ordered) - len(failed)} von {len(ordered)} Backups erfolgreich "
+                    f"in {duration:.1f}s (max. {self.max_jobs} parallel, {self.max_per_host} pro Server).")
+
+        return {
+            'results': ordered,
+            'success': not failed,
+            'failed': len(failed),
+            'duration': duration,
+            'started': started_at,
+            'max_jobs': self.max_jobs,
+            'max_per_host': self.max_per_host
+        }
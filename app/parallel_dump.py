@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Parallele Sicherung einzelner Tabellen einer Datenbank
+#
+# Mehrere Verbindungen starten unter FLUSH TABLES WITH READ LOCK je eine
+# Transaktion mit konsistentem Snapshot, danach werden die Tabellen - die
+# größten zuerst - gleichzeitig in eigene Dateien gesichert. Eine
+# manifest.json beschreibt das Backup für die Wiederherstellung.
+#
+# Aufbau eines Backup-Verzeichnisses:
+#   manifest.json           Beschreibung des Backups (wird zuletzt geschrieben)
+#   <tabelle>-schema.sql.gz CREATE TABLE der Tabelle
+#   <tabelle>.sql.gz        Daten der Tabelle als INSERT-Anweisungen
+#   <tabelle>.00001.sql.gz  Teilbereiche großer Tabellen (nach Primärschlüssel aufgeteilt)
+#   post.sql.gz             Views und Trigger (nach den Daten einzuspielen)
+#
+# Mit DB_[ID]_CHANGE_DETECTION werden unveränderte Tabellen aus dem letzten
+# tabellenweisen Backup übernommen statt erneut gesichert (siehe table_changes.py).
+#
+# Die Endung .sql.gz steht für das gewählte Kompressionsverfahren (.sql.zst, .sql.lz4).
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import threading
+import urllib.parse
+import pymysql
+import pymysql.cursors
+from dumper import (connect, start_snapshot, quote_identifier, list_tables, write_header, write_footer,
+                    dump_table_schema, dump_view_schema, dump_triggers, dump_table_data, load_database,
+                    log_stderr, DEFAULT_BATCH_ROWS)
+from backup_codecs import open_output, extension, normalize_codec, normalize_level
+from backup_config import load_settings
+from throttle import LoadMonitor
+import table_changes
+
+# Version des Manifest-Formats
+MANIFEST_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+
+# Standardanzahl paralleler Verbindungen
+DEFAULT_THREADS = 4
+
+# Tabellen mit mehr Zeilen werden in Teilbereiche des Primärschlüssels aufgeteilt
+DEFAULT_CHUNK_ROWS = 1000000
+
+# Angestrebte Dauer eines Teilbereichs in Sekunden
+CHUNK_TARGET_SECONDS = 30
+
+# Dateiname für eine Tabelle (Sonderzeichen werden kodiert)
+def table_filename(table, suffix):
+    return urllib.parse.quote(table, safe='') + suffix
+
+# Tabellen mit geschätzter Größe aus information_schema, die größten zuerst
+def list_table_sizes(connection, database):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'", (database,))
+        tables = [{'name': name, 'estimated_rows': int(rows or 0), 'estimated_bytes': int(size or 0)}
+                  for name, rows, size in cursor.fetchall()]
+    tables.sort(key=lambda table: table['estimated_bytes'], reverse=True)
+    return tables
+
+# Öffne mehrere Verbindungen, die denselben konsistenten Snapshot sehen
+# locked: wird unter der globalen Lesesperre mit der koordinierenden Verbindung aufgerufen
+def open_snapshot_connections(db, count, log=None, locked=None):
+    snapshot = {'consistent': False}
+    coordinator = connect(db)
+    try:
+        with coordinator.cursor() as cursor:
+            # Die globale Lesesperre verhindert Schreibzugriffe, bis alle Snapshots gestartet sind
+            try:
+                cursor.execute("FLUSH TABLES WITH READ LOCK")
+                snapshot['consistent'] = True
+            except Exception as e:
+                if log:
+                    log(f"WARNUNG: FLUSH TABLES WITH READ LOCK nicht möglich ({e}). "
+                        f"Die Tabellen werden ohne gemeinsamen Snapshot gesichert.")
+
+            if snapshot['consistent']:
+                try:
+                    cursor.execute("SHOW MASTER STATUS")
+                    row = cursor.fetchone()
+                    if row:
+                        snapshot['binlog_file'] = row[0]
+                        snapshot['binlog_position'] = int(row[1])
+                        if len(row) > 4 and row[4]:
+                            snapshot['gtid_executed'] = row[4].replace('\n', '')
+                except Exception:
+                    pass
+                if locked:
+                    locked(coordinator)
+
+            connections = []
+            try:
+                for _ in range(count):
+                    connection = connect(db)
+                    start_snapshot(connection)
+                    connections.append(connection)
+            except Exception:
+                for connection in connections:
+                    connection.close()
+                raise
+            finally:
+                if snapshot['consistent']:
+                    cursor.execute("UNLOCK TABLES")
+    finally:
+        coordinator.close()
+
+    return connections, snapshot
+
+# Ganzzahlige Spaltentypen, deren Wertebereich direkt aufgeteilt werden kann
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint')
+
+# Erste Spalte des Primärschlüssels mit Datentyp (None ohne Primärschlüssel)
+def primary_key_column(connection, database, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT k.COLUMN_NAME, c.DATA_TYPE FROM information_schema.KEY_COLUMN_USAGE k "
+            "JOIN information_schema.COLUMNS c ON c.TABLE_SCHEMA = k.TABLE_SCHEMA "
+            "AND c.TABLE_NAME = k.TABLE_NAME AND c.COLUMN_NAME = k.COLUMN_NAME "
+            "WHERE k.TABLE_SCHEMA = %s AND k.TABLE_NAME = %s AND k.CONSTRAINT_NAME = 'PRIMARY' "
+            "ORDER BY k.ORDINAL_POSITION LIMIT 1", (database, table))
+        row = cursor.fetchone()
+    return (row[0], row[1].lower()) if row else None
+
+# Teilt eine Tabelle in Bereiche des Primärschlüssels auf
+#
+# Bei ganzzahligen Schlüsseln wird der Bereich zwischen MIN und MAX aufgeteilt,
+# bei anderen sortierbaren Schlüsseln werden Grenzwerte aus einem Durchlauf über
+# den Primärschlüssel-Index ermittelt. Die Größe der nächsten Teilbereiche richtet
+# sich nach dem gemessenen Durchsatz, sodass jeder Teil etwa CHUNK_TARGET_SECONDS dauert.
+class TableChunker:
+    def __init__(self, table, chunk_rows):
+        self.table = table
+        self.chunk_rows = chunk_rows
+        self.min_rows = max(1, chunk_rows // 10)
+        self.max_rows = chunk_rows * 10
+        self.column = None
+        self.integer = False
+        self.lower = None
+        self.upper = None
+        self.boundaries = None
+        self.position = 0
+        self.density = 1.0
+        self.index = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    # Ermittle Schlüsselspalte und Grenzen; ohne geeigneten Schlüssel wird die Tabelle nicht aufgeteilt
+    def plan(self, connection, database):
+        key = primary_key_column(connection, database, self.table['name'])
+        if not key or self.table['estimated_rows'] <= self.chunk_rows:
+            return False
+        column_name, data_type = key
+        column = quote_identifier(column_name)
+        table = quote_identifier(self.table['name'])
+
+        if data_type in INTEGER_TYPES:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}")
+                self.lower, self.upper = cursor.fetchone()
+            if self.lower is None:
+                return False
+            self.integer = True
+            # Schlüsselwerte pro Zeile, um Zeilenzahlen in Schlüsselbereiche umzurechnen
+            self.density = max(1.0, (self.upper - self.lower + 1) / max(1, self.table['estimated_rows']))
+        else:
+            boundaries = self.read_boundaries(connection, column, table)
+            if not boundaries:
+                return False
+            self.boundaries = boundaries
+
+        self.column = column_name
+        return True
+
+    # Grenzwerte in Abständen von min_rows aus dem Primärschlüssel-Index lesen
+    def read_boundaries(self, connection, column, table):
+        boundaries = []
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        try:
+            try:
+                # Mit Fensterfunktionen (MySQL 8, MariaDB 10.2) ermittelt der Server die Grenzen selbst
+                cursor.execute(
+                    f"SELECT k FROM (SELECT {column} AS k, ROW_NUMBER() OVER (ORDER BY {column}) AS n "
+                    f"FROM {table}) AS numbered WHERE n %% %s = 1 AND n > 1 ORDER BY n", (self.min_rows,))
+                values = (row[0] for row in iter(cursor.fetchone, None))
+            except pymysql.err.ProgrammingError:
+                cursor.close()
+                cursor = connection.cursor(pymysql.cursors.SSCursor)
+                cursor.execute(f"SELECT {column} FROM {table} ORDER BY {column}")
+                values = (row[0] for position, row in enumerate(iter(cursor.fetchone, None))
+                          if position and position % self.min_rows == 0)
+            for value in values:
+                if not boundaries or boundaries[-1] != value:
+                    boundaries.append(value)
+        finally:
+            cursor.close()
+        return boundaries
+
+    @property
+    def chunked(self):
+        return self.column is not None
+
+    # Nächster Teilbereich als (Index, WHERE-Bedingung, Parameter) oder None
+    def next_chunk(self):
+        with self.lock:
+            if self.exhausted:
+                return None
+            self.index += 1
+            column = quote_identifier(self.column) if self.column else None
+
+            if not self.chunked:
+                self.exhausted = True
+                return self.index, None, None
+
+            if self.integer:
+                span = max(1, int(self.chunk_rows * self.density))
+                start = self.lower
+                end = start + span - 1
+                if end >= self.upper:
+                    self.exhausted = True
+                    return self.index, f"{column} >= %s", (start,)
+                self.lower = end + 1
+                if self.index == 1:
+                    # Der erste Bereich schließt auch Werte unterhalb von MIN ein
+                    return self.index, f"{column} <= %s", (end,)
+                return self.index, f"{column} BETWEEN %s AND %s", (start, end)
+
+            # Mehrere Abschnitte zu einem Teilbereich zusammenfassen; Abschnitt i reicht
+            # von boundaries[i - 1] bis ausschließlich boundaries[i]
+            segments = max(1, round(self.chunk_rows / self.min_rows))
+            first = self.position
+            last = first + segments - 1
+            self.position = last + 1
+            conditions = []
+            params = []
+            if first > 0:
+                conditions.append(f"{column} >= %s")
+                params.append(self.boundaries[first - 1])
+            if last < len(self.boundaries):
+                conditions.append(f"{column} < %s")
+                params.append(self.boundaries[last])
+            else:
+                self.exhausted = True
+            return self.index, ' AND '.join(conditions), tuple(params)
+
+    # Passe die Größe der nächsten Teilbereiche an den gemessenen Durchsatz an
+    def observe(self, rows, duration, params):
+        with self.lock:
+            if not self.chunked or duration <= 0:
+                return
+            if self.integer and rows and params and len(params) == 2:
+                observed_density = (params[1] - params[0] + 1) / rows
+                self.density = max(1.0, 0.5 * self.density + 0.5 * observed_density)
+            rows_per_second = rows / duration
+            target = int(rows_per_second * CHUNK_TARGET_SECONDS)
+            self.chunk_rows = min(self.max_rows, max(self.min_rows, target or self.min_rows))
+
+# Sichere einen Teilbereich (oder die ganze Tabelle) in eine eigene Datei
+def dump_chunk(connection, database, table, chunk, chunked, output_dir, batch_rows, codec, level):
+    index, where, params = chunk
+    started = time.monotonic()
+    suffix = f'.{index:05d}{extension(codec)}' if chunked else extension(codec)
+    data_file = table_filename(table['name'], suffix)
+
+    with open_output(os.path.join(output_dir, data_file), codec, level) as out:
+        write_header(out, database)
+        rows, data_bytes = dump_table_data(connection, table['name'], out, batch_rows, where=where, params=params)
+        write_footer(out)
+
+    return {
+        'index': index,
+        'file': data_file,
+        'where': where,
+        'params': list(params or ()),
+        'rows': rows,
+        'bytes': data_bytes,
+        'duration': time.monotonic() - started
+    }
+
+# Sichere die Struktur einer Tabelle in eine eigene Datei
+def dump_schema(connection, database, table, output_dir, codec, level):
+    schema_file = table_filename(table['name'], '-schema' + extension(codec))
+    with open_output(os.path.join(output_dir, schema_file), codec, level) as out:
+        write_header(out, database)
+        dump_table_schema(connection, table['name'], out)
+        write_footer(out)
+    return schema_file
+
+# Sichere Views und Trigger nach den Tabellendaten
+def dump_post_data(connection, database, output_dir, codec, level):
+    post_file = 'post' + extension(codec)
+    with open_output(os.path.join(output_dir, post_file), codec, level) as out:
+        write_header(out, database)
+        tables = list_tables(connection)
+        for name, table_type in tables:
+            if table_type != 'VIEW':
+                dump_triggers(connection, name, out)
+        for name, table_type in tables:
+            if table_type == 'VIEW':
+                dump_view_schema(connection, name, out)
+        write_footer(out)
+    return post_file
+
+# Sichere alle Tabellen einer Datenbank parallel in ein Verzeichnis
+# monitor: lastabhängige Drosselung zwischen den Teilbereichen (siehe throttle.py)
+# change_detection: unveränderte Tabellen aus dem letzten Backup übernehmen (siehe table_changes.py)
+def dump_parallel(db, output_dir, threads=DEFAULT_THREADS, batch_rows=DEFAULT_BATCH_ROWS,
+                  chunk_rows=DEFAULT_CHUNK_ROWS, codec=None, level=None, log=None, monitor=None,
+                  change_detection=None):
+    started = time.monotonic()
+    # Jede Datei bekommt einen eigenen Kompressionsprozess, parallelisiert wird über die Tabellen
+    codec = normalize_codec(codec)
+    level = normalize_level(codec, level)
+    created = datetime.datetime.now()
+    database = db.database
+    os.makedirs(output_dir, exist_ok=True)
+    change_detection = table_changes.normalize_mode(change_detection)
+
+    # Stand der Tabellen unter der Lesesperre lesen, damit er zum Snapshot passt
+    states = {}
+    locked = None
+    if change_detection != 'off':
+        def locked(connection):
+            states.update(table_changes.read_table_states(connection, database))
+
+    connections, snapshot = open_snapshot_connections(db, max(1, threads), log, locked)
+    try:
+        tables = list_table_sizes(connections[0], database)
+        if log:
+            log(f"{len(tables)} Tabellen, {len(connections)} Verbindungen, "
+                f"Snapshot {'konsistent' if snapshot['consistent'] else 'NICHT konsistent'}")
+
+        previous, reused = detect_unchanged(db, output_dir, codec, change_detection, states, tables,
+                                            connections, snapshot, log)
+
+        # Strukturen vorab sichern und große Tabellen in Teilbereiche aufteilen
+        chunkers = []
+        schemas = {}
+        for table in tables:
+            schemas[table['name']] = dump_schema(connections[0], database, table, output_dir, codec, level)
+            if table['name'] in reused:
+                continue
+            chunker = TableChunker(table, chunk_rows)
+            if chunk_rows > 0 and chunker.plan(connections[0], database):
+                if log:
+                    log(f"Tabelle {table['name']} wird nach {chunker.column} in Teilbereiche aufgeteilt")
+            chunkers.append(chunker)
+
+        results = {table['name']: [] for table in tables}
+        errors = []
+
+        # Größte Tabellen zuerst, damit sie nicht am Ende allein laufen;
+        # aufgeteilte Tabellen werden von allen freien Verbindungen gemeinsam bearbeitet
+        def next_work():
+            for chunker in chunkers:
+                chunk = chunker.next_chunk()
+                if chunk:
+                    return chunker, chunk
+            return None, None
+
+        def worker(connection):
+            while not errors:
+                chunker, chunk = next_work()
+                if not chunker:
+                    return
+                table = chunker.table
+                try:
+                    result = dump_chunk(connection, database, table, chunk, chunker.chunked, output_dir,
+                                        batch_rows, codec, level)
+                    chunker.observe(result['rows'], result['duration'], chunk[2])
+                    results[table['name']].append(result)
+                    if log:
+                        part = f" Teil {result['index']}" if chunker.chunked else ''
+                        log(f"Tabelle {table['name']}{part}: {result['rows']} Zeilen in {result['duration']:.1f}s")
+                except Exception as e:
+                    errors.append(f"Tabelle {table['name']}: {e}")
+                    continue
+                if monitor:
+                    monitor.throttle(result['bytes'], keep_alive=False)
+
+        workers = [threading.Thread(target=worker, args=(connection,), daemon=True) for connection in connections]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        if errors:
+            raise RuntimeError('; '.join(errors))
+
+        post_file = dump_post_data(connections[0], database, output_dir, codec, level)
+        for connection in connections:
+            connection.commit()
+    finally:
+        for connection in connections:
+            connection.close()
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'type': 'tables',
+        'db_id': db.id,
+        'database': database,
+        'created': created.isoformat(),
+        'duration': time.monotonic() - started,
+        'threads': len(connections),
+        'codec': codec,
+        'codec_level': level,
+        'snapshot': snapshot,
+        'chunk_rows': chunk_rows,
+        # Reihenfolge wie in der Datenbank, unabhängig von der Sicherungsreihenfolge
+        'tables': [table_manifest(table, schemas[table['name']], results[table['name']], states.get(table['name']),
+                                  reused.get(table['name']))
+                   for table in sorted(tables, key=lambda table: table['name'])],
+        'post': post_file,
+        'change_detection': change_detection,
+        'previous': os.path.basename(previous) if previous else None
+    }
+    manifest['rows'] = sum(table['rows'] for table in manifest['tables'])
+    manifest['bytes'] = sum(table['bytes'] for table in manifest['tables'])
+    manifest['reused_tables'] = len(reused)
+    manifest['reused_bytes'] = sum(table['bytes'] for table in manifest['tables'] if table.get('reused_from'))
+
+    # Das Manifest zuletzt schreiben: Nur Verzeichnisse mit Manifest gelten als vollständig
+    write_manifest(output_dir, manifest)
+    return manifest
+
+# Ermittle unveränderte Tabellen und übernimm ihre Dateien aus dem letzten Backup
+# Liefert das Verzeichnis des letzten Backups und {Tabelle: Manifest-Eintrag im letzten Backup}.
+# states wird um die Prüfsumme der Struktur (und im Modus checksum um CHECKSUM TABLE) ergänzt.
+def detect_unchanged(db, output_dir, codec, change_detection, states, tables, connections, snapshot, log=None):
+    if change_detection == 'off':
+        return None, {}
+    if not snapshot['consistent']:
+        if log:
+            log("WARNUNG: Ohne gemeinsamen Snapshot werden alle Tabellen gesichert")
+        states.clear()
+        return None, {}
+    names = {table['name'] for table in tables}
+    for name in list(states):
+        if name in names:
+            states[name]['schema'] = table_changes.schema_digest(connections[0], name)
+        else:
+            del states[name]
+
+    found = table_changes.find_previous_backup(output_dir, db.id, db.database)
+    if not found:
+        if log:
+            log("Kein vorheriges tabellenweises Backup, alle Tabellen werden gesichert")
+        return None, {}
+    previous_dir, previous_manifest = found
+    if previous_manifest.get('codec') != codec:
+        if log:
+            log(f"Kompression geändert ({previous_manifest.get('codec')} -> {codec}), alle Tabellen werden gesichert")
+        return previous_dir, {}
+
+    previous_tables = {table['name']: table for table in previous_manifest.get('tables', [])
+                       if table_changes.files_present(previous_dir, table['files'])}
+    unchanged = table_changes.unchanged_tables(change_detection, states, previous_tables, connections)
+    reused = {}
+    for name in sorted(unchanged):
+        table_changes.reuse_table_files(previous_dir, output_dir, previous_tables[name]['files'])
+        # Herkunft der Dateien: das Backup, in dem die Tabelle zuletzt gesichert wurde
+        reused[name] = dict(previous_tables[name],
+                            reused_from=previous_tables[name].get('reused_from') or os.path.basename(previous_dir))
+    if log:
+        reused_bytes = sum(table['bytes'] for table in reused.values())
+        log(f"{len(reused)} von {len(tables)} Tabellen unverändert, übernommen aus "
+            f"{os.path.basename(previous_dir)} ({reused_bytes / 1024 / 1024:.1f} MB)")
+    return previous_dir, reused
+
+# Manifest-Eintrag einer Tabelle aus den gesicherten Teilbereichen
+# state: Stand für die Erkennung unveränderter Tabellen; previous: übernommener Eintrag des letzten Backups
+def table_manifest(table, schema_file, chunks, state=None, previous=None):
+    if previous:
+        entry = {key: previous[key] for key in ('files', 'chunks', 'rows', 'bytes')}
+        entry.update(name=table['name'], schema=schema_file, estimated_bytes=table['estimated_bytes'], duration=0,
+                     reused_from=previous['reused_from'])
+        if state:
+            entry['state'] = state
+        return entry
+    chunks = sorted(chunks, key=lambda chunk: chunk['index'])
+    entry = {
+        'name': table['name'],
+        'schema': schema_file,
+        'files': [chunk['file'] for chunk in chunks],
+        'chunks': [{key: chunk[key] for key in ('file', 'where', 'params', 'rows', 'bytes', 'duration')} for chunk in chunks],
+        'rows': sum(chunk['rows'] for chunk in chunks),
+        'bytes': sum(chunk['bytes'] for chunk in chunks),
+        'estimated_bytes': table['estimated_bytes'],
+        'duration': sum(chunk['duration'] for chunk in chunks)
+    }
+    if state:
+        entry['state'] = state
+    return entry
+
+# Schreibe das Manifest atomar
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        # Schlüsselwerte wie Datum oder Decimal als Text ablegen
+        json.dump(manifest, f, indent=4, default=str)
+    os.replace(path + '.tmp', path)
+
+# Lese das Manifest eines Backup-Verzeichnisses
+def load_manifest(backup_dir):
+    with open(os.path.join(backup_dir, MANIFEST_FILE), 'r') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallele Sicherung der Tabellen einer Datenbank')
+    parser.add_argument('db_id', help='ID der Datenbank aus der backup.conf')
+    parser.add_argument('--output-dir', required=True, help='Zielverzeichnis des Backups')
+    parser.add_argument('--threads', type=int, help='Anzahl paralleler Verbindungen')
+    parser.add_argument('--batch-rows', type=int, help='Zeilen pro INSERT-Anweisung')
+    parser.add_argument('--chunk-rows', type=int, help='Zeilen pro Teilbereich großer Tabellen (0 = aus)')
+    parser.add_argument('--codec', help='Kompressionsverfahren (gzip, zstd, lz4)')
+    parser.add_argument('--codec-level', type=int, help='Kompressionsstufe')
+    parser.add_argument('--change-detection', choices=table_changes.CHANGE_DETECTION_MODES,
+                        help='Unveränderte Tabellen aus dem letzten Backup übernehmen')
+    args = parser.parse_args()
+
+    db = load_database(args.db_id)
+    if not db or not db.database:
+        log_stderr(f"FEHLER: Datenbank mit ID {args.db_id} nicht gefunden!")
+        return 1
+
+    threads = args.threads or db.threads
+    batch_rows = args.batch_rows or db.batch_rows
+    chunk_rows = args.chunk_rows if args.chunk_rows is not None else db.chunk_rows
+
+    monitor = LoadMonitor.from_config(load_settings(), db, log=log_stderr)
+    if monitor:
+        monitor.start()
+    try:
+        manifest = dump_parallel(db, args.output_dir, threads, batch_rows, chunk_rows,
+                                 codec=args.codec or db.codec,
+                                 level=args.codec_level or db.codec_level, log=log_stderr, monitor=monitor,
+                                 change_detection=args.change_detection or db.change_detection)
+    except Exception as e:
+        log_stderr(f"FEHLER: Paralleler Dump von {db.database} fehlgeschlagen: {e}")
+        return 1
+    finally:
+        if monitor:
+            monitor.stop()
+            log_stderr(monitor.summary())
+
+    log_stderr(f"Paralleler Dump von {db.database}: {len(manifest['tables'])} Tabellen, "
+               f"{manifest['rows']} Zeilen in {manifest['duration']:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
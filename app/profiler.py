@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Profil der Backup-Pipeline (Dump -> Kompression -> Schreiben -> Übertragung)
+#
+# backup.sh setzt Messpunkte zwischen die Stufen der Pipeline, die den Strom
+# unverändert durchreichen. Jeder Messpunkt zählt die Bytes und misst, wie lange
+# er auf Daten der vorherigen Stufe gewartet hat (Lesen) und wie lange die
+# nächste Stufe keine Daten abgenommen hat (Schreiben):
+#
+#   mysqldump | profiler.py probe raw.json --rows | zstd | profiler.py probe compressed.json --sha256 > datei
+#
+# Wartet der erste Messpunkt beim Lesen, liefert MySQL zu langsam; wartet er beim
+# Schreiben, ohne dass der zweite Messpunkt beim Schreiben wartet, ist die
+# Kompression der Engpass; wartet der zweite beim Schreiben, kommen Platte,
+# Share oder Speicherziel nicht hinterher. Das Profil eines Laufs wird im
+# Backup-Katalog gespeichert und auf der Backup-Seite angezeigt.
+#
+# Die Messpunkte drosseln den Strom auch (siehe throttle.py): der erste abhängig
+# von der Last des MySQL-Servers (--throttle-db), der zweite auf eine feste
+# Schreibrate (--limit). Die Wartezeit der Drosselung erscheint im Profil als
+# eigene Stufe.
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+# Größte Blockgröße eines Messpunkts
+PROBE_BLOCK_SIZE = 1024 * 1024
+
+# Zeilen einer INSERT-Anweisung: jede Anweisung beginnt eine Zeile, weitere sind durch "),(" getrennt
+ROW_MARKERS = (b'),(', b'INSERT INTO ')
+ROW_MARKER_OVERLAP = max(len(marker) for marker in ROW_MARKERS) - 1
+
+# Reiche stdin an stdout durch und schreibe Bytes, Zeilen, Wartezeiten und ggf. die
+# SHA-256-Prüfsumme des Stroms als JSON nach stats_path
+# limiter/monitor: Bandbreitengrenze bzw. lastabhängige Drosselung (siehe throttle.py)
+def probe_stream(stats_path, count_rows=False, checksum=False, source=None, target=None, limiter=None,
+                 monitor=None):
+    source = source or sys.stdin.buffer
+    target = target or sys.stdout.buffer
+    read = getattr(source, 'read1', source.read)
+    total = 0
+    rows = 0
+    read_wait = 0.0
+    write_wait = 0.0
+    throttle_wait = 0.0
+    tail = b''
+    digest = hashlib.sha256() if checksum else None
+    started = time.monotonic()
+    while True:
+        before = time.monotonic()
+        block = read(PROBE_BLOCK_SIZE)
+        read_wait += time.monotonic() - before
+        if not block:
+            break
+        if monitor:
+            throttle_wait += monitor.throttle(len(block))
+        if limiter:
+            throttle_wait += limiter.consume(len(block))
+        before = time.monotonic()
+        target.write(block)
+        write_wait += time.monotonic() - before
+        total += len(block)
+        if digest:
+            digest.update(block)
+        if count_rows:
+            # Die letzten Bytes des vorigen Blocks mitprüfen, damit getrennte Trennzeichen zählen
+            window = tail + block
+            rows += sum(window.count(marker) - tail.count(marker) for marker in ROW_MARKERS)
+            tail = window[-ROW_MARKER_OVERLAP:]
+    before = time.monotonic()
+    target.flush()
+    write_wait += time.monotonic() - before
+    stats = {
+        'bytes': total,
+        'read_wait': round(read_wait, 3),
+        'write_wait': round(write_wait, 3),
+        'elapsed': round(time.monotonic() - started, 3)
+    }
+    if count_rows:
+        stats['rows'] = rows
+    if digest:
+        stats['sha256'] = digest.hexdigest()
+    if limiter or monitor:
+        stats['throttle_wait'] = round(throttle_wait, 3)
+    with open(stats_path, 'w') as f:
+        json.dump(stats, f)
+    return stats
+
+def load_probe(path):
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def stage(name, label, seconds, data_bytes=None):
+    return {'name': name, 'label': label, 'seconds': round(max(0.0, seconds), 3), 'bytes': data_bytes}
+
+# Zeitanteile der Stufen eines Laufs
+# raw: Messpunkt nach dem Dump, compressed: Messpunkt nach der Kompression (jeweils None, wenn nicht gemessen)
+# manifest_bytes: Datenmenge einer tabellenweisen Sicherung, die ohne Messpunkte läuft
+def build_profile(duration, raw=None, compressed=None, upload_duration=None, upload_bytes=None, sink=None,
+                  manifest_bytes=None):
+    stages = []
+    if raw:
+        stages.append(stage('dump', 'Dump (MySQL)', raw['read_wait'], raw['bytes']))
+        if raw.get('throttle_wait'):
+            stages.append(stage('throttle', 'Drosselung (Last des MySQL-Servers)', raw['throttle_wait']))
+        if compressed:
+            # Staut sich die Ausgabe, wartet auch der erste Messpunkt; das zählt zur Schreib-Stufe
+            limited = compressed.get('throttle_wait', 0)
+            stages.append(stage('compress', 'Kompression', raw['write_wait'] - compressed['write_wait'] - limited,
+                                compressed['bytes']))
+            if limited:
+                stages.append(stage('limit', 'Bandbreitengrenze (Schreiben)', limited))
+            stages.append(stage('write', sink or 'Schreiben', compressed['write_wait'], compressed['bytes']))
+        else:
+            stages.append(stage('write', sink or 'Schreiben', raw['write_wait'], raw['bytes']))
+    elif duration is not None:
+        stages.append(stage('dump', 'Dump (ohne Messpunkte)', duration, manifest_bytes))
+    if upload_duration is not None:
+        stages.append(stage('upload', 'Übertragung nach dem Backup', upload_duration, upload_bytes))
+    pipeline = raw['elapsed'] if raw else duration
+    bottleneck = max(stages, key=lambda entry: entry['seconds'])['name'] if stages else None
+    return {
+        'duration': duration,
+        'pipeline_seconds': pipeline,
+        'throughput': raw['bytes'] / raw['elapsed'] if raw and raw['elapsed'] else None,
+        'stages': stages,
+        'bottleneck': bottleneck,
+        'probes': {'raw': raw, 'compressed': compressed}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Profil der Backup-Pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    probe_parser = subparsers.add_parser('probe', help='stdin durchreichen und Bytes/Wartezeiten messen')
+    probe_parser.add_argument('stats', help='Datei für das Ergebnis (JSON)')
+    probe_parser.add_argument('--rows', action='store_true', help='Zeilen der INSERT-Anweisungen zählen')
+    probe_parser.add_argument('--sha256', action='store_true', help='SHA-256-Prüfsumme des Stroms berechnen')
+    probe_parser.add_argument('--limit', help='Höchstens so viele MB/s weiterreichen')
+    probe_parser.add_argument('--throttle-db', help='Abhängig von der Last dieser Datenbank drosseln')
+    show_parser = subparsers.add_parser('show', help='Gespeichertes Profil eines Backups ausgeben')
+    show_parser.add_argument('backup')
+    args = parser.parse_args()
+
+    if args.command == 'probe':
+        limiter = monitor = None
+        if args.limit or args.throttle_db:
+            from throttle import RateLimiter, LoadMonitor, megabytes_per_second
+            from backup_config import load_settings
+            from dumper import load_database, log_stderr
+            if megabytes_per_second(args.limit):
+                limiter = RateLimiter(megabytes_per_second(args.limit))
+            db = load_database(args.throttle_db) if args.throttle_db else None
+            if db:
+                monitor = LoadMonitor.from_config(load_settings(), db, log=log_stderr)
+        if monitor:
+            monitor.start()
+        try:
+            probe_stream(args.stats, args.rows, args.sha256, limiter=limiter, monitor=monitor)
+        finally:
+            if monitor:
+                monitor.stop()
+                log_stderr(monitor.summary())
+        return 0
+
+    from catalog import BackupCatalog
+    profile = BackupCatalog().get_profile(args.backup)
+    if not profile:
+        print(f"Kein Profil für {args.backup} vorhanden.", file=sys.stderr)
+        return 1
+    for entry in profile['stages']:
+        data = f"{entry['bytes'] / 1024 / 1024:.1f} MB" if entry['bytes'] is not None else '-'
+        marker = ' <- Engpass' if entry['name'] == profile['bottleneck'] else ''
+        print(f"{entry['label']:<40} {entry['seconds']:>9.1f}s {data:>12}{marker}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Wiederherstellung von Backups
+#
+# Der Dump wird ohne Zwischendatei entpackt und direkt an den mysql-Client der
+# Zielinstanz gestreamt. Unterstützt werden:
+#   - Backup-Dateien (.sql.gz, .sql.zst, .sql.lz4), auch solche nur im Speicherziel
+#   - Snapshots im Repository (Prüfsumme wird beim Lesen kontrolliert)
+#   - Tabellenweise Backups (Verzeichnis mit manifest.json): Tabellen und Teilbereiche
+#     werden über mehrere Verbindungen parallel geladen, Sekundärindizes erst nach den
+#     Daten angelegt, danach folgen Views und Trigger
+#   - Inkrementelle Backups: Basissicherung der Kette und alle Binlog-Backups bis zum
+#     gewählten Backup
+#
+# Jede Verbindung lädt mit foreign_key_checks=0 und unique_checks=0, auf Wunsch ohne
+# Binärlog (sql_log_bin=0, benötigt SUPER bzw. SYSTEM_VARIABLES_ADMIN).
+#
+# Aufruf:
+#   restore.py <backup> --db-id 1 [--database ziel] [--threads 4] [--skip-binlog] [--keep-indexes]
+
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dumper import connect, load_database, quote_identifier, log_stderr
+from backup_config import load_backup_config
+from backup_codecs import codec_for_file, decompress_command, open_input, PIPE_BUFFER_SIZE
+from binlog import load_meta
+from parallel_dump import load_manifest, DEFAULT_THREADS
+from chunkstore import ChunkStore, repository_dir
+from storage import storage_from_config
+
+# Blockgröße beim Lesen der Backups
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Abstand der Fortschrittsmeldungen in Sekunden
+PROGRESS_INTERVAL = 10
+
+# Sekundärindizes, die nach dem Laden der Daten angelegt werden können
+SECONDARY_INDEX = re.compile(r'^\s*(?:(?:FULLTEXT|SPATIAL)\s+)?(?:KEY|INDEX)\s')
+AUTO_INCREMENT_COLUMN = re.compile(r'^\s*`((?:[^`]|``)+)`.*\bAUTO_INCREMENT\b')
+FIRST_INDEX_COLUMN = re.compile(r'\(\s*`((?:[^`]|``)+)`')
+
+def mysql_binary():
+    for command in ('mysql', 'mariadb'):
+        if shutil.which(command):
+            return command
+    raise RuntimeError("Der mysql-Client ist nicht installiert")
+
+# Sitzungseinstellungen für schnelles Laden
+def session_settings(skip_binlog=False):
+    settings = ['foreign_key_checks = 0', 'unique_checks = 0']
+    if skip_binlog:
+        settings.append('sql_log_bin = 0')
+    return f"SET SESSION {', '.join(settings)};\n".encode()
+
+# Verteile den Fortschritt über alle Verbindungen und melde ihn regelmäßig mit Durchsatz
+class RestoreProgress:
+    def __init__(self, total, log=None, callback=None, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.done = 0
+        self.log = log
+        self.callback = callback
+        self.interval = interval
+        self.started = time.monotonic()
+        self.reported = self.started
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+            now = time.monotonic()
+            report = now - self.reported >= self.interval
+            if report:
+                self.reported = now
+        if self.callback:
+            self.callback(self.done, self.total)
+        if report and self.log:
+            self.log(self.describe())
+
+    @property
+    def duration(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        return self.done / max(self.duration, 0.001)
+
+    def describe(self):
+        percent = f" ({self.done / self.total * 100:.0f}%)" if self.total else ''
+        return (f"{self.done / 1024 / 1024:.1f} von {self.total / 1024 / 1024:.1f} MB{percent}, "
+                f"{self.throughput / 1024 / 1024:.1f} MB/s")
+
+    def result(self):
+        return {'bytes': self.done, 'duration': self.duration, 'throughput': self.throughput}
+
+# Blöcke eines Datenstroms
+def read_blocks(stream):
+    return iter(lambda: stream.read(READ_BLOCK_SIZE), b'')
+
+# Streame SQL (optional komprimiert) in den mysql-Client
+# Der Entpack-Prozess schreibt direkt in den mysql-Client, Python liest nur die
+# komprimierten Blöcke und zählt den Fortschritt.
+def run_sql_stream(db, database, blocks, codec=None, skip_binlog=False, progress=None, label=''):
+    env = dict(os.environ, MYSQL_PWD=db.password)
+    command = [mysql_binary(), '-h', db.host, '-P', str(db.port),
+               '-u', db.user, '--default-character-set=utf8mb4',
+               '--max-allowed-packet=1G', database]
+    with tempfile.TemporaryFile() as errors:
+        mysql = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=errors, env=env, bufsize=PIPE_BUFFER_SIZE)
+        decompress = None
+        try:
+            mysql.stdin.write(session_settings(skip_binlog))
+            mysql.stdin.flush()
+            target = mysql.stdin
+            if codec:
+                decompress = subprocess.Popen(decompress_command(codec), stdin=subprocess.PIPE, stdout=mysql.stdin,
+                                              bufsize=PIPE_BUFFER_SIZE)
+                # Die Pipe zum mysql-Client gehört jetzt dem Entpack-Prozess
+                mysql.stdin.close()
+                target = decompress.stdin
+            try:
+                for block in blocks:
+                    target.write(block)
+                    if progress:
+                        progress.add(len(block))
+            except BrokenPipeError:
+                # mysql bzw. der Entpack-Prozess hat abgebrochen, der Fehler folgt aus dem Exit-Code
+                pass
+            finally:
+                with contextlib.suppress(BrokenPipeError):
+                    target.close()
+            decompress_returncode = decompress.wait() if decompress else 0
+            returncode = mysql.wait()
+        except BaseException:
+            for process in (decompress, mysql):
+                if process and process.poll() is None:
+                    process.kill()
+                    process.wait()
+            raise
+        if returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode('utf-8', 'replace').strip().splitlines()
+            raise RuntimeError(f"Einspielen von {label} fehlgeschlagen: {message[-1] if message else returncode}")
+        if decompress_returncode != 0:
+            raise RuntimeError(f"Entpacken von {label} fehlgeschlagen ({decompress.args[0]}: {decompress_returncode})")
+
+# Lege die Zieldatenbank an, falls sie fehlt
+def create_database(db, database):
+    connection = connect(db.replace(database=''))
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {quote_identifier(database)}")
+    finally:
+        connection.close()
+
+# Entferne Sekundärindizes aus CREATE TABLE, damit sie nach dem Laden in einem Durchgang
+# aufgebaut werden. Tabellen mit Fremdschlüsseln bleiben unverändert (InnoDB legt sonst
+# eigene Indizes für die Fremdschlüssel an), ebenso Indizes auf der AUTO_INCREMENT-Spalte.
+def split_secondary_indexes(schema_sql):
+    if 'FOREIGN KEY' in schema_sql:
+        return schema_sql, []
+    lines = schema_sql.split('\n')
+    auto_increment = None
+    for line in lines:
+        match = AUTO_INCREMENT_COLUMN.match(line)
+        if match:
+            auto_increment = match.group(1)
+    kept = []
+    indexes = []
+    for line in lines:
+        if SECONDARY_INDEX.match(line):
+            column = FIRST_INDEX_COLUMN.search(line)
+            if not column or column.group(1) != auto_increment:
+                indexes.append(line.strip().rstrip(','))
+                # War es die letzte Definition, darf die vorherige kein Komma mehr haben
+                if not line.rstrip().endswith(',') and kept:
+                    kept[-1] = kept[-1].rstrip().rstrip(',')
+                continue
+        kept.append(line)
+    return '\n'.join(kept), indexes
+
+# Lege die zurückgestellten Sekundärindizes einer Tabelle an: normale Indizes gemeinsam mit
+# einer ALTER-Anweisung, FULLTEXT- und SPATIAL-Indizes einzeln (InnoDB legt nur einen pro
+# Anweisung an)
+def build_indexes(db, database, table, indexes, skip_binlog=False):
+    plain = [index for index in indexes if index.startswith(('KEY', 'INDEX'))]
+    statements = ([plain] if plain else []) + [[index] for index in indexes if index not in plain]
+    connection = connect(db.replace(database=database))
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(session_settings(skip_binlog).decode())
+            for statement in statements:
+                cursor.execute(f"ALTER TABLE {quote_identifier(table)} " +
+                               ', '.join(f"ADD {index}" for index in statement))
+    finally:
+        connection.close()
+
+# Stelle ein tabellenweises Backup parallel wieder her
+def restore_directory(db, database, path, threads=DEFAULT_THREADS, skip_binlog=False, defer_indexes=True,
+                      log=None, callback=None):
+    manifest = load_manifest(path)
+    codec = manifest.get('codec')
+    tables = manifest['tables']
+    files = [table['schema'] for table in tables] + [file for table in tables for file in table['files']]
+    if manifest.get('post'):
+        files.append(manifest['post'])
+    progress = RestoreProgress(sum(os.path.getsize(os.path.join(path, file)) for file in files), log, callback)
+
+    # Strukturen nacheinander in einer Sitzung anlegen, Sekundärindizes zurückstellen
+    deferred = {}
+    schemas = []
+    for table in tables:
+        schema_path = os.path.join(path, table['schema'])
+        with open_input(schema_path, codec) as f:
+            schema_sql = f.read().decode('utf-8')
+        if defer_indexes:
+            schema_sql, indexes = split_secondary_indexes(schema_sql)
+            if indexes:
+                deferred[table['name']] = indexes
+        schemas.append(schema_sql.encode('utf-8'))
+        progress.add(os.path.getsize(schema_path))
+    run_sql_stream(db, database, schemas, skip_binlog=skip_binlog, label='Tabellenstrukturen')
+    if log:
+        log(f"{len(tables)} Tabellen angelegt, {sum(len(indexes) for indexes in deferred.values())} "
+            f"Sekundärindizes zurückgestellt")
+
+    # Daten aller Tabellen parallel laden, die größten Dateien zuerst
+    work = [(table['name'], chunk['file'], chunk.get('bytes', 0)) for table in tables
+            for chunk in table.get('chunks') or [{'file': file} for file in table['files']]]
+    work.sort(key=lambda item: item[2], reverse=True)
+
+    def load_file(table, file):
+        with open(os.path.join(path, file), 'rb') as f:
+            run_sql_stream(db, database, read_blocks(f), codec, skip_binlog, progress, label=f"{table} ({file})")
+
+    def index_table(table):
+        started = time.monotonic()
+        build_indexes(db, database, table, deferred[table], skip_binlog)
+        if log:
+            log(f"Indizes von {table} angelegt ({len(deferred[table])}) in {time.monotonic() - started:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for future in [executor.submit(load_file, table, file) for table, file, _ in work]:
+            future.result()
+        if log:
+            log(f"Daten geladen: {progress.describe()}")
+        for future in [executor.submit(index_table, table) for table in deferred]:
+            future.result()
+
+    # Views und Trigger zuletzt
+    if manifest.get('post'):
+        with open(os.path.join(path, manifest['post']), 'rb') as f:
+            run_sql_stream(db, database, read_blocks(f), codec, skip_binlog, progress, label=manifest['post'])
+    return progress
+
+# Stelle eine einzelne Backup-Datei wieder her
+def restore_file(db, database, path, skip_binlog=False, log=None, callback=None):
+    progress = RestoreProgress(os.path.getsize(path), log, callback)
+    with open(path, 'rb') as f:
+        run_sql_stream(db, database, read_blocks(f), codec_for_file(path), skip_binlog, progress,
+                       label=os.path.basename(path))
+    return progress
+
+# Stelle einen Snapshot aus dem Repository wieder her und prüfe dabei seine Prüfsumme
+def restore_snapshot(db, database, store, name, skip_binlog=False, log=None, callback=None):
+    snapshot = store.load_snapshot(name)
+    progress = RestoreProgress(snapshot.get('size', 0), log, callback)
+    stream_hash = hashlib.sha256()
+
+    def blocks():
+        for digest, _ in snapshot['chunks']:
+            data = store.get_chunk(digest)
+            stream_hash.update(data)
+            yield data
+
+    run_sql_stream(db, database, blocks(), skip_binlog=skip_binlog, progress=progress, label=name)
+    if stream_hash.hexdigest() != snapshot['sha256']:
+        raise IOError(f"Prüfsumme von Snapshot {name} stimmt nicht, die Wiederherstellung ist unvollständig")
+    return progress
+
+# Stelle ein Backup wieder her, das nur im Speicherziel liegt
+def restore_remote(db, database, storage, name, skip_binlog=False, log=None, callback=None):
+    info = storage.stat(name)
+    if info is None:
+        raise FileNotFoundError(f"Backup {name} nicht gefunden")
+    progress = RestoreProgress(info['size'], log, callback)
+    stream = storage.get_stream(name)
+    try:
+        run_sql_stream(db, database, read_blocks(stream), codec_for_file(name), skip_binlog, progress,
+                       label=name)
+    finally:
+        stream.close()
+    return progress
+
+# Glieder einer Sicherungskette von der Basis bis zum gewählten Backup
+def chain_members(backup_dir, filename):
+    members = []
+    current = filename
+    while current:
+        path = os.path.join(backup_dir, current)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Backup {current} der Sicherungskette fehlt")
+        meta = load_meta(path)
+        members.append(current)
+        if not meta or meta.get('type') != 'incremental':
+            break
+        current = meta.get('parent')
+    return list(reversed(members))
+
+# Stelle ein Backup anhand seines Namens wieder her (Datei, Verzeichnis, Snapshot oder Speicherziel)
+def restore_backup(config, filename, db, database=None, threads=None, skip_binlog=False, defer_indexes=True,
+                   log=None, callback=None):
+    backup_dir = config.get('BACKUP_DIR', '/app/backups')
+    path = os.path.join(backup_dir, filename)
+    database = database or db.database
+    threads = threads or db.threads
+    started = time.monotonic()
+    if not filename.startswith('mysql_backup_') or os.path.basename(filename) != filename:
+        raise ValueError(f"Ungültiger Backup-Name: {filename}")
+
+    create_database(db, database)
+    store = ChunkStore(repository_dir(config))
+    if store.has_snapshot(filename):
+        steps = [('snapshot', filename)]
+    elif os.path.exists(path):
+        steps = [('directory' if os.path.isdir(path) else 'file', member)
+                 for member in chain_members(backup_dir, filename)]
+        meta = load_meta(path)
+        if len(steps) > 1 and meta and meta.get('database') != database:
+            # Das Binärlog enthält USE-Anweisungen für die ursprüngliche Datenbank
+            raise ValueError(f"Inkrementelle Backups können nur in die ursprüngliche Datenbank "
+                             f"{meta.get('database')} eingespielt werden")
+    else:
+        steps = [('remote', filename)]
+
+    total = {'bytes': 0, 'steps': []}
+    for index, (kind, name) in enumerate(steps, start=1):
+        if log:
+            prefix = f"[{index}/{len(steps)}] " if len(steps) > 1 else ''
+            log(f"{prefix}Spiele {name} in {database} auf {db.host} ein...")
+        if kind == 'snapshot':
+            progress = restore_snapshot(db, database, store, name, skip_binlog, log, callback)
+        elif kind == 'directory':
+            progress = restore_directory(db, database, os.path.join(backup_dir, name), threads, skip_binlog,
+                                         defer_indexes, log, callback)
+        elif kind == 'file':
+            progress = restore_file(db, database, os.path.join(backup_dir, name), skip_binlog, log, callback)
+        else:
+            storage = storage_from_config(config)
+            if storage is None:
+                raise FileNotFoundError(f"Backup {name} nicht gefunden")
+            progress = restore_remote(db, database, storage, name, skip_binlog, log, callback)
+        result = progress.result()
+        total['bytes'] += result['bytes']
+        total['steps'].append(dict(result, filename=name))
+        if log:
+            log(f"{name} eingespielt: {result['bytes'] / 1024 / 1024:.1f} MB in {result['duration']:.1f}s "
+                f"({result['throughput'] / 1024 / 1024:.1f} MB/s)")
+
+    total['duration'] = time.monotonic() - started
+    total['throughput'] = total['bytes'] / max(total['duration'], 0.001)
+    total['database'] = database
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description='Backup in eine Datenbank einspielen')
+    parser.add_argument('backup', help='Name des Backups (Datei, Verzeichnis oder Snapshot)')
+    parser.add_argument('--db-id', required=True, help='ID der Zielverbindung aus der backup.conf')
+    parser.add_argument('--database', help='Zieldatenbank (Standard: Datenbank der Verbindung)')
+    parser.add_argument('--threads', type=int, help='Parallele Verbindungen für tabellenweise Backups')
+    parser.add_argument('--skip-binlog', action='store_true', help='Nicht in das Binärlog des Ziels schreiben')
+    parser.add_argument('--keep-indexes', action='store_true',
+                        help='Sekundärindizes nicht erst nach den Daten anlegen')
+    args = parser.parse_args()
+
+    db = load_database(args.db_id)
+    if not db or not db.database and not args.database:
+        log_stderr(f"FEHLER: Datenbank mit ID {args.db_id} nicht gefunden!")
+        return 1
+
+    try:
+        result = restore_backup(load_backup_config(), os.path.basename(args.backup.rstrip('/')), db,
+                                args.database, args.threads, args.skip_binlog, not args.keep_indexes,
+                                log=log_stderr)
+    except Exception as e:
+        log_stderr(f"FEHLER: Wiederherstellung von {args.backup} fehlgeschlagen: {e}")
+        return 1
+    log_stderr(f"Wiederherstellung in {result['database']} abgeschlossen: {result['bytes'] / 1024 / 1024:.1f} MB "
+               f"in {result['duration']:.1f}s ({result['throughput'] / 1024 / 1024:.1f} MB/s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
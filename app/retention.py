@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Bereinigung alter Backups
+#
+# Welche Backups gelöscht werden, wird in einem Durchgang aus dem Backup-Katalog
+# bestimmt, ohne die Backup-Verzeichnisse oder den SMB-Share zu durchsuchen. Je
+# Datenbank bleiben erhalten:
+#   - alle Backups der letzten BACKUP_RETENTION Tage (0 = keine Mindestdauer)
+#   - Großvater-Vater-Sohn: das jeweils neueste Backup der letzten RETENTION_HOURLY
+#     Stunden, RETENTION_DAILY Tage, RETENTION_WEEKLY Wochen und RETENTION_MONTHLY Monate
+# Ohne Großvater-Vater-Sohn-Regeln gilt nur die Aufbewahrungsdauer, mit
+# BACKUP_RETENTION="0" bleiben dann alle Backups erhalten.
+#
+# Sicherungsketten (volles Backup mit inkrementellen Binlog-Backups) werden nur als
+# Ganzes gelöscht - bleibt ein Glied erhalten, bleibt die ganze Kette erhalten.
+# Gelöscht wird gesammelt je Ziel: Backup-Verzeichnis, Repository, Speicherziel und
+# SMB-Share (nur die bekannten Namen, ohne das Verzeichnis aufzulisten).
+#
+# Aufruf aus backup.sh:
+#   retention.py plan [--count | --json]
+#   retention.py apply [--smb-dir <verzeichnis>] [--dry-run]
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import datetime
+from backup_config import load_backup_config, config_int, config_bool
+from binlog import META_SUFFIX, meta_path
+from integrity import CHECKSUM_SUFFIX, checksum_path
+
+# Großvater-Vater-Sohn-Stufen: Schlüssel, Konfiguration, Zeitraum (strftime) und Bezeichnung
+RETENTION_PERIODS = (
+    ('hourly', 'RETENTION_HOURLY', '%Y-%m-%d %H', 'stündlich'),
+    ('daily', 'RETENTION_DAILY', '%Y-%m-%d', 'täglich'),
+    ('weekly', 'RETENTION_WEEKLY', '%G-%V', 'wöchentlich'),
+    ('monthly', 'RETENTION_MONTHLY', '%Y-%m', 'monatlich')
+)
+
+# Aufbewahrungsregeln aus der Konfiguration
+def retention_policy(config):
+    policy = {'days': config_int(config, 'BACKUP_RETENTION', 7, minimum=0)}
+    for key, config_key, _, _ in RETENTION_PERIODS:
+        policy[key] = config_int(config, config_key, 0, minimum=0)
+    return policy
+
+def has_gfs(policy):
+    return any(policy[key] > 0 for key, _, _, _ in RETENTION_PERIODS)
+
+# Bestimme in einem Durchgang, welche Backups erhalten bleiben und welche gelöscht werden
+# entries: Katalogeinträge mit filename, db_id, date (Zeitpunkt als datetime) und chain
+# Liefert die Gründe für jedes erhaltene Backup und die zu löschenden Backups (älteste zuerst).
+def plan_retention(entries, policy, now=None):
+    reasons = {entry['filename']: [] for entry in entries}
+    if not has_gfs(policy) and policy['days'] <= 0:
+        for entry in entries:
+            reasons[entry['filename']].append('unbegrenzte Aufbewahrung')
+        return reasons, []
+
+    cutoff = (now or datetime.datetime.now()) - datetime.timedelta(days=policy['days'])
+    databases = {}
+    chains = {}
+    for entry in entries:
+        databases.setdefault(entry['db_id'], []).append(entry)
+        if entry['chain']:
+            chains.setdefault(entry['chain'], []).append(entry)
+        if policy['days'] > 0 and entry['date'] >= cutoff:
+            reasons[entry['filename']].append(f"jünger als {policy['days']} Tage")
+
+    # Je Stufe das neueste Backup der letzten N Zeiträume, in denen es Backups gibt
+    for members in databases.values():
+        members.sort(key=lambda entry: entry['date'], reverse=True)
+        for key, _, period_format, label in RETENTION_PERIODS:
+            periods = set()
+            for entry in members:
+                if len(periods) >= policy[key]:
+                    break
+                period = entry['date'].strftime(period_format)
+                if period not in periods:
+                    periods.add(period)
+                    reasons[entry['filename']].append(label)
+
+    for members in chains.values():
+        if any(reasons[member['filename']] for member in members):
+            for member in members:
+                if not reasons[member['filename']]:
+                    reasons[member['filename']].append('Teil einer erhaltenen Kette')
+
+    expired = sorted((entry for entry in entries if not reasons[entry['filename']]),
+                     key=lambda entry: entry['date'])
+    return reasons, expired
+
+# Lösche ein Backup samt Metadaten und Prüfsummendatei aus einem Verzeichnis (fehlende Dateien werden übersprungen)
+# Liefert False, wenn das Backup dort nicht vorhanden war.
+def remove_backup(directory, filename):
+    path = os.path.join(directory, filename)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    else:
+        return False
+    for sidecar in (meta_path(path), checksum_path(path)):
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+    return True
+
+# Metadaten und Prüfsummendateien, deren Backup nicht mehr existiert
+def orphaned_meta_files(backup_dir):
+    if not os.path.isdir(backup_dir):
+        return []
+    orphaned = []
+    for name in os.listdir(backup_dir):
+        suffix = next((suffix for suffix in (META_SUFFIX, CHECKSUM_SUFFIX) if name.endswith(suffix)), None)
+        if name.startswith('mysql_backup_') and suffix and \
+                not os.path.exists(os.path.join(backup_dir, name[:-len(suffix)])):
+            orphaned.append(os.path.join(backup_dir, name))
+    return orphaned
+
+# Vorschau bzw. Plan der Bereinigung aus dem Katalog, je Datenbank die neuesten zuerst
+def retention_preview(catalog, config, policy=None):
+    policy = policy or retention_policy(config)
+    entries = catalog.entries()
+    reasons, expired = plan_retention(entries, policy)
+    return {
+        'policy': policy,
+        'backups': [dict(entry, keep=bool(reasons[entry['filename']]), reasons=reasons[entry['filename']])
+                    for entry in sorted(entries, key=lambda entry: (entry['db_id'], entry['date']), reverse=True)],
+        'expired': expired
+    }
+
+# Lösche die abgelaufenen Backups gesammelt je Ziel und trage sie aus dem Katalog aus
+# Ein Backup bleibt im Katalog, solange eine seiner Kopien nicht gelöscht werden konnte (z.B.
+# Speicherziel nicht erreichbar, SMB-Share nicht eingehängt); der nächste Lauf versucht es erneut.
+# Liefert die abgelaufenen Backups und die Fehler.
+def apply_retention(catalog, config, smb_dir=None, dry_run=False, log=None):
+    from chunkstore import ChunkStore, repository_dir
+    from storage import storage_from_config
+    log = log or (lambda message: None)
+    _, expired = plan_retention(catalog.entries(), retention_policy(config))
+    if not expired:
+        log("Keine abgelaufenen Backups")
+        return expired, []
+    for entry in expired:
+        log(f"{'Würde löschen' if dry_run else 'Lösche'}: {entry['filename']}")
+    if dry_run:
+        return expired, []
+
+    files = [entry['filename'] for entry in expired if entry['kind'] in ('file', 'directory')]
+    snapshots = [entry['filename'] for entry in expired if entry['kind'] == 'repository']
+    errors = []
+    # Backups, von denen noch mindestens eine Kopie vorhanden ist
+    remaining = set()
+
+    def failed(names, message):
+        remaining.update(names)
+        errors.append(message)
+
+    # Backup-Verzeichnis
+    backup_dir = config.get('BACKUP_DIR', '/app/backups')
+    for filename in files:
+        try:
+            remove_backup(backup_dir, filename)
+        except OSError as e:
+            failed([filename], f"{filename}: {e}")
+    for path in orphaned_meta_files(backup_dir):
+        try:
+            os.remove(path)
+        except OSError as e:
+            errors.append(f"{os.path.basename(path)}: {e}")
+
+    # Repositorys: Snapshots löschen, danach nicht mehr verwendete Chunks entfernen
+    repositories = [(ChunkStore(repository_dir(config)), 'Repository')]
+    if smb_dir:
+        repositories.append((ChunkStore(os.path.join(smb_dir, 'repository')), 'SMB-Repository'))
+    for store, label in repositories:
+        deleted = []
+        for name in snapshots:
+            try:
+                if store.has_snapshot(name):
+                    store.delete_snapshot(name)
+                    deleted.append(name)
+            except OSError as e:
+                failed([name], f"{label} {name}: {e}")
+        if deleted:
+            try:
+                store.gc(log=lambda message: log(f"{label}: {message}"))
+                store.check(log=lambda message: log(f"{label}: {message}"))
+            except Exception as e:
+                errors.append(f"{label}: {e}")
+
+    # Speicherziel: Kopien und Backups ohne lokale Kopie, eine Auflistung für alle
+    storage = storage_from_config(config)
+    if storage is not None:
+        names = [entry['filename'] for entry in expired if entry['kind'] != 'repository']
+        try:
+            deleted = storage.delete_many(names)
+            log(f"Speicherziel: {deleted} Backups gelöscht aus {storage.describe()}")
+        except Exception as e:
+            failed(names, f"Speicherziel: {e}")
+
+    # SMB-Share: nur die bekannten Namen, ohne das Verzeichnis zu durchsuchen
+    if smb_dir:
+        deleted = 0
+        for filename in files:
+            try:
+                deleted += remove_backup(smb_dir, filename)
+            except OSError as e:
+                failed([filename], f"SMB-Share {filename}: {e}")
+        log(f"SMB-Share: {deleted} Backups gelöscht")
+    elif config_bool(config, 'SMB_ENABLED') and config.get('SMB_SHARE'):
+        failed(files + snapshots, "SMB-Share nicht eingehängt, die Kopien dort wurden nicht gelöscht")
+
+    catalog.remove_many([entry['filename'] for entry in expired if entry['filename'] not in remaining])
+    for error in errors:
+        log(f"FEHLER: {error}")
+    for filename in sorted(remaining):
+        log(f"Bleibt im Katalog und wird beim nächsten Lauf erneut gelöscht: {filename}")
+    return expired, errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Alte Backups nach den Aufbewahrungsregeln löschen')
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan_parser = commands.add_parser('plan', help='Abgelaufene Backups anzeigen')
+    plan_parser.add_argument('--count', action='store_true', help='Nur die Anzahl ausgeben')
+    plan_parser.add_argument('--json', action='store_true', help='Vollständigen Plan als JSON ausgeben')
+    apply_parser = commands.add_parser('apply', help='Abgelaufene Backups löschen')
+    apply_parser.add_argument('--smb-dir', help='Backup-Verzeichnis auf dem eingehängten SMB-Share')
+    apply_parser.add_argument('--dry-run', action='store_true', help='Nur anzeigen, nichts löschen')
+    args = parser.parse_args()
+
+    from catalog import BackupCatalog
+    catalog = BackupCatalog()
+    config = load_backup_config()
+    try:
+        catalog.ensure(config)
+        if args.command == 'plan':
+            preview = retention_preview(catalog, config)
+            if args.count:
+                print(len(preview['expired']))
+            elif args.json:
+                print(json.dumps(preview, default=str, indent=2))
+            else:
+                for backup in preview['backups']:
+                    status = ', '.join(backup['reasons']) if backup['keep'] else 'wird gelöscht'
+                    print(f"{backup['created']}  {backup['db_id']:>3}  {backup['filename']}  ({status})")
+            return 0
+        expired, errors = apply_retention(catalog, config, args.smb_dir, args.dry_run, log=print)
+    except Exception as e:
+        print(f"FEHLER: Bereinigung fehlgeschlagen: {e}")
+        return 1
+    directories = sum(1 for entry in expired if entry['kind'] == 'directory')
+    prefix = 'Zu löschende' if args.dry_run else 'Abgelaufene'
+    print(f"{prefix} Backups: {len(expired) - directories}, Verzeichnis-Backups: {directories}")
+    if errors:
+        print(f"FEHLER: Bereinigung mit {len(errors)} Fehler(n) abgeschlossen")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
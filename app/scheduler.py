@@ -6,10 +6,16 @@
 import os
 import json
 import time
+import shutil
 import logging
 import subprocess
 import datetime
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
+from backup_config import load_backup_config, load_database_configs, load_settings, has_database_entries
+from orchestrator import BackupOrchestrator, stagger_offsets
+from catalog import BackupCatalog
+from scheduler_control import start_control_server
 
 # Konfiguriere Logging
 logging.basicConfig(
@@ -26,16 +32,70 @@ logger = logging.getLogger(__name__)
 CONFIG_DIR = '/app/config'
 SCHEDULER_CONFIG = os.path.join(CONFIG_DIR, 'scheduler.json')
 
+# Sekunden zwischen den Ersatzprüfungen der scheduler.json
+CONFIG_POLL_INTERVAL = 60
+
+# Allgemeiner Zeitplan, falls scheduler.json Felder fehlen
+SCHEDULE_DEFAULTS = {'schedule': 'daily', 'time': '00:00', 'day_of_week': '1', 'day_of_month': '1'}
+
+# Staffelung der Startzeiten: Zeitfenster in Minuten; häufige Zeitpläne erhalten die
+# frühesten Startzeiten, stündliche Backups starten höchstens 30 Minuten versetzt
+DEFAULT_STAGGER_WINDOW = 60
+HOURLY_STAGGER_LIMIT = 30 * 60
+SCHEDULE_PRIORITY = {'hourly': 0, 'daily': 1, 'weekly': 2, 'monthly': 3}
+
 # Backup-Skript
 BACKUP_SCRIPT = '/app/scripts/backup.sh'
 
+# Integritätsprüfung der letzten Backups (siehe integrity.py), stündlich mit niedriger Priorität
+VERIFY_SCRIPT = '/app/integrity.py'
+VERIFY_JOB_ID = 'verify_backups'
+VERIFY_INTERVAL_MINUTES = 60
+
 # Initialisiere Scheduler
 scheduler = BackgroundScheduler()
 
-# Führe Backup aus
-def run_backup():
+# Prüfe die noch ungeprüften Backups der letzten Tage
+# nice setzt integrity.py selbst; ionice sorgt dafür, dass laufende Backups beim Lesen Vorrang haben.
+def run_verification():
+    command = ['python3', VERIFY_SCRIPT, 'verify']
+    if shutil.which('ionice'):
+        command = ['ionice', '-c', '3'] + command
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+        for line in result.stdout.splitlines():
+            logger.info(f"Integritätsprüfung: {line}")
+        if result.returncode == 1:
+            logger.error(f"Integritätsprüfung fehlgeschlagen: {result.stderr}")
+        elif result.returncode == 2:
+            logger.error("Integritätsprüfung: Beschädigte Backups gefunden!")
+    except Exception as e:
+        logger.exception("Fehler bei der Integritätsprüfung")
+
+# Führe Backup aus (db_ids: nur diese Datenbanken, sonst alle)
+def run_backup(db_ids=None):
     logger.info("Starte geplantes Backup...")
     try:
+        config = load_backup_config()
+        if has_database_entries(config):
+            # Backups der Datenbanken parallel ausführen
+            orchestrator = BackupOrchestrator.from_config(load_settings())
+            databases = load_database_configs()
+            if db_ids is not None:
+                databases = [db for db in databases if db['id'] in db_ids]
+            offsets = start_offsets(load_scheduler_config(), databases, orchestrator.max_per_host)
+            run = orchestrator.run_all(databases, start_offsets=offsets)
+            for result in run['results']:
+                status = 'OK' if result['success'] else 'FEHLER'
+                logger.info(f"  DB {result['id']} ({result['name']}) auf {result['host']}: "
+                            f"{status} in {result['duration']:.1f}s")
+            if run['success']:
+                logger.info(f"Geplantes Backup erfolgreich durchgeführt ({run['duration']:.1f}s).")
+            else:
+                logger.error(f"Geplantes Backup: {run['failed']} Datenbank(en) fehlgeschlagen ({run['duration']:.1f}s).")
+            return
+        
+        # Alte Konfiguration ohne DB_[ID]-Einträge
         result = subprocess.run([BACKUP_SCRIPT], capture_output=True, text=True)
         if result.returncode == 0:
             logger.info("Geplantes Backup erfolgreich durchgeführt.")
@@ -44,6 +104,46 @@ def run_backup():
     except Exception as e:
         logger.exception("Fehler beim Ausführen des geplanten Backups")
 
+# Startversatz der Datenbanken eines Laufs anhand der bisherigen Backup-Dauer
+# Die Bahnen pro Server werden über alle geplanten Datenbanken vergeben (häufige Zeitpläne
+# zuerst), damit sich auch Läufe verschiedener Zeitpläne zur selben Zeit nicht überlagern.
+def start_offsets(config, databases, max_per_host):
+    if not config.get('stagger', True) or not databases:
+        return {}
+    try:
+        window = max(0, int(config.get('stagger_window', DEFAULT_STAGGER_WINDOW))) * 60
+    except (TypeError, ValueError):
+        window = DEFAULT_STAGGER_WINDOW * 60
+    if window == 0:
+        return {}
+    
+    schedules = {}
+    for db in load_database_configs():
+        settings = database_schedule(config, db['id'])
+        if settings:
+            schedules[db['id']] = (db, settings['schedule'])
+    for db in databases:
+        schedules.setdefault(db['id'], (db, config.get('schedule', 'daily')))
+    ordered = sorted(schedules.values(), key=lambda entry: SCHEDULE_PRIORITY.get(entry[1], len(SCHEDULE_PRIORITY)))
+    
+    try:
+        durations = BackupCatalog().recent_durations()
+    except Exception as e:
+        logger.warning(f"Bisherige Backup-Dauer nicht verfügbar: {e}")
+        durations = {}
+    offsets = stagger_offsets([db for db, _ in ordered], durations, max_per_host, window)
+    
+    result = {}
+    for db in databases:
+        offset = offsets.get(db['id'], 0)
+        # Stündliche Backups müssen vor dem nächsten Lauf beginnen
+        if schedules[db['id']][1] == 'hourly':
+            offset = min(offset, HOURLY_STAGGER_LIMIT)
+        if offset > 0:
+            logger.info(f"Backup der Datenbank {db['id']} startet um {offset / 60:.1f} Minuten versetzt.")
+            result[db['id']] = offset
+    return result
+
 # Lade die Scheduler-Konfiguration
 def load_scheduler_config():
     if os.path.exists(SCHEDULER_CONFIG):
@@ -62,19 +162,23 @@ def load_scheduler_config():
         "day_of_month": "1"
     }
 
-# Konfiguriere den Scheduler basierend auf der Konfiguration
-def configure_scheduler():
-    # Entferne alle vorhandenen Jobs
-    scheduler.remove_all_jobs()
-    
-    # Lade Konfiguration
-    config = load_scheduler_config()
-    
-    # Wenn der Scheduler nicht aktiviert ist, beende hier
-    if not config.get("enabled", False):
-        logger.info("Scheduler ist deaktiviert.")
-        return
-    
+# Zeitplan einer Datenbank: eigener Eintrag unter "databases" oder der allgemeine Zeitplan
+# (None, wenn die Datenbank nicht automatisch gesichert wird)
+def database_schedule(config, db_id):
+    override = (config.get('databases') or {}).get(db_id) or {}
+    schedule = override.get('schedule') or 'default'
+    if schedule == 'disabled':
+        return None
+    settings = {key: config.get(key, default) for key, default in SCHEDULE_DEFAULTS.items()}
+    if schedule != 'default':
+        settings['schedule'] = schedule
+        for key in ('time', 'day_of_week', 'day_of_month'):
+            if override.get(key):
+                settings[key] = override[key]
+    return settings
+
+# Zeitplan (cron-Felder und Beschreibung) aus den Einstellungen, None bei ungültigem Zeitplan
+def backup_trigger(config):
     # Parse Zeit
     try:
         hour, minute = config.get("time", "00:00").split(":")
@@ -89,50 +193,101 @@ def configure_scheduler():
     
     if schedule_type == "hourly":
         # Stündlich
-        scheduler.add_job(run_backup, 'cron', minute=minute, id='backup_job')
-        logger.info(f"Backup-Job konfiguriert: Stündlich um XX:{minute}")
+        return {'minute': minute}, f"Stündlich um XX:{minute:02d}"
     
     elif schedule_type == "daily":
         # Täglich
-        scheduler.add_job(run_backup, 'cron', hour=hour, minute=minute, id='backup_job')
-        logger.info(f"Backup-Job konfiguriert: Täglich um {hour:02d}:{minute:02d}")
+        return {'hour': hour, 'minute': minute}, f"Täglich um {hour:02d}:{minute:02d}"
     
     elif schedule_type == "weekly":
         # Wöchentlich
         day_of_week = int(config.get("day_of_week", "1"))
-        scheduler.add_job(run_backup, 'cron', day_of_week=day_of_week, hour=hour, minute=minute, id='backup_job')
-        logger.info(f"Backup-Job konfiguriert: Wöchentlich am Tag {day_of_week} um {hour:02d}:{minute:02d}")
+        return ({'day_of_week': day_of_week, 'hour': hour, 'minute': minute},
+                f"Wöchentlich am Tag {day_of_week} um {hour:02d}:{minute:02d}")
     
     elif schedule_type == "monthly":
         # Monatlich
         day_of_month = int(config.get("day_of_month", "1"))
-        scheduler.add_job(run_backup, 'cron', day=day_of_month, hour=hour, minute=minute, id='backup_job')
-        logger.info(f"Backup-Job konfiguriert: Monatlich am Tag {day_of_month} um {hour:02d}:{minute:02d}")
+        return ({'day': day_of_month, 'hour': hour, 'minute': minute},
+                f"Monatlich am Tag {day_of_month} um {hour:02d}:{minute:02d}")
     
-    else:
-        logger.error(f"Unbekannter Zeitplan: {schedule_type}")
+    logger.error(f"Unbekannter Zeitplan: {schedule_type}")
+    return None
 
-# Überwache Änderungen an der Konfigurationsdatei
-def watch_config_changes():
-    last_modified = 0
+# Stand der zuletzt geladenen scheduler.json (für die Ersatzprüfung)
+_loaded_config_key = None
+_configure_lock = threading.Lock()
+
+def _config_key():
+    try:
+        stat = os.stat(SCHEDULER_CONFIG)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+# Geplante Jobs: ID -> (cron-Felder, Beschreibung, Datenbank-IDs oder None für alle)
+# Datenbanken mit gleichem Zeitplan teilen sich einen Job
+def planned_jobs(config):
+    jobs = {}
+    if not config.get("enabled", False):
+        return jobs
     
+    if not has_database_entries(load_backup_config()):
+        # Alte Konfiguration ohne DB_[ID]-Einträge
+        trigger = backup_trigger(config)
+        if trigger:
+            jobs['backup_job'] = (trigger[0], trigger[1], None)
+        return jobs
+    
+    for db in load_database_configs():
+        settings = database_schedule(config, db['id'])
+        trigger = backup_trigger(settings) if settings else None
+        if not trigger:
+            continue
+        fields, description = trigger
+        job_id = 'backup_' + '_'.join(f'{key}-{value}' for key, value in sorted(fields.items()))
+        jobs.setdefault(job_id, (fields, description, []))[2].append(db['id'])
+    return jobs
+
+# Konfiguriere den Scheduler basierend auf der Konfiguration
+# Die Jobs werden ersetzt statt entfernt und neu angelegt, es gibt also keinen Moment ohne
+# Zeitplan; ein gerade laufendes Backup läuft weiter und wird nicht doppelt gestartet.
+def configure_scheduler():
+    global _loaded_config_key
+    with _configure_lock:
+        _loaded_config_key = _config_key()
+        jobs = planned_jobs(load_scheduler_config())
+        if not jobs:
+            logger.info("Scheduler ist deaktiviert.")
+        for job_id, (fields, description, db_ids) in jobs.items():
+            scheduler.add_job(run_backup, 'cron', id=job_id, args=[db_ids] if db_ids else [],
+                              replace_existing=True, max_instances=1, coalesce=True, **fields)
+            targets = f"Datenbanken {', '.join(db_ids)}" if db_ids else "alle Datenbanken"
+            logger.info(f"Backup-Job konfiguriert: {description} ({targets})")
+        for job in scheduler.get_jobs():
+            if job.id not in jobs and job.id != VERIFY_JOB_ID:
+                job.remove()
+    return scheduler_status()
+
+# Geplante Jobs mit nächstem Ausführungszeitpunkt und den gesicherten Datenbanken
+def scheduler_status():
+    return {'jobs': [{'id': job.id,
+                      'next_run_time': job.next_run_time.isoformat() if getattr(job, 'next_run_time', None) else None,
+                      'databases': job.args[0] if job.args else None}
+                     for job in scheduler.get_jobs()]}
+
+# Ersatzprüfung auf Änderungen an der Konfigurationsdatei, falls die Weboberfläche
+# den Scheduler nicht erreicht hat (z.B. während eines Neustarts) oder die Datei
+# von Hand geändert wurde
+def watch_config_changes():
     while True:
+        time.sleep(CONFIG_POLL_INTERVAL)
         try:
-            # Prüfe, ob die Konfigurationsdatei existiert
-            if os.path.exists(SCHEDULER_CONFIG):
-                # Prüfe, ob die Datei geändert wurde
-                current_modified = os.path.getmtime(SCHEDULER_CONFIG)
-                
-                if current_modified > last_modified:
-                    logger.info("Scheduler-Konfiguration wurde geändert. Konfiguriere Scheduler neu...")
-                    configure_scheduler()
-                    last_modified = current_modified
-        
+            if _config_key() != _loaded_config_key:
+                logger.info("Scheduler-Konfiguration wurde geändert. Konfiguriere Scheduler neu...")
+                configure_scheduler()
         except Exception as e:
             logger.exception(f"Fehler beim Überwachen der Konfigurationsdatei: {e}")
-        
-        # Warte 10 Sekunden
-        time.sleep(10)
 
 # Hauptfunktion
 def main():
@@ -140,8 +295,16 @@ def main():
     
     # Initialisiere Scheduler
     configure_scheduler()
+    scheduler.add_job(run_verification, 'interval', id=VERIFY_JOB_ID, minutes=VERIFY_INTERVAL_MINUTES,
+                      replace_existing=True, max_instances=1, coalesce=True)
     scheduler.start()
     
+    # Die Weboberfläche meldet geänderte Zeitpläne über die Steuerschnittstelle
+    try:
+        start_control_server(reload=configure_scheduler, status=scheduler_status)
+    except OSError as e:
+        logger.error(f"Steuerschnittstelle konnte nicht gestartet werden: {e}")
+    
     try:
         # Überwache Änderungen an der Konfigurationsdatei
         watch_config_changes()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Steuerschnittstelle des Schedulers
+#
+# Der Scheduler-Prozess lauscht auf einem lokalen HTTP-Port (nur 127.0.0.1).
+# Die Weboberfläche meldet gespeicherte Zeitpläne darüber sofort, statt dass der
+# Scheduler die scheduler.json regelmäßig abfragen muss:
+#   POST /reload   Zeitplan neu laden, Antwort: aktuelle Jobs
+#   GET  /status   Geplante Jobs mit nächstem Ausführungszeitpunkt
+
+import os
+import json
+import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = int(os.environ.get('SCHEDULER_CONTROL_PORT', '8765'))
+
+# Zeitlimit für Anfragen der Weboberfläche in Sekunden
+REQUEST_TIMEOUT = 5
+
+# Starte den Steuerserver in einem eigenen Thread
+# reload und status sind Funktionen ohne Parameter, die ein JSON-fähiges Ergebnis liefern
+def start_control_server(reload, status, host=CONTROL_HOST, port=CONTROL_PORT):
+    routes = {('POST', '/reload'): reload, ('GET', '/status'): status}
+
+    class ControlHandler(BaseHTTPRequestHandler):
+        def handle_route(self, method):
+            handler = routes.get((method, self.path.split('?', 1)[0]))
+            if handler is None:
+                self.respond(404, {'success': False, 'message': 'Unbekannter Befehl'})
+                return
+            try:
+                self.respond(200, dict(handler(), success=True))
+            except Exception as e:
+                logger.exception(f"Fehler bei {method} {self.path}")
+                self.respond(500, {'success': False, 'message': str(e)})
+
+        def respond(self, code, data):
+            body = json.dumps(data, default=str).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.handle_route('GET')
+
+        def do_POST(self):
+            # Eventuellen Inhalt verwerfen, der Befehl steht im Pfad
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self.handle_route('POST')
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), ControlHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='scheduler-control', daemon=True)
+    thread.start()
+    logger.info(f"Steuerschnittstelle des Schedulers lauscht auf {host}:{port}")
+    return server
+
+def _request(method, path, host=CONTROL_HOST, port=CONTROL_PORT):
+    request = urllib.request.Request(f'http://{host}:{port}{path}', method=method,
+                                     data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.load(response)
+
+# Fordere den Scheduler auf, den Zeitplan neu zu laden (wirft OSError, wenn er nicht läuft)
+def request_reload():
+    return _request('POST', '/reload')
+
+def request_status():
+    return _request('GET', '/status')
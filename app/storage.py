@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Speicherziele für Backups
+#
+# Zusätzlich zu BACKUP_DIR (und dem SMB-Share) kann ein weiteres Ziel konfiguriert
+# werden (STORAGE_BACKEND): ein Verzeichnis (z.B. NFS oder USB), ein S3-kompatibler
+# Objektspeicher (AWS S3, MinIO, ...) oder ein SFTP-Server. Alle Ziele bieten dieselbe
+# Schnittstelle:
+#   put_stream(name, stream)   Datenstrom speichern, erst nach Abschluss sichtbar
+#   get_stream(name)           Backup zum Lesen öffnen
+#   list()                     Backups mit Größe und Änderungszeit
+#   delete(name)               Backup samt Metadaten und Prüfsummendatei löschen
+#   delete_many(names)         mehrere Backups löschen, mit nur einer Auflistung des Ziels
+#   check()                    Erreichbarkeit prüfen (Verbindungsprüfung, siehe health.py)
+#
+# S3 lädt den Strom der Kompression in parallelen Teilen hoch (Multipart-Upload), ohne
+# lokale Zwischendatei. Mit STORAGE_KEEP_LOCAL="false" lassen sich so auch Datenbanken
+# sichern, die größer als der lokale Datenträger sind.
+#
+# Aufruf aus backup.sh:
+#   mysqldump ... | zstd | storage.py put <name>
+#   storage.py upload <pfad> [--skip-existing]   Backup-Datei oder Verzeichnis-Backup hochladen
+#   storage.py exists <name> [--size N]
+#   storage.py get <name> > <datei>
+#   storage.py list | delete <name>
+#
+# Die Aufbewahrungsregeln gelten auch für das Speicherziel; gelöscht wird dort von
+# retention.py anhand des Backup-Katalogs.
+
+import os
+import sys
+import json
+import stat
+import shutil
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from backup_config import CONFIG_DIR, load_backup_config, config_bool, config_int
+from backup_codecs import BACKUP_EXTENSIONS
+from binlog import META_SUFFIX
+from integrity import CHECKSUM_SUFFIX
+from parallel_dump import MANIFEST_FILE
+
+# Blockgröße beim Kopieren von Strömen
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Teilgröße für S3-Multipart-Uploads in MB (S3 verlangt mindestens 5 MB)
+DEFAULT_PART_SIZE = 64
+MIN_PART_SIZE = 5
+
+# S3 erlaubt höchstens 10000 Teile, daher wird die Teilgröße alle 1000 Teile verdoppelt
+PART_SIZE_DOUBLING = 1000
+
+# Gleichzeitig übertragene Teile bzw. Dateien
+DEFAULT_UPLOAD_JOBS = 4
+
+# Höchstzahl der Objekte pro S3-Löschanfrage
+S3_DELETE_BATCH = 1000
+
+# Lies bis zu size Bytes (Pipes liefern auch kürzere Blöcke vor dem Ende)
+def read_full(stream, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def is_backup_name(name):
+    return name.startswith('mysql_backup_') and not name.endswith((META_SUFFIX, CHECKSUM_SUFFIX))
+
+# Fasse Objekte bzw. Dateien eines Ziels zu Backups zusammen
+# objects: Name relativ zum Ziel -> (Größe, Änderungszeit); Verzeichnis-Backups bestehen aus
+# "<backup>/<datei>" und zählen erst mit Manifest als vollständig
+def group_backups(objects):
+    backups = {}
+    directories = {}
+    for name, (size, mtime) in objects.items():
+        if '/' in name:
+            directory = name.split('/', 1)[0]
+            if is_backup_name(directory):
+                directories.setdefault(directory, []).append((name, size, mtime))
+        elif is_backup_name(name) and name.endswith(BACKUP_EXTENSIONS):
+            backups[name] = {'filename': name, 'size': size, 'mtime': mtime, 'is_directory': False}
+    for directory, files in directories.items():
+        if f'{directory}/{MANIFEST_FILE}' not in objects:
+            continue
+        backups[directory] = {
+            'filename': directory,
+            'size': sum(size for _, size, _ in files),
+            'mtime': objects[f'{directory}/{MANIFEST_FILE}'][1],
+            'is_directory': True
+        }
+    for name, backup in backups.items():
+        backup['has_meta'] = name + META_SUFFIX in objects
+    return sorted(backups.values(), key=lambda backup: backup['mtime'])
+
+class StorageBackend:
+    name = 'none'
+    jobs = DEFAULT_UPLOAD_JOBS
+
+    # Alle Objekte unterhalb des Ziels: Name -> (Größe, Änderungszeit)
+    def objects(self):
+        raise NotImplementedError
+
+    def put_stream(self, name, stream):
+        raise NotImplementedError
+
+    # Öffne ein Objekt zum Lesen (FileNotFoundError, wenn es fehlt)
+    def get_stream(self, name):
+        raise NotImplementedError
+
+    def remove(self, name):
+        raise NotImplementedError
+
+    # Größe und Änderungszeit eines Objekts (None, wenn es fehlt)
+    def stat(self, name):
+        raise NotImplementedError
+
+    def list(self):
+        return group_backups(self.objects())
+
+    # Entferne mehrere Objekte (Ziele mit Sammel-Löschung überschreiben das)
+    def remove_many(self, keys):
+        for key in keys:
+            self.remove(key)
+
+    # Lösche ein Backup; Verzeichnis-Backups mit allen Dateien, das Manifest zuerst
+    def delete(self, name):
+        self.delete_many([name])
+
+    # Lösche mehrere Backups mit einer einzigen Auflistung des Ziels
+    # Die Manifeste der Verzeichnis-Backups werden zuerst gelöscht, damit ein abgebrochenes
+    # Löschen kein scheinbar vollständiges Verzeichnis-Backup hinterlässt.
+    # Liefert die Anzahl der vorhandenen und gelöschten Backups.
+    def delete_many(self, names):
+        directories = {}
+        objects = self.objects()
+        for key in objects:
+            if '/' in key:
+                directories.setdefault(key.split('/', 1)[0], []).append(key)
+        manifests = []
+        keys = []
+        found = 0
+        for name in names:
+            manifest = f'{name}/{MANIFEST_FILE}'
+            backup_keys = [key for key in directories.get(name, []) if key != manifest]
+            backup_keys += [key for key in (name, name + META_SUFFIX, name + CHECKSUM_SUFFIX) if key in objects]
+            if manifest in objects:
+                manifests.append(manifest)
+            if backup_keys or manifest in objects:
+                found += 1
+            keys += backup_keys
+        self.remove_many(manifests + keys)
+        return found
+
+    def load_meta(self, name):
+        try:
+            with contextlib.closing(self.get_stream(name + META_SUFFIX)) as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    # Lade eine lokale Backup-Datei oder ein Verzeichnis-Backup samt Metadaten und Prüfsummendatei hoch
+    # Die Dateien eines Verzeichnis-Backups werden parallel übertragen, das Manifest zuletzt.
+    # Mit skip_existing bleibt eine gleich große, bereits übertragene Backup-Datei unverändert
+    # (sie wurde während des Backups geschrieben); die Metadaten werden trotzdem übertragen.
+    def upload(self, path, skip_existing=False):
+        name = os.path.basename(path.rstrip('/'))
+        transferred = True
+        if skip_existing and os.path.isfile(path) and \
+                (self.stat(name) or {}).get('size') == os.path.getsize(path):
+            transferred = False
+        elif os.path.isdir(path):
+            files = sorted(entry.name for entry in os.scandir(path)
+                           if entry.is_file() and entry.name != MANIFEST_FILE)
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                for future in [executor.submit(self.upload_file, os.path.join(path, file), f'{name}/{file}')
+                               for file in files]:
+                    future.result()
+            self.upload_file(os.path.join(path, MANIFEST_FILE), f'{name}/{MANIFEST_FILE}')
+        else:
+            self.upload_file(path, name)
+        for suffix in (META_SUFFIX, CHECKSUM_SUFFIX):
+            if os.path.exists(path + suffix):
+                self.upload_file(path + suffix, name + suffix)
+        return transferred
+
+    def upload_file(self, path, name):
+        with open(path, 'rb') as f:
+            return self.put_stream(name, f)
+
+    # Prüfe, ob das Ziel erreichbar ist (Ausnahme, wenn nicht)
+    def check(self):
+        self.objects()
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return self.name
+
+# Verzeichnis auf einem eingehängten Dateisystem
+class LocalStorage(StorageBackend):
+    name = 'local'
+
+    def __init__(self, path):
+        self.path = path
+
+    def full_path(self, name):
+        return os.path.join(self.path, name)
+
+    def objects(self):
+        objects = {}
+        if not os.path.isdir(self.path):
+            return objects
+        for entry in os.scandir(self.path):
+            if entry.is_dir():
+                for child in os.scandir(entry.path):
+                    if child.is_file() and not child.name.endswith('.part'):
+                        info = child.stat()
+                        objects[f'{entry.name}/{child.name}'] = (info.st_size, info.st_mtime)
+            elif entry.is_file() and not entry.name.endswith('.part'):
+                info = entry.stat()
+                objects[entry.name] = (info.st_size, info.st_mtime)
+        return objects
+
+    # Schreibe unter temporärem Namen, damit keine halbe Datei sichtbar ist
+    def put_stream(self, name, stream):
+        target = self.full_path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = target + '.part'
+        try:
+            with open(temp, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_BLOCK_SIZE)
+            os.replace(temp, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp)
+            raise
+        return os.path.getsize(target)
+
+    def get_stream(self, name):
+        return open(self.full_path(name), 'rb')
+
+    def remove(self, name):
+        os.remove(self.full_path(name))
+        directory = os.path.dirname(self.full_path(name))
+        if directory != self.path.rstrip('/') and not os.listdir(directory):
+            os.rmdir(directory)
+
+    def stat(self, name):
+        try:
+            info = os.stat(self.full_path(name))
+        except FileNotFoundError:
+            return None
+        return {'size': info.st_size, 'mtime': info.st_mtime}
+
+    def check(self):
+        if not os.path.isdir(self.path):
+            raise FileNotFoundError(f"Verzeichnis {self.path} existiert nicht")
+        if not os.access(self.path, os.W_OK):
+            raise PermissionError(f"Keine Schreibrechte für {self.path}")
+
+    def describe(self):
+        return f'Verzeichnis {self.path}'
+
+# S3-kompatibler Objektspeicher (benötigt boto3)
+class S3Storage(StorageBackend):
+    name = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint=None, region=None, access_key=None, secret_key=None,
+                 part_size=DEFAULT_PART_SIZE, jobs=DEFAULT_UPLOAD_JOBS):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("Für S3 wird das Python-Paket boto3 benötigt")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.endpoint = endpoint
+        self.part_size = max(MIN_PART_SIZE, part_size) * 1024 * 1024
+        self.jobs = jobs
+        self.client = boto3.client('s3', endpoint_url=endpoint or None, region_name=region or None,
+                                   aws_access_key_id=access_key or None,
+                                   aws_secret_access_key=secret_key or None,
+                                   config=Config(max_pool_connections=max(10, jobs * 2)))
+
+    def key(self, name):
+        return self.prefix + name
+
+    def objects(self):
+        objects = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + 'mysql_backup_'):
+            for item in page.get('Contents', []):
+                objects[item['Key'][len(self.prefix):]] = (item['Size'], item['LastModified'].timestamp())
+        return objects
+
+    # Kleine Ströme in einem Stück, größere als Multipart-Upload mit parallelen Teilen
+    # Höchstens jobs + 1 Teile liegen gleichzeitig im Speicher; bei einem Fehler wird der
+    # Upload abgebrochen, damit keine unvollständigen Teile im Bucket liegen bleiben
+    def put_stream(self, name, stream):
+        key = self.key(name)
+        part_size = self.part_size
+        data = read_full(stream, part_size)
+        if len(data) < part_size:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+            return len(data)
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+        slots = threading.BoundedSemaphore(self.jobs)
+        futures = []
+        total = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                number = 1
+                while data:
+                    slots.acquire()
+                    # Frühzeitig abbrechen, wenn ein Teil fehlgeschlagen ist
+                    for future in futures:
+                        if future.done():
+                            future.result()
+                    futures.append(executor.submit(self.upload_part, key, upload_id, number, data, slots))
+                    total += len(data)
+                    if number % PART_SIZE_DOUBLING == 0:
+                        part_size *= 2
+                    number += 1
+                    data = read_full(stream, part_size)
+                parts = [future.result() for future in futures]
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  MultipartUpload={'Parts': parts})
+        except BaseException:
+            with contextlib.suppress(Exception):
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return total
+
+    def upload_part(self, key, upload_id, number, data, slots):
+        try:
+            response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                               PartNumber=number, Body=data)
+            return {'PartNumber': number, 'ETag': response['ETag']}
+        finally:
+            slots.release()
+
+    def get_stream(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(name))['Body']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                raise FileNotFoundError(f"{name} nicht gefunden")
+            raise
+
+    def remove(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    # Bis zu S3_DELETE_BATCH Objekte pro Anfrage löschen
+    def remove_many(self, keys):
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            batch = [{'Key': self.key(key)} for key in keys[start:start + S3_DELETE_BATCH]]
+            response = self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': batch, 'Quiet': True})
+            errors = response.get('Errors', [])
+            if errors:
+                raise IOError(f"{len(errors)} Objekte konnten nicht gelöscht werden, "
+                              f"z.B. {errors[0]['Key']}: {errors[0].get('Message')}")
+
+    def stat(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return {'size': response['ContentLength'], 'mtime': response['LastModified'].timestamp()}
+
+    def check(self):
+        self.client.head_bucket(Bucket=self.bucket)
+
+    def describe(self):
+        return f"s3://{self.bucket}/{self.prefix}" + (f" ({self.endpoint})" if self.endpoint else '')
+
+# SFTP-Server (benötigt paramiko)
+class SftpStorage(StorageBackend):
+    name = 'sftp'
+
+    def __init__(self, host, path, user, password=None, key_file=None, port=22, jobs=DEFAULT_UPLOAD_JOBS):
+        try:
+            import paramiko
+        except ImportError:
+            raise RuntimeError("Für SFTP wird das Python-Paket paramiko benötigt")
+        self.host = host
+        self.port = port
+        self.path = path.rstrip('/') or '/'
+        self.jobs = jobs
+        self.client = paramiko.SSHClient()
+        self.client.load_system_host_keys()
+        # Eigene Hostschlüssel können in config/known_hosts hinterlegt werden
+        known_hosts = os.path.join(CONFIG_DIR, 'known_hosts')
+        if os.path.exists(known_hosts):
+            self.client.load_host_keys(known_hosts)
+        self.client.set_missing_host_key_policy(paramiko.WarningPolicy())
+        self.client.connect(host, port=port, username=user, password=password or None,
+                            key_filename=key_file or None, timeout=30)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    # Eine SFTP-Sitzung je Thread, damit Dateien parallel übertragen werden können
+    def sftp(self):
+        if getattr(self.local, 'sftp', None) is None:
+            with self.lock:
+                self.local.sftp = self.client.open_sftp()
+        return self.local.sftp
+
+    def full_path(self, name):
+        return f'{self.path}/{name}'
+
+    def objects(self):
+        objects = {}
+        sftp = self.sftp()
+        for entry in sftp.listdir_attr(self.path):
+            if not entry.filename.startswith('mysql_backup_') or entry.filename.endswith('.part'):
+                continue
+            if stat.S_ISDIR(entry.st_mode):
+                for child in sftp.listdir_attr(self.full_path(entry.filename)):
+                    if not child.filename.endswith('.part'):
+                        objects[f'{entry.filename}/{child.filename}'] = (child.st_size, child.st_mtime)
+            else:
+                objects[entry.filename] = (entry.st_size, entry.st_mtime)
+        return objects
+
+    def put_stream(self, name, stream):
+        sftp = self.sftp()
+        target = self.full_path(name)
+        if '/' in name:
+            with contextlib.suppress(OSError):
+                sftp.mkdir(os.path.dirname(target))
+        temp = target + '.part'
+        total = 0
+        try:
+            with sftp.open(temp, 'wb') as f:
+                # Nicht auf die Bestätigung jedes Blocks warten
+                f.set_pipelined(True)
+                for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+                    f.write(block)
+                    total += len(block)
+            sftp.posix_rename(temp, target)
+        except BaseException:
+            with contextlib.suppress(Exception):
+                sftp.remove(temp)
+            raise
+        return total
+
+    def get_stream(self, name):
+        try:
+            f = self.sftp().open(self.full_path(name), 'rb')
+        except IOError as e:
+            if getattr(e, 'errno', None) == 2:
+                raise FileNotFoundError(f"{name} nicht gefunden")
+            raise
+        f.prefetch()
+        return f
+
+    def remove(self, name):
+        sftp = self.sftp()
+        sftp.remove(self.full_path(name))
+        if '/' in name:
+            directory = os.path.dirname(self.full_path(name))
+            if not sftp.listdir(directory):
+                sftp.rmdir(directory)
+
+    def stat(self, name):
+        try:
+            info = self.sftp().stat(self.full_path(name))
+        except IOError:
+            return None
+        return {'size': info.st_size, 'mtime': info.st_mtime}
+
+    def check(self):
+        self.sftp().stat(self.path)
+
+    def close(self):
+        self.client.close()
+
+    def describe(self):
+        return f'sftp://{self.host}:{self.port}{self.path}'
+
+# Konfiguriertes zusätzliches Speicherziel (None, wenn keines eingerichtet ist)
+def storage_from_config(config=None):
+    config = config if config is not None else load_backup_config()
+    backend = (config.get('STORAGE_BACKEND') or 'none').strip().lower()
+    jobs = config_int(config, 'STORAGE_UPLOAD_JOBS', DEFAULT_UPLOAD_JOBS)
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        if not config.get('STORAGE_PATH'):
+            raise ValueError("STORAGE_PATH ist nicht gesetzt")
+        storage = LocalStorage(config['STORAGE_PATH'])
+        storage.jobs = jobs
+        return storage
+    if backend == 's3':
+        if not config.get('S3_BUCKET'):
+            raise ValueError("S3_BUCKET ist nicht gesetzt")
+        return S3Storage(config['S3_BUCKET'], prefix=config.get('S3_PREFIX', ''),
+                         endpoint=config.get('S3_ENDPOINT'), region=config.get('S3_REGION'),
+                         access_key=config.get('S3_ACCESS_KEY'), secret_key=config.get('S3_SECRET_KEY'),
+                         part_size=config_int(config, 'S3_PART_SIZE', DEFAULT_PART_SIZE, MIN_PART_SIZE),
+                         jobs=jobs)
+    if backend == 'sftp':
+        if not config.get('SFTP_HOST'):
+            raise ValueError("SFTP_HOST ist nicht gesetzt")
+        return SftpStorage(config['SFTP_HOST'], config.get('SFTP_PATH') or '.', config.get('SFTP_USER'),
+                           password=config.get('SFTP_PASSWORD'), key_file=config.get('SFTP_KEY_FILE'),
+                           port=config_int(config, 'SFTP_PORT', 22), jobs=jobs)
+    raise ValueError(f"Unbekanntes Speicherziel: {backend}")
+
+# Nur im Speicherziel behalten, keine lokale Kopie
+def storage_only(config):
+    return (config.get('STORAGE_BACKEND') or 'none') != 'none' and \
+        not config_bool(config, 'STORAGE_KEEP_LOCAL', True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Backups im konfigurierten Speicherziel verwalten')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    put_parser = commands.add_parser('put', help='Datenstrom von stdin speichern')
+    put_parser.add_argument('name')
+
+    upload_parser = commands.add_parser('upload', help='Backup-Datei oder Verzeichnis-Backup hochladen')
+    upload_parser.add_argument('path')
+    upload_parser.add_argument('--skip-existing', action='store_true',
+                               help='Bereits vollständig übertragene Backup-Datei nicht erneut hochladen')
+
+    exists_parser = commands.add_parser('exists', help='Prüfen, ob ein Backup vorhanden ist')
+    exists_parser.add_argument('name')
+    exists_parser.add_argument('--size', type=int, help='Erwartete Größe in Bytes')
+
+    get_parser = commands.add_parser('get', help='Backup nach stdout ausgeben')
+    get_parser.add_argument('name')
+
+    commands.add_parser('list', help='Backups auflisten')
+
+    delete_parser = commands.add_parser('delete', help='Backup löschen')
+    delete_parser.add_argument('name')
+
+    args = parser.parse_args()
+    try:
+        storage = storage_from_config()
+        if storage is None:
+            print("FEHLER: Kein Speicherziel konfiguriert (STORAGE_BACKEND)", file=sys.stderr)
+            return 1
+        if args.command == 'put':
+            size = storage.put_stream(args.name, sys.stdin.buffer)
+            print(f"{args.name} gespeichert in {storage.describe()} ({size / 1024 / 1024:.1f} MB)")
+        elif args.command == 'upload':
+            name = os.path.basename(args.path.rstrip('/'))
+            if storage.upload(args.path, args.skip_existing):
+                print(f"{name} hochgeladen nach {storage.describe()}")
+            else:
+                print(f"{name} wurde während des Backups nach {storage.describe()} übertragen")
+        elif args.command == 'exists':
+            info = storage.stat(args.name)
+            if info is None or (args.size is not None and info['size'] != args.size):
+                return 1
+            print(info['size'])
+        elif args.command == 'get':
+            with contextlib.closing(storage.get_stream(args.name)) as f:
+                for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                    sys.stdout.buffer.write(block)
+        elif args.command == 'list':
+            for backup in storage.list():
+                print(f"{backup['size'] / 1024 / 1024:10.1f} MB  {backup['filename']}")
+        elif args.command == 'delete':
+            storage.delete(args.name)
+            print(f"{args.name} gelöscht aus {storage.describe()}")
+    except Exception as e:
+        print(f"FEHLER: {args.command} im Speicherziel fehlgeschlagen: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
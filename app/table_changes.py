@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Erkennung unveränderter Tabellen für die tabellenweise Sicherung
+#
+# Unter der globalen Lesesperre, die den gemeinsamen Snapshot startet, wird der
+# Stand jeder Tabelle aus information_schema.TABLES gelesen (UPDATE_TIME,
+# geschätzte Zeilen, Datengröße) und zusammen mit einer Prüfsumme der
+# Tabellenstruktur im Manifest abgelegt. Beim nächsten Lauf werden Tabellen, deren
+# Stand sich gegenüber dem letzten tabellenweisen Backup derselben Datenbank nicht
+# geändert hat, nicht erneut gesichert: Ihre Dateien werden aus dem letzten Backup
+# als harte Links übernommen. Jedes Backup-Verzeichnis bleibt damit vollständig
+# und unabhängig von der Aufbewahrung älterer Backups.
+#
+# Modi (DB_[ID]_CHANGE_DETECTION):
+#   off       alle Tabellen sichern (Standard)
+#   metadata  unverändert, wenn UPDATE_TIME, Zeilen, Größe und Struktur gleich sind
+#             (Tabellen ohne UPDATE_TIME werden immer gesichert)
+#   checksum  zusätzlich CHECKSUM TABLE im Snapshot; erkennt auch Tabellen ohne
+#             UPDATE_TIME (z.B. InnoDB nach einem Neustart des Servers)
+
+import os
+import shutil
+import hashlib
+import threading
+from dumper import quote_identifier
+
+CHANGE_DETECTION_MODES = ('off', 'metadata', 'checksum')
+
+def normalize_mode(mode):
+    mode = (mode or 'off').lower()
+    return mode if mode in CHANGE_DETECTION_MODES else 'off'
+
+# Stand aller Tabellen einer Datenbank (unter der globalen Lesesperre aufzurufen)
+def read_table_states(connection, database):
+    with connection.cursor() as cursor:
+        # MySQL 8 liefert information_schema.TABLES sonst bis zu 24 Stunden alt aus dem Cache
+        try:
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        cursor.execute("SELECT NOW()")
+        captured = str(cursor.fetchone()[0])
+        cursor.execute(
+            "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS, DATA_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'", (database,))
+        return {name: {'update_time': str(update_time) if update_time else None,
+                       'rows': int(rows or 0), 'data_length': int(data_length or 0), 'captured': captured}
+                for name, update_time, rows, data_length in cursor.fetchall()}
+
+# Prüfsumme der Tabellenstruktur (CREATE TABLE)
+def schema_digest(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SHOW CREATE TABLE {quote_identifier(table)}")
+        return hashlib.sha256(cursor.fetchone()[1].encode()).hexdigest()[:16]
+
+def table_checksum(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"CHECKSUM TABLE {quote_identifier(table)}")
+        row = cursor.fetchone()
+    return int(row[1]) if row and row[1] is not None else None
+
+# CHECKSUM TABLE für mehrere Tabellen, verteilt auf die Verbindungen des Snapshots
+def checksum_tables(connections, tables):
+    pending = list(tables)
+    checksums = {}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(connection):
+        while not errors:
+            with lock:
+                if not pending:
+                    return
+                table = pending.pop()
+            try:
+                checksums[table] = table_checksum(connection, table)
+            except Exception as e:
+                errors.append(f"CHECKSUM TABLE {table}: {e}")
+
+    threads = [threading.Thread(target=worker, args=(connection,), daemon=True) for connection in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError('; '.join(errors))
+    return checksums
+
+# Letztes vollständiges tabellenweises Backup derselben Datenbank im Backup-Verzeichnis
+def find_previous_backup(output_dir, db_id, database):
+    from parallel_dump import MANIFEST_FILE, load_manifest
+    backup_dir = os.path.dirname(os.path.abspath(output_dir))
+    prefix = f"mysql_backup_{db_id}_{database}_"
+    previous = None
+    for entry in os.scandir(backup_dir):
+        if not entry.name.startswith(prefix) or not entry.is_dir() or \
+                os.path.abspath(entry.path) == os.path.abspath(output_dir) or \
+                not os.path.isfile(os.path.join(entry.path, MANIFEST_FILE)):
+            continue
+        try:
+            manifest = load_manifest(entry.path)
+        except (OSError, ValueError):
+            continue
+        if str(manifest.get('db_id')) != str(db_id) or manifest.get('database') != database:
+            continue
+        if not previous or manifest.get('created', '') > previous[1].get('created', ''):
+            previous = (entry.path, manifest)
+    return previous
+
+# Zeigen die Metadaten eine Änderung gegenüber dem vorherigen Stand?
+def metadata_changed(state, previous):
+    if state.get('schema') != previous.get('schema'):
+        return True
+    if state['rows'] != previous.get('rows') or state['data_length'] != previous.get('data_length'):
+        return True
+    return bool(state['update_time'] and previous.get('update_time') and
+                state['update_time'] != previous['update_time'])
+
+# Belegen die Metadaten allein, dass die Tabelle unverändert ist?
+# UPDATE_TIME hat nur Sekunden; eine Änderung in der Sekunde, in der der vorherige
+# Stand gelesen wurde, wäre nicht zu erkennen.
+def metadata_unchanged(state, previous):
+    return (not metadata_changed(state, previous) and state['update_time'] is not None and
+            state['update_time'] == previous.get('update_time') and
+            state['update_time'] < previous.get('captured', ''))
+
+# Tabellen, die sich seit dem vorherigen Backup nicht geändert haben
+# states: Stand der aktuellen Tabellen (mit 'schema'); previous_tables: Manifest-Einträge des vorherigen Backups
+# Im Modus checksum wird states um die Prüfsummen ergänzt.
+def unchanged_tables(mode, states, previous_tables, connections):
+    candidates = {}
+    for name, state in states.items():
+        previous = previous_tables.get(name, {}).get('state')
+        if previous and not metadata_changed(state, previous):
+            candidates[name] = previous
+    if mode == 'checksum':
+        for name, checksum in checksum_tables(connections, candidates).items():
+            states[name]['checksum'] = checksum
+        # Ohne vorherige Prüfsumme (z.B. nach Wechsel des Modus) entscheiden die Metadaten
+        return {name for name, previous in candidates.items()
+                if (states[name].get('checksum') is not None and states[name]['checksum'] == previous.get('checksum'))
+                or (previous.get('checksum') is None and metadata_unchanged(states[name], previous))}
+    return {name for name, previous in candidates.items() if metadata_unchanged(states[name], previous)}
+
+# Übernimm die Dateien einer Tabelle aus dem vorherigen Backup (harte Links, sonst Kopie)
+def reuse_table_files(previous_dir, output_dir, files):
+    for name in files:
+        source = os.path.join(previous_dir, name)
+        target = os.path.join(output_dir, name)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+# Sind alle Dateien einer Tabelle im vorherigen Backup noch vorhanden?
+def files_present(previous_dir, files):
+    return all(os.path.isfile(os.path.join(previous_dir, name)) for name in files)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Lastabhängige Drosselung und Bandbreitengrenzen der Backups
+#
+# Der Messpunkt hinter dem Dump (profiler.py probe --throttle-db <id>) bzw. die
+# tabellenweise Sicherung zwischen zwei Teilbereichen fragt alle
+# THROTTLE_INTERVAL Sekunden über eine eigene Verbindung die Last des MySQL-Servers
+# ab: laufende Threads (Threads_running), Replikationsverzögerung (bei Replikaten)
+# und die Länge der InnoDB-History. Überschreitet ein Wert seine Schwelle, wird der
+# Dump-Strom halbiert; bei mehr als der doppelten Schwelle hält er an, bis die Last
+# sinkt. mysqldump bzw. die Python-Engine warten dann beim Schreiben und belasten
+# den Server nicht. Eine Pause dauert höchstens THROTTLE_MAX_PAUSE Sekunden, danach
+# fließen die Daten mit der Mindestrate weiter, damit der Server die Verbindung
+# nicht wegen net_write_timeout trennt. Sinkt die Last unter 80 % der Schwellen,
+# wird die Rate wieder verdoppelt, bis sie nicht mehr bremst.
+#
+# Die InnoDB-History kann den Dump nur verlangsamen, nicht anhalten: Der Dump hält
+# selbst eine Snapshot-Transaktion offen (--single-transaction bzw. START TRANSACTION
+# WITH CONSISTENT SNAPSHOT), die den Purge aufhält. Während einer Pause würde die
+# History daher weiter wachsen und die Pause bis zu THROTTLE_MAX_PAUSE verlängern.
+#
+# Unabhängig davon begrenzen THROTTLE_WRITE_LIMIT das Schreiben der Backup-Datei
+# (Messpunkt hinter der Kompression) und THROTTLE_SMB_LIMIT die Übertragung auf den
+# SMB-Share (jeweils MB/s, 0 = unbegrenzt).
+#
+# Aufruf aus backup.sh:
+#   throttle.py limit <MB/s> < quelle > ziel   Datenstrom mit begrenzter Bandbreite kopieren
+#   throttle.py status <db_id>                 Aktuelle Last eines Servers anzeigen
+
+import sys
+import time
+import argparse
+import threading
+from backup_config import load_settings
+
+# Schwellen der Last: Konfiguration, Bezeichnung (0 = nicht geprüft)
+LOAD_THRESHOLDS = (
+    ('threads_running', 'THROTTLE_THREADS_RUNNING', 'laufende Threads'),
+    ('replication_lag', 'THROTTLE_REPLICATION_LAG', 'Replikationsverzögerung (s)'),
+    ('history_length', 'THROTTLE_HISTORY_LENGTH', 'InnoDB-History')
+)
+
+# Sekunden zwischen zwei Abfragen der Last
+DEFAULT_INTERVAL = 5
+
+# Längste Pause in Sekunden (mysqldump wird vom Server nach net_write_timeout, Standard 60 s, getrennt)
+DEFAULT_MAX_PAUSE = 30
+
+# Ab diesem Vielfachen einer Schwelle wird pausiert, unterhalb dieses Anteils wieder beschleunigt
+PAUSE_FACTOR = 2.0
+RESUME_RATIO = 0.8
+
+# Höchstes Verhältnis für Werte, die während einer offenen Snapshot-Transaktion nur verlangsamen
+SLOW_ONLY_RATIO = 1.5
+
+# Werte, die der Dump mit seiner Snapshot-Transaktion selbst erhöht
+SNAPSHOT_BOUND = ('history_length',)
+
+# Mindestrate in Bytes pro Sekunde, mit der auch bei hoher Last weitergesichert wird
+MIN_RATE = 256 * 1024
+
+# Prüfintervall während einer Pause in Sekunden
+PAUSE_POLL = 0.5
+
+# Blockgröße von throttle.py limit
+LIMIT_BLOCK_SIZE = 256 * 1024
+
+# Schwellen aus der Konfiguration (BackupSettings, 0 = nicht geprüft)
+def load_thresholds(settings):
+    return {key: getattr(settings, f'throttle_{key}') for key, _, _ in LOAD_THRESHOLDS}
+
+def megabytes_per_second(value):
+    try:
+        rate = float(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return int(rate * 1024 * 1024) if rate > 0 else None
+
+# Begrenze die Datenrate (Token-Bucket mit höchstens einer Sekunde Vorlauf); rate None = unbegrenzt
+class RateLimiter:
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.allowance = 0.0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.allowance = 0.0
+            self.last = time.monotonic()
+
+    # Verbrauche size Bytes und warte, bis sie in die Rate passen; liefert die Wartezeit
+    def consume(self, size):
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self.allowance = min(float(self.rate), self.allowance + (now - self.last) * self.rate) - size
+            self.last = now
+            delay = -self.allowance / self.rate if self.allowance < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+# Aktuelle Last eines MySQL-Servers; nicht verfügbare Werte fehlen
+def sample_load(connection):
+    load = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_running', 'Innodb_history_list_length')")
+        status = {name.lower(): value for name, value in cursor.fetchall()}
+        if 'threads_running' in status:
+            load['threads_running'] = int(status['threads_running'])
+        if 'innodb_history_list_length' in status:
+            # MariaDB
+            load['history_length'] = int(status['innodb_history_list_length'])
+        else:
+            try:
+                cursor.execute("SELECT `COUNT` FROM information_schema.INNODB_METRICS "
+                               "WHERE NAME = 'trx_rseg_history_len'")
+                row = cursor.fetchone()
+                if row:
+                    load['history_length'] = int(row[0])
+            except Exception:
+                # INNODB_METRICS benötigt das Recht PROCESS
+                pass
+        # SHOW REPLICA STATUS ab MySQL 8.0.22 und MariaDB 10.5, sonst SHOW SLAVE STATUS
+        for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                cursor.execute(statement)
+            except Exception:
+                continue
+            row = cursor.fetchone()
+            if row:
+                fields = dict(zip([field[0] for field in cursor.description], row))
+                value = fields.get('Seconds_Behind_Source', fields.get('Seconds_Behind_Master'))
+                if value is not None:
+                    load['replication_lag'] = int(value)
+            break
+    return load
+
+# Verhältnis der Last zu den Schwellen (größter Wert) und der auslösende Wert
+# slow_only: Werte, die höchstens zum Verlangsamen führen (Verhältnis auf SLOW_ONLY_RATIO begrenzt)
+def load_ratio(load, thresholds, slow_only=()):
+    ratio, reason = 0.0, None
+    for key, threshold in thresholds.items():
+        if key not in load:
+            continue
+        value = load[key] / threshold
+        if key in slow_only:
+            value = min(value, SLOW_ONLY_RATIO)
+        if value > ratio:
+            ratio = value
+            label = next(label for name, _, label in LOAD_THRESHOLDS if name == key)
+            reason = f"{label} {load[key]} (Schwelle {threshold})"
+    return ratio, reason
+
+# Beobachtet die Last eines MySQL-Servers in einem eigenen Thread und drosselt den Dump-Strom
+# snapshot: der überwachte Dump hält eine Snapshot-Transaktion offen (SNAPSHOT_BOUND hält ihn nicht an)
+class LoadMonitor:
+    def __init__(self, db, thresholds, interval=DEFAULT_INTERVAL, max_pause=DEFAULT_MAX_PAUSE, log=None,
+                 snapshot=True):
+        self.db = db
+        self.thresholds = thresholds
+        self.slow_only = SNAPSHOT_BOUND if snapshot else ()
+        self.interval = interval
+        self.max_pause = max_pause
+        self.log = log
+        self.limiter = RateLimiter()
+        self.trickle = RateLimiter(MIN_RATE)
+        self.state = 'normal'
+        self.pause_started = None
+        self.transferred = 0
+        self.paused_seconds = 0.0
+        self.slowed_seconds = 0.0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # Monitor aus der Konfiguration (None, wenn keine Schwelle gesetzt ist)
+    @classmethod
+    def from_config(cls, settings, db, log=None):
+        thresholds = {key: value for key, value in load_thresholds(settings).items() if value > 0}
+        if not thresholds:
+            return None
+        return cls(db, thresholds, settings.throttle_interval, settings.throttle_max_pause, log)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval)
+
+    def run(self):
+        from dumper import connect
+        connection = None
+        failing = False
+        last_sample = time.monotonic()
+        last_transferred = 0
+        while not self.stopped.wait(self.interval):
+            try:
+                if connection is None:
+                    connection = connect(self.db, autocommit=True, read_timeout=self.interval * 2)
+                load = sample_load(connection)
+                failing = False
+            except Exception as e:
+                # Ohne Messwerte nicht drosseln; die Verbindung wird beim nächsten Mal neu aufgebaut
+                if self.log and not failing:
+                    self.log(f"WARNUNG: Last von {self.db.host} nicht abfragbar: {e}")
+                failing = True
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                self.adjust(0.0, None, None)
+                continue
+            now = time.monotonic()
+            throughput = (self.transferred - last_transferred) / max(now - last_sample, 0.001)
+            last_sample, last_transferred = now, self.transferred
+            ratio, reason = load_ratio(load, self.thresholds, self.slow_only)
+            self.adjust(ratio, reason, throughput)
+        if connection is not None:
+            connection.close()
+
+    # Passe Zustand und Rate an die gemessene Last an
+    def adjust(self, ratio, reason, throughput):
+        with self.lock:
+            previous = self.state
+            if ratio >= PAUSE_FACTOR:
+                self.state = 'pause'
+                if previous != 'pause':
+                    self.pause_started = time.monotonic()
+            elif ratio > 1:
+                self.state = 'slow'
+                base = self.limiter.rate or throughput or MIN_RATE * 2
+                self.limiter.set_rate(max(MIN_RATE, int(base / 2)))
+            elif ratio < RESUME_RATIO and self.limiter.rate:
+                # Schrittweise beschleunigen; bremst die Rate nicht mehr, wird sie aufgehoben
+                if throughput is not None and throughput < self.limiter.rate / 2:
+                    self.limiter.set_rate(None)
+                else:
+                    self.limiter.set_rate(self.limiter.rate * 2)
+                self.state = 'slow' if self.limiter.rate else 'normal'
+            elif previous == 'pause':
+                self.state = 'slow' if self.limiter.rate else 'normal'
+            state, rate = self.state, self.limiter.rate
+        if self.log and state != previous:
+            if state == 'pause':
+                self.log(f"Drosselung: Dump pausiert, {reason}")
+            elif state == 'slow':
+                self.log(f"Drosselung: Dump auf {rate / 1024 / 1024:.1f} MB/s verlangsamt"
+                         f"{f', {reason}' if reason else ''}")
+            else:
+                self.log("Drosselung aufgehoben")
+
+    def paused(self):
+        with self.lock:
+            return self.state == 'pause'
+
+    # Vor dem Weiterreichen von size Bytes aufrufen; liefert die Wartezeit
+    # keep_alive: nach der längsten Pause mit der Mindestrate weiterreichen (laufender Dump-Strom),
+    # sonst mit der aktuellen Rate fortfahren (zwischen den Teilbereichen der tabellenweisen Sicherung)
+    def throttle(self, size, keep_alive=True):
+        with self.lock:
+            self.transferred += size
+        waited = 0.0
+        while self.paused():
+            if time.monotonic() - self.pause_started >= self.max_pause:
+                if not keep_alive:
+                    break
+                # Verbindung zum Server mit der Mindestrate am Leben halten
+                waited += self.trickle.consume(size)
+                self.paused_seconds += waited
+                return waited
+            time.sleep(PAUSE_POLL)
+            waited += PAUSE_POLL
+        self.paused_seconds += waited
+        delay = self.limiter.consume(size)
+        self.slowed_seconds += delay
+        return waited + delay
+
+    def summary(self):
+        return f"Drosselung: {self.paused_seconds:.0f}s pausiert, {self.slowed_seconds:.0f}s verlangsamt"
+
+# Kopiere source nach target mit höchstens rate Bytes pro Sekunde
+def copy_limited(source, target, rate):
+    limiter = RateLimiter(rate)
+    read = getattr(source, 'read1', source.read)
+    for block in iter(lambda: read(LIMIT_BLOCK_SIZE), b''):
+        limiter.consume(len(block))
+        target.write(block)
+    target.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Drosselung und Bandbreitengrenzen der Backups')
+    commands = parser.add_subparsers(dest='command', required=True)
+    limit_parser = commands.add_parser('limit', help='stdin mit begrenzter Bandbreite nach stdout kopieren')
+    limit_parser.add_argument('rate', help='MB/s (0 = unbegrenzt)')
+    status_parser = commands.add_parser('status', help='Aktuelle Last eines MySQL-Servers anzeigen')
+    status_parser.add_argument('db_id')
+    args = parser.parse_args()
+
+    if args.command == 'limit':
+        copy_limited(sys.stdin.buffer, sys.stdout.buffer, megabytes_per_second(args.rate))
+        return 0
+
+    from dumper import connect, load_database
+    db = load_database(args.db_id)
+    if not db:
+        print(f"FEHLER: Datenbank mit ID {args.db_id} nicht gefunden!", file=sys.stderr)
+        return 1
+    thresholds = load_thresholds(load_settings())
+    try:
+        connection = connect(db, autocommit=True)
+        try:
+            load = sample_load(connection)
+        finally:
+            connection.close()
+    except Exception as e:
+        print(f"FEHLER: Last nicht abfragbar: {e}", file=sys.stderr)
+        return 1
+    for key, _, label in LOAD_THRESHOLDS:
+        threshold = f" (Schwelle {thresholds[key]})" if thresholds[key] else ''
+        print(f"{label:<30} {load.get(key, '-')}{threshold}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Reproduzierbarer Benchmark des gesamten Backup-Pfads
+#
+# Lädt synthetische Datenbanken in vorgegebenen Größen (gleicher Startwert =
+# gleiche Daten) und führt backup.sh für jede Kombination aus Größe, Engine,
+# Kompression und Parallelität aus. Gemessen werden Laufzeit, Durchsatz,
+# CPU-Zeit und Peak RSS aller beteiligten Prozesse sowie die Größe des Backups.
+# Die Ergebnisse landen als JSON in benchmarks/results/; mit --compare werden
+# sie mit einem früheren Lauf verglichen und Verschlechterungen gemeldet.
+#
+# Läuft im Container, weil backup.sh die Werkzeuge unter /app aufruft. Am
+# einfachsten mit dem mitgelieferten MariaDB-Server:
+#   docker compose -f benchmarks/docker-compose.yml run --rm bench --rows 100000 1000000
+#
+# Gegen einen vorhandenen Server:
+#   python3 /app/benchmarks/backup_suite.py --host 127.0.0.1 --user root --password secret
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import pymysql
+
+APP_DIR = '/app'
+BACKUP_SCRIPT = os.path.join(APP_DIR, 'scripts', 'backup.sh')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+sys.path.insert(0, APP_DIR)
+
+# Zeilen pro INSERT beim Laden der synthetischen Daten
+LOAD_BATCH_ROWS = 2000
+
+# Wortschatz der Textspalten: wiederkehrende Wörter komprimieren ähnlich wie echte Daten
+WORDS = ('bestellung', 'kunde', 'artikel', 'lieferung', 'rechnung', 'zahlung', 'versand', 'lager',
+         'rabatt', 'status', 'offen', 'erledigt', 'storniert', 'berlin', 'hamburg', 'münchen', 'köln')
+
+TABLE_SCHEMA = """
+CREATE TABLE `{table}` (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    customer_id INT UNSIGNED NOT NULL,
+    email VARCHAR(191) NOT NULL,
+    amount DECIMAL(12,2) NOT NULL,
+    created DATETIME NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    notes TEXT,
+    PRIMARY KEY (id),
+    KEY customer_id (customer_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Messwerte, bei denen ein größerer Wert schlechter ist (Verschlechterung -> Regression)
+COMPARED_METRICS = ('duration', 'cpu_seconds', 'peak_rss_mb', 'output_bytes')
+
+def connect(args, database=None):
+    return pymysql.connect(host=args.host, port=args.port, user=args.user, password=args.password,
+                           database=database, autocommit=False)
+
+# Warte, bis der Server Verbindungen annimmt (der Container braucht nach dem Start einige Sekunden)
+def wait_for_server(args):
+    deadline = time.monotonic() + args.wait
+    while True:
+        try:
+            connection = connect(args)
+        except pymysql.err.OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT VERSION()")
+            version = cursor.fetchone()[0]
+        connection.close()
+        return version
+
+def random_row(rng, row_bytes):
+    notes = []
+    length = 0
+    while length < row_bytes:
+        word = rng.choice(WORDS) if rng.random() < 0.7 else f'{rng.getrandbits(32):08x}'
+        notes.append(word)
+        length += len(word) + 1
+    return (rng.randrange(1, 100000), f'kunde{rng.randrange(1000000)}@example.org',
+            round(rng.uniform(1, 5000), 2), f'2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} 12:00:00',
+            rng.choice(WORDS[9:13]), ' '.join(notes))
+
+# Lege die synthetische Datenbank an, sofern sie nicht schon mit denselben Vorgaben existiert
+def load_dataset(args, rows):
+    database = f'{args.prefix}_{rows}'
+    spec = {'rows': rows, 'tables': args.tables, 'row_bytes': args.row_bytes, 'seed': args.seed}
+    connection = connect(args)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s "
+                           "AND TABLE_NAME = 'bench_info'", (database,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"SELECT spec FROM `{database}`.bench_info")
+                row = cursor.fetchone()
+                if row and json.loads(row[0]) == spec:
+                    print(f"{database}: bereits geladen")
+                    return database
+            print(f"{database}: lade {rows} Zeilen in {args.tables} Tabellen...")
+            started = time.monotonic()
+            cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+            cursor.execute(f"CREATE DATABASE `{database}` DEFAULT CHARSET utf8mb4")
+            cursor.execute(f"USE `{database}`")
+            for index in range(args.tables):
+                table = f'orders_{index + 1:02d}'
+                table_rows = rows // args.tables + (1 if index < rows % args.tables else 0)
+                rng = random.Random(f'{args.seed}-{table}')
+                cursor.execute(TABLE_SCHEMA.format(table=table))
+                query = (f"INSERT INTO `{table}` (customer_id, email, amount, created, status, notes) "
+                         "VALUES (%s, %s, %s, %s, %s, %s)")
+                for offset in range(0, table_rows, LOAD_BATCH_ROWS):
+                    count = min(LOAD_BATCH_ROWS, table_rows - offset)
+                    batch = [random_row(rng, args.row_bytes) for _ in range(count)]
+                    cursor.executemany(query, batch)
+                    connection.commit()
+            # Erst am Ende schreiben, damit ein abgebrochenes Laden beim nächsten Mal wiederholt wird
+            cursor.execute("CREATE TABLE bench_info (spec TEXT NOT NULL)")
+            cursor.execute("INSERT INTO bench_info VALUES (%s)", (json.dumps(spec, sort_keys=True),))
+            connection.commit()
+            print(f"{database}: geladen in {time.monotonic() - started:.1f}s")
+            return database
+    finally:
+        connection.close()
+
+# backup.conf des Benchmarks: eine Datenbank, ohne SMB und Speicherziel
+def write_config(path, args, database, engine, codec, concurrency, backup_dir):
+    lines = [
+        f'BACKUP_DIR="{backup_dir}"',
+        'BACKUP_RETENTION="1"',
+        'SMB_ENABLED="false"',
+        'STORAGE_BACKEND="none"',
+        # Parallelität: Threads der tabellenweisen Sicherung bzw. des Kompressors
+        f'CODEC_THREADS="{1 if engine == "parallel" else concurrency}"',
+        'DB_1_NAME="Benchmark"',
+        f'DB_1_HOST="{args.host}"',
+        f'DB_1_PORT="{args.port}"',
+        f'DB_1_USER="{args.user}"',
+        f'DB_1_PASSWORD="{args.password}"',
+        f'DB_1_DATABASE="{database}"',
+        f'DB_1_ENGINE="{engine}"',
+        f'DB_1_CODEC="{codec}"',
+        f'DB_1_THREADS="{concurrency}"'
+    ]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+# Größe des Dumps vor der Kompression laut Profil des Laufs (Messpunkt bzw. Manifest)
+def raw_bytes(config_dir):
+    from catalog import BackupCatalog
+    catalog = BackupCatalog(os.path.join(config_dir, 'catalog.sqlite'))
+    backups = catalog.query(per_page=1)
+    profile = catalog.get_profile(backups[0]['filename']) if backups else None
+    if not profile:
+        return None
+    raw = profile['probes'].get('raw')
+    return raw['bytes'] if raw else profile['stages'][0]['bytes']
+
+# Ein Lauf von backup.sh in einem leeren Arbeitsverzeichnis
+def run_backup(args, workdir, database, engine, codec, concurrency):
+    config_dir = os.path.join(workdir, 'config')
+    backup_dir = os.path.join(workdir, 'backups')
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(config_dir)
+    os.makedirs(backup_dir)
+    write_config(os.path.join(config_dir, 'backup.conf'), args, database, engine, codec, concurrency, backup_dir)
+    env = dict(os.environ, BACKUP_CONFIG_DIR=config_dir, BACKUP_SKIP_CLEANUP='true')
+
+    started = time.monotonic()
+    process = subprocess.Popen(['bash', BACKUP_SCRIPT, '1'], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, env=env)
+    # wait4 liefert die Ressourcennutzung von backup.sh einschließlich aller beendeten Unterprozesse
+    _, status, usage = os.wait4(process.pid, 0)
+    duration = time.monotonic() - started
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"backup.sh fehlgeschlagen ({engine}, {codec}, {concurrency}), siehe /app/logs/backup.log")
+    return {
+        'duration': duration,
+        'cpu_seconds': usage.ru_utime + usage.ru_stime,
+        # ru_maxrss ist unter Linux in KiB angegeben (größter einzelner Prozess)
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'output_bytes': directory_size(backup_dir),
+        'raw_bytes': raw_bytes(config_dir)
+    }
+
+# Fasse mehrere Läufe zusammen (Median, Peak RSS als Maximum)
+def summarize(scenario, runs, rows):
+    duration = statistics.median(run['duration'] for run in runs)
+    raw = runs[-1]['raw_bytes']
+    output = runs[-1]['output_bytes']
+    return dict(scenario, **{
+        'runs': len(runs),
+        'duration': round(duration, 3),
+        'rows': rows,
+        'rows_per_second': round(rows / duration) if duration else 0,
+        'raw_bytes': raw,
+        'mb_per_second': round(raw / 1024 / 1024 / duration, 2) if raw and duration else None,
+        'output_bytes': output,
+        'compression_ratio': round(raw / output, 2) if raw and output else None,
+        'cpu_seconds': round(statistics.median(run['cpu_seconds'] for run in runs), 3),
+        'peak_rss_mb': round(max(run['peak_rss_mb'] for run in runs), 1)
+    })
+
+def scenario_key(result):
+    return (result['rows'], result['engine'], result['codec'], result['concurrency'])
+
+# Vergleiche mit einem früheren Ergebnis; liefert die Verschlechterungen über dem Schwellwert
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {scenario_key(result): result for result in json.load(f)['results']}
+    regressions = []
+    print(f"\nVergleich mit {baseline_path} (Schwellwert {threshold:.0f}%):")
+    for result in results:
+        previous = baseline.get(scenario_key(result))
+        if not previous:
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            if not previous.get(metric) or result.get(metric) is None:
+                continue
+            change = (result[metric] - previous[metric]) / previous[metric] * 100
+            changes.append(f"{metric} {change:+.1f}%")
+            if change > threshold:
+                regressions.append((result, metric, change))
+        print(f"  {result['rows']:>9} {result['engine']:<10} {result['codec']:<5} x{result['concurrency']:<3} "
+              + ', '.join(changes))
+    for result, metric, change in regressions:
+        print(f"REGRESSION: {result['engine']}/{result['codec']}/x{result['concurrency']} "
+              f"({result['rows']} Zeilen): {metric} {change:+.1f}%")
+    return regressions
+
+def app_version():
+    try:
+        with open(os.path.join(APP_DIR, 'version.json')) as f:
+            return json.load(f).get('version', 'unbekannt')
+    except (OSError, ValueError):
+        return 'unbekannt'
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark des Backup-Pfads mit synthetischen Datenbanken')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--wait', type=int, default=120, help='Sekunden, die auf den Server gewartet wird')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000], help='Größen der Datenbanken (Zeilen)')
+    parser.add_argument('--tables', type=int, default=8, help='Tabellen pro Datenbank')
+    parser.add_argument('--row-bytes', type=int, default=200, help='Ungefähre Länge der Textspalte')
+    parser.add_argument('--seed', default='mysql-backup', help='Startwert der Zufallsdaten')
+    parser.add_argument('--prefix', default='bench', help='Präfix der Datenbanknamen')
+    parser.add_argument('--engines', nargs='+', default=['mysqldump', 'python', 'parallel'],
+                        choices=['mysqldump', 'python', 'parallel'])
+    parser.add_argument('--codecs', nargs='+', default=['gzip', 'zstd', 'lz4'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4],
+                        help='Threads der tabellenweisen Sicherung bzw. des Kompressors')
+    parser.add_argument('--repeat', type=int, default=3, help='Gemessene Läufe je Kombination')
+    parser.add_argument('--warmup', type=int, default=1, help='Ungemessene Läufe je Datenbank (Buffer Pool)')
+    parser.add_argument('--output', help='Ergebnisdatei (Standard: benchmarks/results/<Version>_<Zeit>.json)')
+    parser.add_argument('--compare', help='Früheres Ergebnis, mit dem verglichen wird')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Verschlechterung in Prozent, ab der ein Vergleich fehlschlägt')
+    args = parser.parse_args()
+
+    server_version = wait_for_server(args)
+    print(f"Server: {server_version}")
+    results = []
+    workdir = tempfile.mkdtemp(prefix='mysql-backup-bench.')
+    try:
+        for rows in args.rows:
+            database = load_dataset(args, rows)
+            for _ in range(args.warmup):
+                run_backup(args, os.path.join(workdir, 'run'), database, 'mysqldump', args.codecs[0], 1)
+            for engine in args.engines:
+                for codec in args.codecs:
+                    for concurrency in args.concurrency:
+                        scenario = {'engine': engine, 'codec': codec, 'concurrency': concurrency}
+                        runs = [run_backup(args, os.path.join(workdir, 'run'), database, engine, codec, concurrency)
+                                for _ in range(args.repeat)]
+                        result = summarize(scenario, runs, rows)
+                        results.append(result)
+                        print(f"  {engine:<10} {codec:<5} x{concurrency:<3} {result['duration']:>8.2f}s "
+                              f"{result['rows_per_second']:>9} Zeilen/s {result['cpu_seconds']:>7.2f}s CPU "
+                              f"{result['peak_rss_mb']:>7.1f} MB RSS {result['output_bytes'] / 1024 / 1024:>8.1f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    version = app_version()
+    output = args.output or os.path.join(RESULTS_DIR, f"{version}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'version': version,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'server': server_version,
+            'host': {'cpus': os.cpu_count(), 'platform': platform.platform(), 'python': platform.python_version()},
+            'dataset': {'tables': args.tables, 'row_bytes': args.row_bytes, 'seed': args.seed},
+            'repeat': args.repeat,
+            'results': results
+        }, f, indent=4)
+    print(f"Ergebnisse gespeichert: {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Vergleich der Python-Dump-Engine mit mysqldump
+#
+# Beide Engines schreiben in eine gzip-Pipe nach /dev/null. Gemessen werden
+# Laufzeit, Zeilen pro Sekunde und der maximale Speicherbedarf (Peak RSS)
+# des Dump-Prozesses.
+#
+# Beispiel:
+#   python3 benchmarks/dump_engine.py --host 127.0.0.1 --user root --password secret --database shop
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import pymysql
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMPER = os.path.join(REPO_DIR, 'app', 'dumper.py')
+
+# Anzahl der Zeilen aller Tabellen der Datenbank
+def count_rows(args, exact):
+    connection = pymysql.connect(host=args.host, port=args.port, user=args.user,
+                                 password=args.password, database=args.database)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+                           "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'", (args.database,))
+            tables = cursor.fetchall()
+            if not exact:
+                return sum(rows or 0 for _, rows in tables)
+            total = 0
+            for table, _ in tables:
+                cursor.execute(f"SELECT COUNT(*) FROM `{table.replace('`', '``')}`")
+                total += cursor.fetchone()[0]
+            return total
+    finally:
+        connection.close()
+
+# Führe den Dump-Befehl mit gzip nach /dev/null aus und miss Laufzeit und Peak RSS
+def run_pipeline(command, env=None):
+    started = time.monotonic()
+    dump = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+    compressor = subprocess.Popen(['gzip', '-6'], stdin=dump.stdout, stdout=subprocess.DEVNULL)
+    dump.stdout.close()
+    # wait4 liefert die Ressourcennutzung genau dieses Prozesses
+    _, dump_status, dump_usage = os.wait4(dump.pid, 0)
+    _, compressor_status, _ = os.wait4(compressor.pid, 0)
+    duration = time.monotonic() - started
+    if os.waitstatus_to_exitcode(dump_status) != 0 or os.waitstatus_to_exitcode(compressor_status) != 0:
+        raise RuntimeError(f"Befehl fehlgeschlagen: {' '.join(command[:1])}")
+    return {
+        'duration': duration,
+        # ru_maxrss ist unter Linux in KiB angegeben
+        'peak_rss_mb': dump_usage.ru_maxrss / 1024,
+        'cpu_seconds': dump_usage.ru_utime + dump_usage.ru_stime
+    }
+
+def mysqldump_command(args):
+    return ['mysqldump', '-h', args.host, '-P', str(args.port), '-u', args.user, f'-p{args.password}',
+            '--single-transaction', '--quick', '--lock-tables=false', args.database]
+
+def python_command(args, batch_rows):
+    return [sys.executable, DUMPER, '--host', args.host, '--port', str(args.port), '--user', args.user,
+            '--password', args.password, '--database', args.database, '--batch-rows', str(batch_rows)]
+
+# Fasse mehrere Läufe zusammen (Median)
+def summarize(engine, runs, rows):
+    duration = statistics.median(run['duration'] for run in runs)
+    return {
+        'engine': engine,
+        'runs': len(runs),
+        'duration': duration,
+        'rows': rows,
+        'rows_per_second': rows / duration if duration else 0,
+        'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+        'cpu_seconds': statistics.median(run['cpu_seconds'] for run in runs)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark: Python-Dump-Engine gegen mysqldump')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--repeat', type=int, default=3, help='Anzahl der Läufe je Engine')
+    parser.add_argument('--batch-rows', type=int, nargs='+', default=[1000],
+                        help='Zu testende Batch-Größen der Python-Engine')
+    parser.add_argument('--exact-rows', action='store_true', help='Zeilen mit COUNT(*) statt Schätzwert zählen')
+    parser.add_argument('--json', help='Ergebnisse zusätzlich als JSON in diese Datei schreiben')
+    args = parser.parse_args()
+
+    rows = count_rows(args, args.exact_rows)
+    results = []
+
+    runs = [run_pipeline(mysqldump_command(args)) for _ in range(args.repeat)]
+    results.append(summarize('mysqldump', runs, rows))
+
+    for batch_rows in args.batch_rows:
+        runs = [run_pipeline(python_command(args, batch_rows)) for _ in range(args.repeat)]
+        results.append(summarize(f'python (batch {batch_rows})', runs, rows))
+
+    print(f"{'Engine':<24} {'Dauer (s)':>10} {'Zeilen/s':>12} {'Peak RSS (MB)':>14} {'CPU (s)':>9}")
+    for result in results:
+        print(f"{result['engine']:<24} {result['duration']:>10.2f} {result['rows_per_second']:>12.0f} "
+              f"{result['peak_rss_mb']:>14.1f} {result['cpu_seconds']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'database': args.database, 'rows': rows, 'results': results}, f, indent=4)
+
+if __name__ == '__main__':
+    main()
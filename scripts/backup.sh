@@ -5,7 +5,7 @@
 # MySQL-Backup-Skript
 
 # Lese Konfiguration
-CONFIG_FILE="/app/config/backup.conf"
+CONFIG_FILE="${BACKUP_CONFIG_DIR:-/app/config}/backup.conf"
 source "$CONFIG_FILE"
 
 # Logfunktion
@@ -29,10 +29,68 @@ SMB_MOUNT=${SMB_MOUNT:-"/mnt/backup"}
 SMB_USER=${SMB_USER:-""}
 SMB_PASSWORD=${SMB_PASSWORD:-""}
 SMB_DOMAIN=${SMB_DOMAIN:-"WORKGROUP"}
+BACKUP_SKIP_CLEANUP=${BACKUP_SKIP_CLEANUP:-"false"}
+SMB_COPY_JOBS=${SMB_COPY_JOBS:-"4"}
+SMB_LOCK_FILE="/tmp/mysql-backup-smb.lock"
+CODEC_THREADS=${CODEC_THREADS:-"0"}
+REPOSITORY_DIR=${REPOSITORY_DIR:-"$BACKUP_DIR/repository"}
+STORAGE_BACKEND=${STORAGE_BACKEND:-"none"}
+STORAGE_KEEP_LOCAL=${STORAGE_KEEP_LOCAL:-"true"}
+THROTTLE_THREADS_RUNNING=${THROTTLE_THREADS_RUNNING:-"0"}
+THROTTLE_REPLICATION_LAG=${THROTTLE_REPLICATION_LAG:-"0"}
+THROTTLE_HISTORY_LENGTH=${THROTTLE_HISTORY_LENGTH:-"0"}
+THROTTLE_WRITE_LIMIT=${THROTTLE_WRITE_LIMIT:-"0"}
+THROTTLE_SMB_LIMIT=${THROTTLE_SMB_LIMIT:-"0"}
 
 # Erstelle lokales Backup-Verzeichnis, falls es nicht existiert
 mkdir -p "$BACKUP_DIR"
 
+# Schreibe den Dump-Strom von stdin komprimiert in die Backup-Datei oder als Snapshot
+# in das deduplizierende Repository (verwendet die Variablen von backup_database)
+# Der Messpunkt hinter der Kompression misst, wie lange das Schreiben die Pipeline aufhält,
+# berechnet die Prüfsumme der Backup-Datei, ohne sie danach erneut zu lesen, und begrenzt
+# die Schreibrate auf THROTTLE_WRITE_LIMIT.
+write_backup() {
+    local probe_cmd="python3 /app/profiler.py probe $compressed_stats_file --sha256"
+    if [ "$THROTTLE_WRITE_LIMIT" != "0" ]; then
+        probe_cmd="$probe_cmd --limit $THROTTLE_WRITE_LIMIT"
+    fi
+    if [ "$db_format" = "repository" ]; then
+        python3 /app/chunkstore.py --repository "$REPOSITORY_DIR" store "$BACKUP_FILE" \
+            --db-id "$db_id" --database "$db_database" 2>> /app/logs/backup.log
+    elif [ "$storage_only" = "true" ]; then
+        # Ohne lokale Kopie direkt in das Speicherziel schreiben
+        $compress_cmd | $probe_cmd | python3 /app/storage.py put "$BACKUP_FILE" >> /app/logs/backup.log 2>&1
+        local status=("${PIPESTATUS[@]}")
+        [ ${status[0]} -eq 0 ] && [ ${status[1]} -eq 0 ] && [ ${status[2]} -eq 0 ]
+    elif [ -n "$storage_stream" ]; then
+        # Komprimierten Strom gleichzeitig lokal und in das Speicherziel schreiben
+        $compress_cmd | $probe_cmd | tee "$BACKUP_DIR/$BACKUP_FILE" | stream_to_storage "$storage_stream"
+        local status=("${PIPESTATUS[@]}")
+        [ ${status[0]} -eq 0 ] && [ ${status[1]} -eq 0 ] && [ ${status[2]} -eq 0 ]
+    elif [ -n "$smb_stream" ]; then
+        # Komprimierten Strom gleichzeitig lokal und auf den SMB-Share schreiben
+        $compress_cmd | $probe_cmd | tee "$BACKUP_DIR/$BACKUP_FILE" | stream_to_smb "$smb_stream"
+        local status=("${PIPESTATUS[@]}")
+        [ ${status[0]} -eq 0 ] && [ ${status[1]} -eq 0 ] && [ ${status[2]} -eq 0 ]
+    else
+        $compress_cmd | $probe_cmd > "$BACKUP_DIR/$BACKUP_FILE"
+        local status=("${PIPESTATUS[@]}")
+        [ ${status[0]} -eq 0 ] && [ ${status[1]} -eq 0 ]
+    fi
+}
+
+# Prüfe die Exit-Codes aller Stufen einer Pipeline (Aufruf mit "${PIPESTATUS[@]}")
+# Ohne diese Prüfung zählt nur die letzte Stufe: Ein abgebrochener Dump vor write_backup
+# ergäbe sonst ein scheinbar erfolgreiches, aber unvollständiges Backup.
+pipeline_ok() {
+    local status
+    for status in "$@"; do
+        [ "$status" -eq 0 ] || return 1
+    done
+    return 0
+}
+
 # Funktion zum Erstellen eines Backups für eine Datenbank
 backup_database() {
     local db_id=$1
@@ -42,12 +100,21 @@ backup_database() {
     local db_user=$(eval echo \$DB_${db_id}_USER)
     local db_password=$(eval echo \$DB_${db_id}_PASSWORD)
     local db_database=$(eval echo \$DB_${db_id}_DATABASE)
+    local db_engine=$(eval echo \$DB_${db_id}_ENGINE)
+    local db_codec=$(eval echo \$DB_${db_id}_CODEC)
+    local db_codec_level=$(eval echo \$DB_${db_id}_CODEC_LEVEL)
+    local db_incremental=$(eval echo \$DB_${db_id}_INCREMENTAL)
+    local db_format=$(eval echo \$DB_${db_id}_FORMAT)
     
     # Setze Standardwerte, falls nicht in der Konfiguration definiert
     db_host=${db_host:-"localhost"}
     db_port=${db_port:-"3306"}
     db_user=${db_user:-"root"}
     db_password=${db_password:-""}
+    db_engine=${db_engine:-"mysqldump"}
+    db_codec=${db_codec:-"gzip"}
+    db_incremental=${db_incremental:-"false"}
+    db_format=${db_format:-"file"}
     
     # Prüfe, ob die Datenbank angegeben wurde
     if [ -z "$db_database" ]; then
@@ -55,102 +122,248 @@ backup_database() {
         return 1
     fi
     
+    # Das Repository nimmt einen einzelnen Dump-Strom auf
+    if [ "$db_format" = "repository" ] && [ "$db_engine" = "parallel" ]; then
+        log "WARNUNG: Die tabellenweise Sicherung kann nicht im Repository gespeichert werden, verwende Backup-Dateien."
+        db_format="file"
+    fi
+    if [ "$db_format" = "repository" ] && [ "$db_incremental" = "true" ]; then
+        log "WARNUNG: Inkrementelle Backups werden nur für Backup-Dateien unterstützt."
+        db_incremental="false"
+    fi
+    
+    # Volles oder inkrementelles Backup (Binlog seit dem letzten Checkpoint)
+    local backup_mode="full"
+    local master_data_opt=""
+    if [ "$db_incremental" = "true" ]; then
+        backup_mode=$(python3 /app/binlog.py mode "$db_id" 2>> /app/logs/backup.log)
+        backup_mode=${backup_mode:-"full"}
+        # Binlog-Position des Snapshots als Kommentar in den Dump schreiben
+        master_data_opt="--master-data=2"
+    fi
+    
     # Erstelle Zeitstempel für Backup-Dateinamen
     TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-    BACKUP_FILE="mysql_backup_${db_id}_${db_database}_${TIMESTAMP}.sql.gz"
+    local backup_ext=$(python3 /app/backup_codecs.py extension "$db_codec")
+    BACKUP_FILE="mysql_backup_${db_id}_${db_database}_${TIMESTAMP}${backup_ext}"
+    if [ "$db_format" = "repository" ]; then
+        # Snapshots im Repository werden unkomprimiert zerlegt, die Chunks einzeln komprimiert
+        BACKUP_FILE="mysql_backup_${db_id}_${db_database}_${TIMESTAMP}"
+    fi
+    
+    # Kompressionsbefehl für das gewählte Verfahren (pigz, zstd oder lz4)
+    local compress_cmd=$(python3 /app/backup_codecs.py compress-command "$db_codec" "$db_codec_level" "$CODEC_THREADS")
+    
+    # Einzelne Backup-Dateien bereits während des Backups in das Speicherziel schreiben
+    # (der SMB-Share erhält die Datei dann nach dem Backup)
+    local storage_stream=""
+    local storage_only="false"
+    if [ "$STORAGE_BACKEND" != "none" ] && [ "$db_format" = "file" ] && \
+        [ "$backup_mode" = "full" ] && [ "$db_engine" != "parallel" ]; then
+        storage_stream="$BACKUP_FILE"
+        if [ "$STORAGE_KEEP_LOCAL" = "false" ]; then
+            if [ "$db_incremental" = "true" ] || [ "$SMB_ENABLED" = "true" ]; then
+                log "WARNUNG: Sicherungsketten und der SMB-Share benötigen eine lokale Kopie, sie wird behalten."
+            else
+                storage_only="true"
+            fi
+        fi
+    fi
+    
+    # Sonst bereits während des Backups auf den SMB-Share schreiben (nicht bei begrenzter
+    # Bandbreite, sonst hielte die Übertragung den Dump und seine Transaktion auf)
+    local smb_stream=""
+    if [ "$SMB_ENABLED" = "true" ] && [ ! -z "$SMB_SHARE" ] && [ "$db_format" = "file" ] && \
+        [ "$THROTTLE_SMB_LIMIT" = "0" ] && \
+        [ "$backup_mode" = "full" ] && [ "$db_engine" != "parallel" ] && [ -z "$storage_stream" ]; then
+        if smb_mount; then
+            smb_stream="$SMB_MOUNT/mysql_backups/$BACKUP_FILE.part"
+        fi
+    fi
+    
+    # Dump abhängig von der Last des MySQL-Servers drosseln (siehe throttle.py)
+    local throttle_opt=""
+    if [ "$THROTTLE_THREADS_RUNNING" != "0" ] || [ "$THROTTLE_REPLICATION_LAG" != "0" ] || \
+        [ "$THROTTLE_HISTORY_LENGTH" != "0" ]; then
+        throttle_opt="--throttle-db $db_id"
+    fi
     
     log "Starte Backup der Datenbank $db_database (ID: $db_id) auf $db_host..."
+    local backup_started=$(date +%s)
+    python3 /app/metrics.py start --db-id "$db_id" --database "$db_database" --pid $$ 2>> /app/logs/backup.log
+    # Messpunkte der Pipeline (Profil des Laufs und /metrics)
+    local stats_file=$(mktemp /tmp/backup_stats.XXXXXX)
+    local compressed_stats_file="$stats_file.compressed"
+    local sink_label="Schreiben (lokale Datei)"
+    if [ "$db_format" = "repository" ]; then
+        sink_label="Repository (Zerlegen und Speichern der Chunks)"
+    elif [ "$storage_only" = "true" ]; then
+        sink_label="Schreiben (Speicherziel)"
+    elif [ -n "$storage_stream" ]; then
+        sink_label="Schreiben (lokale Datei und Speicherziel)"
+    elif [ -n "$smb_stream" ]; then
+        sink_label="Schreiben (lokale Datei und SMB-Share)"
+    fi
     
     # Führe MySQL-Backup durch
-    log "Verwende lokalen MySQL-Client für das Backup..."
-    mysqldump -h "$db_host" -P "$db_port" -u "$db_user" -p"$db_password" \
-        --single-transaction --quick --lock-tables=false \
-        "$db_database" | gzip > "$BACKUP_DIR/$BACKUP_FILE"
+    local backup_status=0
+    if [ "$backup_mode" = "incremental" ]; then
+        # Nur die Binlog-Ereignisse seit der letzten Sicherung der Kette
+        BACKUP_FILE="mysql_backup_${db_id}_${db_database}_${TIMESTAMP}.binlog${backup_ext}"
+        log "Erstelle inkrementelles Backup aus dem Binärlog..."
+        python3 /app/binlog.py incremental "$db_id" "$BACKUP_DIR/$BACKUP_FILE" 2>> /app/logs/backup.log
+        backup_status=$?
+    elif [ "$db_engine" = "parallel" ]; then
+        # Tabellenweise Sicherung in ein Verzeichnis mit Manifest
+        BACKUP_FILE="mysql_backup_${db_id}_${db_database}_${TIMESTAMP}"
+        log "Verwende tabellenweise parallele Sicherung..."
+        python3 /app/parallel_dump.py "$db_id" --output-dir "$BACKUP_DIR/$BACKUP_FILE" 2>> /app/logs/backup.log
+        backup_status=$?
+    elif [ "$db_engine" = "python" ]; then
+        log "Verwende Python-Dump-Engine für das Backup..."
+        # Im Repository enden INSERT-Anweisungen inhaltsabhängig, damit sich Chunks wiederholen
+        local stable_opt=""
+        if [ "$db_format" = "repository" ]; then
+            stable_opt="--stable-inserts"
+        fi
+        python3 /app/dumper.py "$db_id" $stable_opt 2>> /app/logs/backup.log | \
+            python3 /app/profiler.py probe "$stats_file" --rows $throttle_opt 2>> /app/logs/backup.log | write_backup
+        pipeline_ok "${PIPESTATUS[@]}"
+        backup_status=$?
+    else
+        log "Verwende lokalen MySQL-Client für das Backup (Kompression: $db_codec)..."
+        mysqldump -h "$db_host" -P "$db_port" -u "$db_user" -p"$db_password" \
+            --single-transaction --quick --lock-tables=false $master_data_opt \
+            "$db_database" | python3 /app/profiler.py probe "$stats_file" --rows $throttle_opt 2>> /app/logs/backup.log | \
+            write_backup
+        pipeline_ok "${PIPESTATUS[@]}"
+        backup_status=$?
+    fi
     
     # Prüfe, ob das Backup erfolgreich war
-    if [ $? -eq 0 ]; then
-        log "Backup erfolgreich erstellt: $BACKUP_FILE ($(du -h "$BACKUP_DIR/$BACKUP_FILE" | cut -f1))"
+    if [ $backup_status -eq 0 ]; then
+        local backup_duration=$(( $(date +%s) - backup_started ))
+        if [ "$db_format" = "repository" ]; then
+            log "Backup erfolgreich im Repository gespeichert: $BACKUP_FILE"
+        elif [ "$storage_only" = "true" ]; then
+            log "Backup erfolgreich im Speicherziel gespeichert: $BACKUP_FILE"
+        else
+            log "Backup erfolgreich erstellt: $BACKUP_FILE ($(du -h "$BACKUP_DIR/$BACKUP_FILE" | cut -f1))"
+        fi
+        
+        # Volles Backup als Beginn einer neuen Sicherungskette festhalten
+        if [ "$db_incremental" = "true" ] && [ "$backup_mode" = "full" ]; then
+            if [ "$db_engine" = "python" ]; then
+                log "WARNUNG: Die Python-Engine speichert keine Binlog-Position, inkrementelle Backups benötigen mysqldump oder die tabellenweise Sicherung."
+            else
+                python3 /app/binlog.py base "$db_id" "$BACKUP_DIR/$BACKUP_FILE" 2>> /app/logs/backup.log
+            fi
+        fi
         
+        # Backup mit Größe, Prüfsumme und Dauer in den Katalog eintragen
+        python3 /app/catalog.py record "$BACKUP_FILE" --db-id "$db_id" --database "$db_database" \
+            --engine "$db_engine" --duration $backup_duration --stats "$compressed_stats_file" >> /app/logs/backup.log 2>&1
+        # Prüfsummendatei (<backup>.sha256) sowie Bytes und Zeilen für die Integritätsprüfung festhalten
+        python3 /app/integrity.py record "$BACKUP_FILE" --stats "$stats_file" \
+            --compressed-stats "$compressed_stats_file" >> /app/logs/backup.log 2>&1
+        
+        local upload_started=$(date +%s)
+        local upload_opt=""
         # Wenn SMB aktiviert ist, kopiere das Backup auf den SMB-Share
         if [ "$SMB_ENABLED" = "true" ] && [ ! -z "$SMB_SHARE" ]; then
-            copy_to_smb "$BACKUP_FILE"
+            copy_to_smb "$BACKUP_FILE" "$db_format"
+            upload_opt="--upload-duration"
+        fi
+        
+        # Backup in das zusätzliche Speicherziel übertragen
+        if [ "$STORAGE_BACKEND" != "none" ] && [ "$storage_only" != "true" ]; then
+            copy_to_storage "$BACKUP_FILE" "$db_format"
+            upload_opt="--upload-duration"
         fi
         
+        # Messwerte des Laufs für /metrics
+        python3 /app/metrics.py record --db-id "$db_id" --database "$db_database" --pid $$ --status success \
+            --duration $backup_duration --backup "$BACKUP_FILE" --stats "$stats_file" \
+            --compressed-stats "$compressed_stats_file" --sink "$sink_label" \
+            ${upload_opt:+$upload_opt $(( $(date +%s) - upload_started ))} >> /app/logs/backup.log 2>&1
+        rm -f "$stats_file" "$compressed_stats_file"
+        
         return 0
     else
         log "FEHLER: Backup für Datenbank $db_database (ID: $db_id) fehlgeschlagen!"
+        python3 /app/metrics.py record --db-id "$db_id" --database "$db_database" --pid $$ --status failed \
+            --duration $(( $(date +%s) - backup_started )) >> /app/logs/backup.log 2>&1
+        rm -f "$stats_file" "$compressed_stats_file"
+        # Unvollständige Backups entfernen, damit sie weder als gültig gelten noch eine Kette unterbrechen
+        if [ "$db_format" = "repository" ]; then
+            python3 /app/chunkstore.py --repository "$REPOSITORY_DIR" delete "$BACKUP_FILE" >> /app/logs/backup.log 2>&1
+        elif [ -d "$BACKUP_DIR/$BACKUP_FILE" ]; then
+            rm -rf "$BACKUP_DIR/$BACKUP_FILE"
+        else
+            rm -f "$BACKUP_DIR/$BACKUP_FILE"
+        fi
+        # Unvollständige Übertragung auf den SMB-Share
+        if [ -n "$smb_stream" ]; then
+            rm -f "$smb_stream"
+        fi
+        # Der Strom kann trotz Fehler vollständig im Speicherziel angekommen sein
+        if [ -n "$storage_stream" ]; then
+            python3 /app/storage.py delete "$storage_stream" >> /app/logs/backup.log 2>&1
+        fi
         return 1
     fi
 }
 
-# Funktion zum Kopieren eines Backups auf den SMB-Share
-copy_to_smb() {
-    local backup_file=$1
-    
-    log "Kopiere Backup auf SMB-Share $SMB_SHARE..."
-    
-    # Erstelle Mount-Verzeichnis, falls es nicht existiert
+# Hänge den SMB-Share ein, sofern er nicht bereits eingehängt ist
+# Parallel laufende Backups nutzen denselben Mount; er wird erst am Ende des Laufs
+# ausgehängt (siehe smb_unmount). Solange dieser Prozess läuft, hält er eine gemeinsame
+# Sperre, damit kein anderer Prozess den Share unter ihm aushängt.
+smb_mount() {
     mkdir -p "$SMB_MOUNT"
-    log "Mount-Verzeichnis: $SMB_MOUNT"
     
-    # Prüfe, ob das SMB-Share erreichbar ist
-    ping -c 1 $(echo "$SMB_SHARE" | cut -d'/' -f3) > /dev/null 2>&1
-    if [ $? -ne 0 ]; then
-        log "WARNUNG: SMB-Server scheint nicht erreichbar zu sein. Ping fehlgeschlagen."
-    fi
-    
-    # Mounte SMB-Share mit detailliertem Logging
-    log "Versuche SMB-Share zu mounten..."
-    MOUNT_CMD=""
-    MOUNT_LOG=""
-    
-    if [ -z "$SMB_PASSWORD" ]; then
-        # Ohne Passwort
-        log "Mount ohne Passwort mit Benutzer: $SMB_USER, Domain: $SMB_DOMAIN"
-        MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",domain=\"$SMB_DOMAIN\",vers=3.0"
-        MOUNT_LOG=$(eval $MOUNT_CMD 2>&1)
-        MOUNT_STATUS=$?
-    else
-        # Mit Passwort
-        log "Mount mit Passwort mit Benutzer: $SMB_USER, Domain: $SMB_DOMAIN"
-        MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",password=\"********\",domain=\"$SMB_DOMAIN\",vers=3.0"
-        MOUNT_LOG=$(mount -t cifs "$SMB_SHARE" "$SMB_MOUNT" -o username="$SMB_USER",password="$SMB_PASSWORD",domain="$SMB_DOMAIN",vers=3.0 2>&1)
-        MOUNT_STATUS=$?
+    if [ "$SMB_LOCK_HELD" != "true" ]; then
+        exec 8> "$SMB_LOCK_FILE"
+        flock -s 8
+        SMB_LOCK_HELD=true
     fi
     
-    # Prüfe, ob das Mounten erfolgreich war
-    if [ $MOUNT_STATUS -eq 0 ]; then
-        log "SMB-Share erfolgreich gemountet."
-        
-        # Erstelle Backup-Verzeichnis auf dem Share, falls es nicht existiert
-        log "Erstelle Backup-Verzeichnis auf dem Share: $SMB_MOUNT/mysql_backups"
-        mkdir -p "$SMB_MOUNT/mysql_backups"
+    (
+        # Nur ein Prozess hängt den Share gleichzeitig ein
+        flock -x 9
+        if mountpoint -q "$SMB_MOUNT"; then
+            exit 0
+        fi
         
+        # Prüfe, ob das SMB-Share erreichbar ist
+        ping -c 1 $(echo "$SMB_SHARE" | cut -d'/' -f3) > /dev/null 2>&1
         if [ $? -ne 0 ]; then
-            log "FEHLER: Konnte Backup-Verzeichnis auf dem Share nicht erstellen. Prüfe die Berechtigungen."
-        else
-            # Kopiere Backup-Datei
-            log "Kopiere Backup-Datei: $backup_file ($(du -h "$BACKUP_DIR/$backup_file" | cut -f1))"
-            cp "$BACKUP_DIR/$backup_file" "$SMB_MOUNT/mysql_backups/"
-            
-            # Prüfe, ob das Kopieren erfolgreich war
-            if [ $? -eq 0 ]; then
-                log "Backup erfolgreich auf SMB-Share kopiert: $SMB_MOUNT/mysql_backups/$backup_file"
-            else
-                log "FEHLER: Kopieren auf SMB-Share fehlgeschlagen! Prüfe die Berechtigungen und den verfügbaren Speicherplatz."
-            fi
+            log "WARNUNG: SMB-Server scheint nicht erreichbar zu sein. Ping fehlgeschlagen."
         fi
         
-        # Unmounte SMB-Share
-        log "Unmounte SMB-Share..."
-        umount "$SMB_MOUNT"
+        # Mounte SMB-Share mit detailliertem Logging
+        log "Versuche SMB-Share $SMB_SHARE unter $SMB_MOUNT zu mounten..."
+        MOUNT_CMD=""
+        MOUNT_LOG=""
         
-        if [ $? -ne 0 ]; then
-            log "WARNUNG: Konnte SMB-Share nicht unmounten. Möglicherweise wird es noch verwendet."
+        if [ -z "$SMB_PASSWORD" ]; then
+            # Ohne Passwort
+            log "Mount ohne Passwort mit Benutzer: $SMB_USER, Domain: $SMB_DOMAIN"
+            MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",domain=\"$SMB_DOMAIN\",vers=3.0"
+            MOUNT_LOG=$(eval $MOUNT_CMD 2>&1)
+            MOUNT_STATUS=$?
         else
-            log "SMB-Share erfolgreich unmountet."
+            # Mit Passwort
+            log "Mount mit Passwort mit Benutzer: $SMB_USER, Domain: $SMB_DOMAIN"
+            MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",password=\"********\",domain=\"$SMB_DOMAIN\",vers=3.0"
+            MOUNT_LOG=$(mount -t cifs "$SMB_SHARE" "$SMB_MOUNT" -o username="$SMB_USER",password="$SMB_PASSWORD",domain="$SMB_DOMAIN",vers=3.0 2>&1)
+            MOUNT_STATUS=$?
+        fi
+        
+        # Prüfe, ob das Mounten erfolgreich war
+        if [ $MOUNT_STATUS -eq 0 ]; then
+            log "SMB-Share erfolgreich gemountet."
+            exit 0
         fi
-    else
         log "FEHLER: Mounten des SMB-Shares fehlgeschlagen!"
         log "Mount-Befehl: $MOUNT_CMD"
         log "Mount-Fehler: $MOUNT_LOG"
@@ -160,76 +373,223 @@ copy_to_smb() {
         log "  - Existiert der Share auf dem Server?"
         log "  - Sind die Berechtigungen korrekt konfiguriert?"
         log "  - Ist die SMB-Version kompatibel? (Versuche ggf. vers=2.0 oder vers=1.0)"
+        exit 1
+    ) 9> "$SMB_LOCK_FILE.mount"
+    [ $? -eq 0 ] || return 1
+    
+    # Erstelle Backup-Verzeichnis auf dem Share, falls es nicht existiert
+    mkdir -p "$SMB_MOUNT/mysql_backups"
+    if [ $? -ne 0 ]; then
+        log "FEHLER: Konnte Backup-Verzeichnis auf dem Share nicht erstellen. Prüfe die Berechtigungen."
+        return 1
+    fi
+    return 0
+}
+
+# Hänge den SMB-Share am Ende des Laufs aus, sofern ihn kein anderes Backup mehr verwendet
+# Auch ohne eigenen Mount (z.B. "--cleanup" ohne abgelaufene Backups nach parallelen Backups,
+# die den Share eingehängt gelassen haben) wird die Sperre genommen und ausgehängt.
+smb_unmount() {
+    if [ "$SMB_ENABLED" != "true" ] || ! mountpoint -q "$SMB_MOUNT"; then
+        return 0
+    fi
+    if [ "$SMB_LOCK_HELD" != "true" ]; then
+        exec 8> "$SMB_LOCK_FILE"
+        SMB_LOCK_HELD=true
+    fi
+    if ! flock -x -n 8; then
+        log "SMB-Share wird noch von anderen Backups verwendet und bleibt eingehängt."
+        return 0
+    fi
+    
+    log "Unmounte SMB-Share..."
+    umount "$SMB_MOUNT"
+    
+    if [ $? -ne 0 ]; then
+        log "WARNUNG: Konnte SMB-Share nicht unmounten. Möglicherweise wird es noch verwendet."
+    else
+        log "SMB-Share erfolgreich unmountet."
+    fi
+}
+
+# Schreibe stdin während des Backups auf den SMB-Share
+# Bricht die Übertragung ab, wird der Rest verworfen, damit das lokale Backup weiterläuft;
+# copy_to_smb kopiert die Datei dann nach dem Backup.
+stream_to_smb() {
+    local target=$1
+    if ! cat > "$target"; then
+        log "WARNUNG: Übertragung auf den SMB-Share während des Backups fehlgeschlagen, die Datei wird anschließend kopiert."
+        rm -f "$target"
+        cat > /dev/null
+    fi
+    return 0
+}
+
+# Kopiere eine Datei auf den SMB-Share, mit THROTTLE_SMB_LIMIT (bzw. rate) MB/s begrenzt
+smb_copy() {
+    local source=$1
+    local target=$2
+    local rate=${3:-$THROTTLE_SMB_LIMIT}
+    if [ "$rate" = "0" ]; then
+        cp "$source" "$target"
+    else
+        python3 /app/throttle.py limit "$rate" < "$source" > "$target"
+    fi
+}
+export -f smb_copy
+
+# Kopiere ein tabellenweises Backup mit mehreren Dateien gleichzeitig
+# Das Manifest wird zuletzt kopiert, erst damit ist das Backup auf dem Share vollständig.
+# Die Bandbreitengrenze wird auf die gleichzeitigen Kopien aufgeteilt.
+copy_directory_to_smb() {
+    local source=$1
+    local target=$2
+    local rate=$(awk -v limit="$THROTTLE_SMB_LIMIT" -v jobs="$SMB_COPY_JOBS" 'BEGIN { print limit / jobs }')
+    
+    mkdir -p "$target" || return 1
+    find "$source" -maxdepth 1 -type f ! -name manifest.json -print0 | \
+        xargs -0 -r -P "$SMB_COPY_JOBS" -I{} bash -c 'smb_copy "$1" "$2/$(basename "$1")" "$3"' _ {} "$target" "$rate" \
+        || return 1
+    smb_copy "$source/manifest.json" "$target/manifest.json"
+}
+
+# Funktion zum Kopieren eines Backups auf den SMB-Share
+copy_to_smb() {
+    local backup_file=$1
+    local backup_format=${2:-"file"}
+    local target_dir="$SMB_MOUNT/mysql_backups"
+    
+    log "Kopiere Backup auf SMB-Share $SMB_SHARE..."
+    if ! smb_mount; then
+        return 1
+    fi
+    
+    if [ "$backup_format" = "repository" ]; then
+        # Nur die Chunks übertragen, die im Repository auf dem Share noch fehlen
+        log "Übertrage Snapshot $backup_file in das Repository auf dem Share..."
+        local sync_output
+        sync_output=$(python3 /app/chunkstore.py --repository "$REPOSITORY_DIR" sync "$backup_file" \
+            --to "$target_dir/repository" 2>> /app/logs/backup.log)
+        local copy_status=$?
+        log "$sync_output"
+    elif [ -d "$BACKUP_DIR/$backup_file" ]; then
+        log "Kopiere Verzeichnis-Backup: $backup_file ($(du -sh "$BACKUP_DIR/$backup_file" | cut -f1), $SMB_COPY_JOBS Dateien parallel)"
+        copy_directory_to_smb "$BACKUP_DIR/$backup_file" "$target_dir/$backup_file"
+        local copy_status=$?
+    elif [ -f "$target_dir/$backup_file.part" ] && \
+        [ "$(stat -c %s "$target_dir/$backup_file.part")" = "$(stat -c %s "$BACKUP_DIR/$backup_file")" ]; then
+        # Die Datei wurde bereits während des Backups übertragen
+        log "Backup-Datei wurde während des Backups übertragen: $backup_file"
+        mv "$target_dir/$backup_file.part" "$target_dir/$backup_file"
+        local copy_status=$?
+    else
+        # Kopiere Backup-Datei (unter temporärem Namen, damit keine halbe Datei sichtbar ist)
+        log "Kopiere Backup-Datei: $backup_file ($(du -h "$BACKUP_DIR/$backup_file" | cut -f1))"
+        rm -f "$target_dir/$backup_file.part"
+        smb_copy "$BACKUP_DIR/$backup_file" "$target_dir/$backup_file.part" && \
+            mv "$target_dir/$backup_file.part" "$target_dir/$backup_file"
+        local copy_status=$?
+    fi
+    
+    # Metadaten der Sicherungskette und Prüfsummendatei mitkopieren
+    if [ $copy_status -eq 0 ] && [ -f "$BACKUP_DIR/$backup_file.meta.json" ]; then
+        cp "$BACKUP_DIR/$backup_file.meta.json" "$target_dir/"
+        copy_status=$?
+    fi
+    if [ $copy_status -eq 0 ] && [ -f "$BACKUP_DIR/$backup_file.sha256" ]; then
+        cp "$BACKUP_DIR/$backup_file.sha256" "$target_dir/"
+        copy_status=$?
+    fi
+    
+    # Prüfe, ob das Kopieren erfolgreich war
+    if [ $copy_status -eq 0 ]; then
+        log "Backup erfolgreich auf SMB-Share kopiert: $target_dir/$backup_file"
+    else
+        log "FEHLER: Kopieren auf SMB-Share fehlgeschlagen! Prüfe die Berechtigungen und den verfügbaren Speicherplatz."
+    fi
+    return $copy_status
+}
+
+# Schreibe stdin während des Backups in das Speicherziel
+# Bricht die Übertragung ab, wird der Rest verworfen, damit das lokale Backup weiterläuft;
+# copy_to_storage lädt die Datei dann nach dem Backup hoch.
+stream_to_storage() {
+    local name=$1
+    if ! python3 /app/storage.py put "$name" >> /app/logs/backup.log 2>&1; then
+        log "WARNUNG: Übertragung in das Speicherziel während des Backups fehlgeschlagen, die Datei wird anschließend hochgeladen."
+        cat > /dev/null
+    fi
+    return 0
+}
+
+# Funktion zum Übertragen eines Backups in das Speicherziel (STORAGE_BACKEND)
+copy_to_storage() {
+    local backup_file=$1
+    local backup_format=${2:-"file"}
+    
+    if [ "$backup_format" = "repository" ]; then
+        log "WARNUNG: Snapshots im Repository werden nicht in das Speicherziel übertragen."
+        return 0
     fi
+    
+    log "Übertrage Backup in das Speicherziel ($STORAGE_BACKEND)..."
+    local upload_output
+    upload_output=$(python3 /app/storage.py upload "$BACKUP_DIR/$backup_file" --skip-existing 2>> /app/logs/backup.log)
+    local upload_status=$?
+    if [ $upload_status -eq 0 ]; then
+        log "$upload_output"
+    else
+        log "FEHLER: Übertragung in das Speicherziel fehlgeschlagen! Details in backup.log."
+    fi
+    return $upload_status
 }
 
-# Funktion zum Löschen alter Backups
+# Lösche abgelaufene Backups nach den Aufbewahrungsregeln (siehe retention.py)
+# Der Plan kommt aus dem Backup-Katalog, der über record/remove aktuell gehalten wird; die
+# Backup-Verzeichnisse werden dafür nicht durchsucht. Der SMB-Share wird nur eingehängt, wenn
+# etwas zu löschen ist.
 cleanup_old_backups() {
-    if [ "$BACKUP_RETENTION" -gt 0 ]; then
-        log "Lösche Backups, die älter als $BACKUP_RETENTION Tage sind..."
-        
-        # Lokale Backups
-        log "Lösche alte lokale Backups..."
-        DELETED_COUNT=$(find "$BACKUP_DIR" -name "mysql_backup_*.sql.gz" -type f -mtime +$BACKUP_RETENTION -print | wc -l)
-        find "$BACKUP_DIR" -name "mysql_backup_*.sql.gz" -type f -mtime +$BACKUP_RETENTION -delete
-        log "Gelöschte lokale Backups: $DELETED_COUNT"
-        
-        # SMB-Backups, falls aktiviert
-        if [ "$SMB_ENABLED" = "true" ] && [ ! -z "$SMB_SHARE" ]; then
-            log "Lösche alte Backups auf dem SMB-Share..."
-            
-            # Mounte SMB-Share erneut
-            log "Mounte SMB-Share erneut für die Bereinigung..."
-            MOUNT_CMD=""
-            MOUNT_LOG=""
-            
-            if [ -z "$SMB_PASSWORD" ]; then
-                # Ohne Passwort
-                MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",domain=\"$SMB_DOMAIN\",vers=3.0"
-                MOUNT_LOG=$(eval $MOUNT_CMD 2>&1)
-                MOUNT_STATUS=$?
-            else
-                # Mit Passwort
-                MOUNT_CMD="mount -t cifs \"$SMB_SHARE\" \"$SMB_MOUNT\" -o username=\"$SMB_USER\",password=\"********\",domain=\"$SMB_DOMAIN\",vers=3.0"
-                MOUNT_LOG=$(mount -t cifs "$SMB_SHARE" "$SMB_MOUNT" -o username="$SMB_USER",password="$SMB_PASSWORD",domain="$SMB_DOMAIN",vers=3.0 2>&1)
-                MOUNT_STATUS=$?
-            fi
-            
-            if [ $MOUNT_STATUS -eq 0 ]; then
-                log "SMB-Share erfolgreich für die Bereinigung gemountet."
-                
-                # Prüfe, ob das Backup-Verzeichnis existiert
-                if [ -d "$SMB_MOUNT/mysql_backups" ]; then
-                    # Zähle zu löschende Dateien
-                    SMB_DELETED_COUNT=$(find "$SMB_MOUNT/mysql_backups" -name "mysql_backup_*.sql.gz" -type f -mtime +$BACKUP_RETENTION -print | wc -l)
-                    
-                    # Lösche alte Backups
-                    find "$SMB_MOUNT/mysql_backups" -name "mysql_backup_*.sql.gz" -type f -mtime +$BACKUP_RETENTION -delete
-                    
-                    log "Gelöschte Backups auf dem SMB-Share: $SMB_DELETED_COUNT"
-                else
-                    log "Backup-Verzeichnis auf dem SMB-Share nicht gefunden."
-                fi
-                
-                # Unmounte SMB-Share
-                log "Unmounte SMB-Share nach der Bereinigung..."
-                umount "$SMB_MOUNT"
-                
-                if [ $? -ne 0 ]; then
-                    log "WARNUNG: Konnte SMB-Share nach der Bereinigung nicht unmounten."
-                else
-                    log "SMB-Share nach der Bereinigung erfolgreich unmountet."
-                fi
-            else
-                log "FEHLER: Konnte SMB-Share für die Bereinigung nicht mounten."
-                log "Mount-Fehler: $MOUNT_LOG"
-            fi
+    local expired=$(python3 /app/retention.py plan --count 2>> /app/logs/backup.log)
+    if [ -z "$expired" ]; then
+        log "FEHLER: Aufbewahrungsregeln konnten nicht angewendet werden! Details in backup.log."
+        return 1
+    fi
+    if [ "$expired" -eq 0 ]; then
+        log "Keine abgelaufenen Backups."
+        return 0
+    fi
+    log "Lösche $expired abgelaufene Backups..."
+    
+    local smb_opt=()
+    if [ "$SMB_ENABLED" = "true" ] && [ ! -z "$SMB_SHARE" ]; then
+        # Der Share ist nach den Backups meist noch eingehängt
+        if smb_mount; then
+            smb_opt=(--smb-dir "$SMB_MOUNT/mysql_backups")
+        else
+            log "FEHLER: Konnte SMB-Share für die Bereinigung nicht mounten."
         fi
     fi
+    python3 /app/retention.py apply "${smb_opt[@]}" | while read -r line; do
+        log "$line"
+    done
+    if ! pipeline_ok "${PIPESTATUS[@]}"; then
+        log "FEHLER: Nicht alle abgelaufenen Backups konnten gelöscht werden. Sie bleiben im Katalog und werden beim nächsten Lauf erneut gelöscht."
+        return 1
+    fi
+    return 0
 }
 
 # Hauptfunktion
 main() {
+    # Nur alte Backups löschen (wird vom Orchestrator nach parallelen Backups aufgerufen)
+    if [ "$1" = "--cleanup" ]; then
+        cleanup_old_backups
+        cleanup_status=$?
+        smb_unmount
+        log "Bereinigung abgeschlossen."
+        exit $cleanup_status
+    fi
+    
     # Prüfe, ob eine spezifische Datenbank-ID als Parameter übergeben wurde
     if [ $# -eq 1 ]; then
         db_id=$1
@@ -252,26 +612,46 @@ main() {
             BACKUP_FILE="mysql_backup_${MYSQL_DATABASE}_${TIMESTAMP}.sql.gz"
             
             log "Starte Backup der Datenbank $MYSQL_DATABASE auf $MYSQL_HOST..."
+            backup_started=$(date +%s)
+            
+            # Messpunkte vor und hinter der Kompression (Zeilen, Bytes und Prüfsumme)
+            stats_file=$(mktemp /tmp/backup_stats.XXXXXX)
+            compressed_stats_file="$stats_file.compressed"
             
             # Führe MySQL-Backup durch
             mysqldump -h "$MYSQL_HOST" -P "$MYSQL_PORT" -u "$MYSQL_USER" -p"$MYSQL_PASSWORD" \
                 --single-transaction --quick --lock-tables=false \
-                "$MYSQL_DATABASE" | gzip > "$BACKUP_DIR/$BACKUP_FILE"
+                "$MYSQL_DATABASE" | python3 /app/profiler.py probe "$stats_file" --rows 2>> /app/logs/backup.log | \
+                $(python3 /app/backup_codecs.py compress-command gzip "" "$CODEC_THREADS") | \
+                python3 /app/profiler.py probe "$compressed_stats_file" --sha256 2>> /app/logs/backup.log \
+                > "$BACKUP_DIR/$BACKUP_FILE"
             
-            # Prüfe, ob das Backup erfolgreich war
-            if [ $? -eq 0 ]; then
+            # Prüfe, ob alle Stufen der Pipeline erfolgreich waren
+            if pipeline_ok "${PIPESTATUS[@]}"; then
                 log "Backup erfolgreich erstellt: $BACKUP_FILE ($(du -h "$BACKUP_DIR/$BACKUP_FILE" | cut -f1))"
+                python3 /app/catalog.py record "$BACKUP_FILE" --db-id 1 --database "$MYSQL_DATABASE" \
+                    --engine mysqldump --duration $(( $(date +%s) - backup_started )) \
+                    --stats "$compressed_stats_file" >> /app/logs/backup.log 2>&1
+                python3 /app/integrity.py record "$BACKUP_FILE" --stats "$stats_file" \
+                    --compressed-stats "$compressed_stats_file" >> /app/logs/backup.log 2>&1
                 
                 # Wenn SMB aktiviert ist, kopiere das Backup auf den SMB-Share
                 if [ "$SMB_ENABLED" = "true" ] && [ ! -z "$SMB_SHARE" ]; then
                     copy_to_smb "$BACKUP_FILE"
                 fi
                 
+                if [ "$STORAGE_BACKEND" != "none" ]; then
+                    copy_to_storage "$BACKUP_FILE"
+                fi
+                
                 backup_status=0
             else
                 log "FEHLER: Backup fehlgeschlagen!"
+                # Unvollständige Backup-Datei entfernen
+                rm -f "$BACKUP_DIR/$BACKUP_FILE"
                 backup_status=1
             fi
+            rm -f "$stats_file" "$compressed_stats_file"
         else
             # Suche nach allen konfigurierten Datenbanken
             log "Suche nach konfigurierten Datenbanken..."
@@ -313,8 +693,11 @@ main() {
         fi
     fi
     
-    # Lösche alte Backups
-    cleanup_old_backups
+    # Lösche alte Backups, sofern der Aufrufer die Bereinigung nicht selbst übernimmt
+    if [ "$BACKUP_SKIP_CLEANUP" != "true" ]; then
+        cleanup_old_backups
+        smb_unmount
+    fi
     
     log "Backup-Vorgang abgeschlossen."
     exit $backup_status
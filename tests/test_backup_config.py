@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Tests der typisierten Konfiguration (BackupSettings und DatabaseSettings)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from backup_config import BackupSettings
+
+CONFIG = {
+    'BACKUP_DIR': '/srv/backups',
+    'BACKUP_PARALLEL_JOBS': '3',
+    'VERIFY_DAYS': '',
+    'SMB_ENABLED': 'true',
+    'THROTTLE_WRITE_LIMIT': '1.5',
+    'THROTTLE_INTERVAL': 'abc',
+    'DB_2_NAME': 'Shop',
+    'DB_2_PORT': '3307',
+    'DB_2_DATABASE': 'shop',
+    'DB_2_INCREMENTAL': 'true',
+    'DB_2_CODEC_LEVEL': '',
+    'DB_2_PASSWORD': 'geheim'
+}
+
+def test_global_values_are_parsed():
+    settings = BackupSettings.from_config(CONFIG)
+    assert settings.backup_dir == '/srv/backups'
+    assert settings.parallel_jobs == 3
+    assert settings.verify_days == 2
+    assert settings.smb_enabled is True
+    assert settings.throttle_write_limit == 1.5
+    assert settings.throttle_interval == 5
+
+def test_database_values_are_parsed():
+    db = BackupSettings.from_config(CONFIG).database(2)
+    assert db.name == 'Shop' and db.database == 'shop'
+    assert db.port == 3307 and db.batch_rows == 1000
+    assert db.incremental is True and db.full_interval == 24.0
+    assert db.codec_level is None
+    assert 'geheim' not in repr(db)
+    assert db.replace(database='other').database == 'other'
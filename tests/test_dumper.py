@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Maik Bohrmann
+# https://github.com/meddatzk/mysql-backup
+
+# Tests der Python-Dump-Engine ohne MySQL-Server (Verbindung und Cursor sind nachgebildet)
+
+import io
+import os
+import sys
+import pymysql.converters
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from dumper import dump_table_data
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+# Escaping wie pymysql.Connection.escape (Bytes werden mit Surrogaten dekodiert)
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def escape(self, value):
+        return pymysql.converters.escape_item(value, 'utf8mb4')
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.rows)
+
+ROWS = [(1, b'\xff\x00ab\x80', 'Köln'), (2, b'', None), (3, b'plain', 'x')]
+
+def dump(rows, **kwargs):
+    out = io.BytesIO()
+    count, written = dump_table_data(FakeConnection(rows), 'files', out, batch_rows=2, **kwargs)
+    return count, written, out.getvalue()
+
+def test_binary_values_as_hex_literals():
+    count, written, data = dump(ROWS)
+    assert count == 3
+    assert written == len(data)
+    assert b"(1,0xff00616280,'K\xc3\xb6ln')" in data
+    assert b"(2,'',NULL)" in data
+    assert b"(3,0x706c61696e,'x')" in data
+
+def test_binary_values_with_stable_breaks():
+    count, _, data = dump(ROWS, stable_breaks=True)
+    assert count == 3
+    assert b'0xff00616280' in data